@@ -1,34 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Response, request, jsonify, make_response, current_app, has_app_context
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
-from models import db, User, Subject, Chapter, Quiz, Question, Score
+from werkzeug.middleware.proxy_fix import ProxyFix
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt, current_user
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Subject, Chapter, Quiz, Question, QuestionSignature, Score, AttemptDetail
 from datetime import datetime, timedelta
 import os
+import uuid
 from functools import wraps
 import utils
+from base_app import create_base_app
+from redis_client import get_redis
+import attempt_queue
+import attempt_detail
+import leaderboard
+import progress
+import content_cache
+import quiz_sessions
+import live_monitor
+import search
+import question_pools
+import auth_context
+import token_blocklist
+import rate_limit
+from rate_limit import rate_limited
+from replica import reads_from_replica
 
-# Initialize Flask app
-app = Flask(__name__)
-# Use an absolute path for the database
-db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'quizmaster.db'))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = 'super-secret-key'  # Change this in production
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+# Every API route is registered on this blueprint; create_app() mounts it
+api = Blueprint('api', __name__)
 
-# Initialize CORS with a configuration that works for all routes
-CORS(app, 
-     resources={r"/api/*": {"origins": ["http://localhost:8080", "http://127.0.0.1:8080"]}},
-     supports_credentials=True)
+jwt = JWTManager()
+# Resolve the current user once per request from the token claims (cached, see auth_context.py)
+jwt.user_lookup_loader(auth_context.load_user)
+# Reject logged-out and rotated tokens (see token_blocklist.py)
+jwt.token_in_blocklist_loader(token_blocklist.is_token_revoked)
+
+def create_app(config=None):
+    """
+    Build the API application on top of base_app.create_base_app().
+
+    Nothing here touches the database: schema creation and the admin account
+    are handled once by bootstrap.py, not by every server process.
+
+    Args:
+        config (dict, optional): Settings overriding the defaults
+
+    Returns:
+        Flask: The application
+    """
+    app = create_base_app({
+        # Per-route token buckets and concurrency caps for login, register and attempts (see rate_limit.py)
+        'RATE_LIMIT_ENABLED': os.environ.get('RATE_LIMIT_ENABLED', '1') == '1',
+        'RATE_LIMITS': rate_limit.DEFAULT_RATE_LIMITS,
+        # Reverse proxies in front of the API whose X-Forwarded-For is trusted (see rate_limit.py)
+        'TRUSTED_PROXIES': int(os.environ.get('TRUSTED_PROXIES', 0)),
+        # Live monitor streams per process; each holds a worker thread (see live_monitor.py)
+        'LIVE_MAX_WATCHERS': int(os.environ.get('LIVE_MAX_WATCHERS', max(1, rate_limit.WORKER_THREADS // 4))),
+        **(config or {})
+    })
+    if app.config['TRUSTED_PROXIES']:
+        # request.remote_addr becomes the client's address, so IP rate limits are per client
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
+
+    # Initialize CORS with a configuration that works for all routes
+    CORS(app, 
+         resources={r"/api/*": {"origins": ["http://localhost:8080", "http://127.0.0.1:8080"]}},
+         expose_headers=['Retry-After', 'X-Data-Source', 'X-Data-Staleness', 'ETag'],
+         supports_credentials=True)
+
+    jwt.init_app(app)
+    app.register_blueprint(api)
+    return app
 
 # Add CORS headers to all responses, including error responses
-@app.after_request
+@api.after_app_request
 def add_cors_headers(response):
     origin = request.headers.get('Origin')
     # If the request has an Origin header and it's one of our allowed origins
     if origin in ["http://localhost:8080", "http://127.0.0.1:8080"]:
         response.headers.add('Access-Control-Allow-Origin', origin)
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match')
         response.headers.add('Access-Control-Allow-Methods', 'GET, PUT, POST, DELETE, OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         
@@ -38,13 +91,10 @@ def add_cors_headers(response):
     return response
 
 # Special handling for OPTIONS requests (preflight)
-@app.route('/api/<path:path>', methods=['OPTIONS'])
+@api.route('/api/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
     return jsonify({}), 200
 
-jwt = JWTManager(app)
-db.init_app(app)
-
 # Define a helper function to check admin privileges
 def check_admin_access():
     # Get additional claims from JWT token
@@ -54,8 +104,107 @@ def check_admin_access():
         return jsonify({"msg": "Admin privileges required"}), 403
     return None
 
+def queue_cascade_delete(entity_type, entity_id):
+    """Hand the removal of a soft-deleted entity's subtree to the Celery worker"""
+    # Celery is imported on first use so API processes that never queue a job skip it
+    from task import cascade_delete
+    try:
+        job = cascade_delete.delay(entity_type, entity_id)
+    except Exception as e:
+        # Broker unavailable - fall back to running the chunked delete in-process
+        print(f"Could not queue cascade delete, running inline: {str(e)}")
+        job = cascade_delete.apply(args=(entity_type, entity_id))
+    return job.id
+
+def remove_from_leaderboards(entity_type, entity_id):
+    """Take a soft-deleted entity off the leaderboards, before the cascade removes the rows that locate it"""
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return
+    # The entity is already deleted; Redis problems must not fail the request
+    try:
+        if entity_type == 'user':
+            leaderboard.remove_user(redis_conn, entity_id)
+        else:
+            leaderboard.remove_entity(redis_conn, entity_type, entity_id)
+    except Exception as e:
+        print(f"Warning: Could not remove {entity_type} {entity_id} from leaderboards: {str(e)}")
+
+def queue_item_analysis(quiz_id, redis_conn):
+    """Start (or join) the Celery job that recomputes a quiz's item analysis"""
+    # Imported on first use: Celery and NumPy are only needed by this admin report
+    import item_analysis
+    from workers import celery
+    from task import compute_item_analysis
+    job_key = item_analysis.JOB_KEY.format(quiz_id=quiz_id)
+    
+    # Mark the job before queuing it: a quick job clears the marker when it finishes,
+    # and of two concurrent requests only the one that set the marker queues a job
+    job_id = str(uuid.uuid4())
+    if redis_conn is not None and not redis_conn.set(job_key, job_id, nx=True, ex=item_analysis.JOB_TTL):
+        running_job_id = redis_conn.get(job_key)
+        if running_job_id:
+            return celery.AsyncResult(running_job_id)
+    try:
+        return compute_item_analysis.apply_async(args=(quiz_id,), task_id=job_id)
+    except Exception as e:
+        # Broker unavailable - compute in-process
+        print(f"Could not queue item analysis, running inline: {str(e)}")
+        return compute_item_analysis.apply(args=(quiz_id,), task_id=job_id)
+
+def queue_duplicate_scan(redis_conn):
+    """Start (or join) the Celery job that scans the question bank for near-duplicates"""
+    import near_duplicates
+    from workers import celery
+    from task import find_duplicate_questions
+    
+    # Mark the job before queuing it: a quick scan clears the marker when it finishes,
+    # and of two concurrent requests only the one that set the marker queues a scan
+    job_id = str(uuid.uuid4())
+    if redis_conn is not None and not redis_conn.set(near_duplicates.JOB_KEY, job_id, nx=True, ex=near_duplicates.JOB_TTL):
+        running_job_id = redis_conn.get(near_duplicates.JOB_KEY)
+        if running_job_id:
+            return celery.AsyncResult(running_job_id)
+    try:
+        return find_duplicate_questions.apply_async(task_id=job_id)
+    except Exception as e:
+        # Broker unavailable - scan in-process
+        print(f"Could not queue duplicate scan, running inline: {str(e)}")
+        return find_duplicate_questions.apply(task_id=job_id)
+
+def create_user_tokens(user, family=None):
+    """
+    Create an access and refresh token pair carrying the claims the authentication
+    context resolves. A new login family is started unless one is given (rotation).
+    """
+    # Use username as the identity (subject) and include other data as additional claims
+    claims = {
+        'id': user.id,
+        'username': user.username,
+        'is_admin': user.is_admin,
+        'ver': user.token_version or 0,
+        'fam': family or uuid.uuid4().hex
+    }
+    return {
+        'access_token': create_access_token(identity=user.username, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=user.username, additional_claims=claims)
+    }
+
+def serialize_profile(user):
+    """Profile fields of a User row or an auth_context.AuthUser snapshot"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'full_name': user.full_name,
+        'email': user.email,
+        'qualification': user.qualification,
+        'date_of_birth': user.date_of_birth.strftime('%Y-%m-%d') if user.date_of_birth else None,
+        'is_admin': user.is_admin
+    }
+
 # Authentication routes
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login():
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -68,18 +217,11 @@ def login():
     
     user = User.query.filter_by(username=username).first()
     
-    if user and user.check_password(password):
-        # Use username as the identity (subject) and include other data as additional claims
-        access_token = create_access_token(
-            identity=username,
-            additional_claims={
-                'id': user.id,
-                'username': user.username,
-                'is_admin': user.is_admin
-            }
-        )
+    if user and not user.is_deleted and user.check_password(password):
+        tokens = create_user_tokens(user)
         return jsonify({
-            'access_token': access_token,
+            'access_token': tokens['access_token'],
+            'refresh_token': tokens['refresh_token'],
             'user': {
                 'id': user.id,
                 'username': user.username,
@@ -91,7 +233,27 @@ def login():
     else:
         return jsonify({"msg": "Invalid username or password"}), 401
 
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    # Each refresh token is accepted once; a new pair replaces it in the same login family
+    claims = get_jwt()
+    if not token_blocklist.use_refresh_token(claims):
+        return jsonify({"msg": "Refresh token has already been used"}), 401
+
+    return jsonify(create_user_tokens(current_user, family=claims.get('fam'))), 200
+
+@api.route('/api/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    # Revoke this token and every token of the same login
+    claims = get_jwt()
+    token_blocklist.revoke_token(claims)
+    token_blocklist.revoke_family(claims)
+    return jsonify({"msg": "Logged out successfully"}), 200
+
+@api.route('/api/register', methods=['POST'])
+@rate_limited('register')
 def register():
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -129,18 +291,17 @@ def register():
     return jsonify({"msg": "User registered successfully"}), 201
 
 # User routes
-@app.route('/api/users', methods=['GET'])
+@api.route('/api/users', methods=['GET'])
 @jwt_required()
 def get_users():
-    # Get the identity (username) and additional claims
-    current_user_identity = get_jwt_identity()
+    # Get additional claims
     current_user_claims = get_jwt()
     
     # Check if user has admin privileges
     if not current_user_claims.get('is_admin'):
         return jsonify({"msg": "Admin privileges required"}), 403
     
-    users = User.query.all()  # Get all users including admins
+    users = User.query.filter_by(is_deleted=False).all()  # Get all users including admins
     
     return jsonify({
         'users': [
@@ -157,37 +318,17 @@ def get_users():
         ]
     }), 200
 
-@app.route('/api/profile', methods=['GET'])
+@api.route('/api/profile', methods=['GET'])
 @jwt_required()
 def get_user_profile():
-    # Get the identity (username) from the JWT
-    current_username = get_jwt_identity()
-    
-    # Find the user in the database
-    user = User.query.filter_by(username=current_username).first()
-    
-    if not user:
-        return jsonify({"msg": "User not found"}), 404
-    
-    # Return user profile data
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'full_name': user.full_name,
-        'email': user.email,
-        'qualification': user.qualification,
-        'date_of_birth': user.date_of_birth.strftime('%Y-%m-%d') if user.date_of_birth else None,
-        'is_admin': user.is_admin
-    }), 200
+    # Return user profile data from the request's authentication context
+    return jsonify(serialize_profile(current_user)), 200
 
-@app.route('/api/profile', methods=['PUT'])
+@api.route('/api/profile', methods=['PUT'])
 @jwt_required()
 def update_user_profile():
-    # Get the identity (username) from the JWT
-    current_username = get_jwt_identity()
-    
-    # Find the user in the database
-    user = User.query.filter_by(username=current_username).first()
+    # Load the row to modify
+    user = User.query.get(current_user.id)
     
     if not user:
         return jsonify({"msg": "User not found"}), 404
@@ -214,28 +355,25 @@ def update_user_profile():
         except ValueError:
             return jsonify({"msg": "Invalid date format. Use YYYY-MM-DD"}), 400
     
-    # Update password if provided
-    if data.get('password'):
+    # Update password if provided; this revokes tokens issued with the old one
+    password_changed = bool(data.get('password'))
+    if password_changed:
         user.set_password(data.get('password'))
+        user.token_version = (user.token_version or 0) + 1
     
     db.session.commit()
+    auth_context.invalidate_user(user.id)
     
     # Return updated profile
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'full_name': user.full_name,
-        'email': user.email,
-        'qualification': user.qualification,
-        'date_of_birth': user.date_of_birth.strftime('%Y-%m-%d') if user.date_of_birth else None,
-        'is_admin': user.is_admin
-    }), 200
+    response = serialize_profile(user)
+    if password_changed:
+        response.update(create_user_tokens(user))
+    return jsonify(response), 200
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE'])
+@api.route('/api/users/<int:user_id>', methods=['DELETE'])
 @jwt_required()
 def delete_user(user_id):
-    # Get the identity and claims from JWT
-    current_user_identity = get_jwt_identity()
+    # Get the claims from JWT
     current_user_claims = get_jwt()
     
     # Check if user has admin privileges
@@ -245,27 +383,27 @@ def delete_user(user_id):
     # Find the user to delete
     user = User.query.get(user_id)
     
-    if not user:
+    if not user or user.is_deleted:
         return jsonify({"msg": "User not found"}), 404
     
     # Prevent deleting yourself
-    current_user = User.query.filter_by(username=current_user_identity).first()
     if user.id == current_user.id:
         return jsonify({"msg": "Cannot delete your own account"}), 400
     
-    # Delete related records (scores, etc.) to prevent foreign key constraint errors
-    Score.query.filter_by(user_id=user.id).delete()
-    
-    # Delete the user
-    db.session.delete(user)
+    # Hide the user immediately; scores and the row itself are removed in the background
+    user.is_deleted = True
+    user.token_version = (user.token_version or 0) + 1
     db.session.commit()
+    auth_context.invalidate_user(user.id)
+    remove_from_leaderboards('user', user.id)
+    job_id = queue_cascade_delete('user', user.id)
     
-    return jsonify({"msg": "User deleted successfully"}), 200
+    return jsonify({"msg": "User deleted successfully", "job_id": job_id}), 202
 
 # Subject routes
-@app.route('/api/subjects', methods=['GET'])
+@api.route('/api/subjects', methods=['GET'])
 def get_subjects():
-    subjects = Subject.query.all()
+    subjects = Subject.query.filter_by(is_deleted=False).all()
     
     return jsonify({
         'subjects': [
@@ -278,9 +416,9 @@ def get_subjects():
         ]
     }), 200
 
-@app.route('/api/subjects/<int:subject_id>', methods=['GET'])
+@api.route('/api/subjects/<int:subject_id>', methods=['GET'])
 def get_subject_by_id(subject_id):
-    subject = Subject.query.get_or_404(subject_id)
+    subject = Subject.query.filter_by(id=subject_id, is_deleted=False).first_or_404()
     
     return jsonify({
         'id': subject.id,
@@ -288,7 +426,7 @@ def get_subject_by_id(subject_id):
         'description': subject.description
     }), 200
 
-@app.route('/api/subjects', methods=['POST'])
+@api.route('/api/subjects', methods=['POST'])
 @jwt_required()
 def create_subject():
     # Check admin privileges
@@ -314,6 +452,7 @@ def create_subject():
     try:
         db.session.add(subject)
         db.session.commit()
+        content_cache.bump_catalog(get_redis())
         
         # Ensure SQLite sequence is updated
         utils.ensure_id_sequence(db.session, Subject, 'subject')
@@ -327,7 +466,7 @@ def create_subject():
         db.session.rollback()
         return jsonify({"msg": f"Error creating subject: {str(e)}"}), 500
 
-@app.route('/api/subjects/<int:subject_id>', methods=['PUT'])
+@api.route('/api/subjects/<int:subject_id>', methods=['PUT'])
 @jwt_required()
 def update_subject(subject_id):
     # Check admin privileges
@@ -338,13 +477,14 @@ def update_subject(subject_id):
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
     
-    subject = Subject.query.get_or_404(subject_id)
+    subject = Subject.query.filter_by(id=subject_id, is_deleted=False).first_or_404()
     data = request.json
     
     subject.name = data.get('name', subject.name)
     subject.description = data.get('description', subject.description)
     
     db.session.commit()
+    content_cache.bump_catalog(get_redis())
     
     return jsonify({
         'id': subject.id,
@@ -352,7 +492,7 @@ def update_subject(subject_id):
         'description': subject.description
     }), 200
 
-@app.route('/api/subjects/<int:subject_id>', methods=['DELETE'])
+@api.route('/api/subjects/<int:subject_id>', methods=['DELETE'])
 @jwt_required()
 def delete_subject(subject_id):
     # Check admin privileges
@@ -361,18 +501,64 @@ def delete_subject(subject_id):
         return admin_check
     
     # Get subject by ID
-    subject = Subject.query.get_or_404(subject_id)
-    
-    db.session.delete(subject)
+    subject = Subject.query.filter_by(id=subject_id, is_deleted=False).first_or_404()
+    
+    # Hide the subject and everything under it immediately; the rows are removed in the background
+    subject.is_deleted = True
+    chapter_ids = db.session.query(Chapter.id).filter(Chapter.subject_id == subject.id)
+    Quiz.query.filter(Quiz.chapter_id.in_(chapter_ids), Quiz.is_deleted == False) \
+        .update({Quiz.is_deleted: True}, synchronize_session=False)
+    Chapter.query.filter(Chapter.subject_id == subject.id, Chapter.is_deleted == False) \
+        .update({Chapter.is_deleted: True}, synchronize_session=False)
     db.session.commit()
+    content_cache.bump_catalog(get_redis())
+    remove_from_leaderboards('subject', subject.id)
+    job_id = queue_cascade_delete('subject', subject.id)
+    
+    return jsonify({"msg": "Subject deleted successfully", "job_id": job_id}), 202
+
+@api.route('/api/catalog', methods=['GET'])
+def get_catalog():
+    # The whole subject -> chapter -> quiz tree, so browsing needs no further requests
+    depth = request.args.get('depth', 'quizzes')
+    if depth not in content_cache.CATALOG_DEPTHS:
+        return jsonify({"msg": f"depth must be one of: {', '.join(content_cache.CATALOG_DEPTHS)}"}), 400
+    subject_id = request.args.get('subject_id', type=int)
+    
+    catalog = content_cache.get_catalog(get_redis(), depth, subject_id)
+    response = make_response(jsonify(catalog), 200)
+    if catalog['version']:
+        response.set_etag(f"catalog-{catalog['version']}-{depth}-{subject_id or 'all'}")
+        response.make_conditional(request)
+    return response
+
+@api.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_content():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type') or None
+    if kind is not None and kind not in search.KINDS:
+        return jsonify({"msg": f"type must be one of: {', '.join(search.KINDS)}"}), 400
+    subject_id = request.args.get('subject_id', type=int)
+    # Questions are only searchable by admins; students find subjects, chapters and quizzes
+    include_questions = bool(get_jwt().get('is_admin'))
+    if kind == 'question' and not include_questions:
+        return jsonify({"msg": "Admin privileges required"}), 403
+    
+    if request.args.get('autocomplete') in ('1', 'true'):
+        suggestions = search.suggest(db.session, query, subject_id, kind, include_questions)
+        return jsonify({'query': query, 'suggestions': suggestions}), 200
     
-    return jsonify({"msg": "Subject deleted successfully"}), 200
+    limit = min(max(request.args.get('limit', 20, type=int), 1), search.MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    results = search.search(db.session, query, subject_id, kind, include_questions, limit, offset)
+    return jsonify({'query': query, 'results': results, 'limit': limit, 'offset': offset}), 200
 
 # Chapter routes
-@app.route('/api/subjects/<int:subject_id>/chapters', methods=['GET'])
+@api.route('/api/subjects/<int:subject_id>/chapters', methods=['GET'])
 def get_chapters(subject_id):
-    Subject.query.get_or_404(subject_id)
-    chapters = Chapter.query.filter_by(subject_id=subject_id).all()
+    Subject.query.filter_by(id=subject_id, is_deleted=False).first_or_404()
+    chapters = Chapter.query.filter_by(subject_id=subject_id, is_deleted=False).all()
     
     return jsonify({
         'chapters': [
@@ -386,7 +572,7 @@ def get_chapters(subject_id):
         ]
     }), 200
 
-@app.route('/api/subjects/<int:subject_id>/chapters', methods=['POST'])
+@api.route('/api/subjects/<int:subject_id>/chapters', methods=['POST'])
 @jwt_required()
 def create_chapter(subject_id):
     # Check admin privileges
@@ -395,7 +581,7 @@ def create_chapter(subject_id):
         return admin_check
     
     # Get subject
-    subject = Subject.query.get_or_404(subject_id)
+    subject = Subject.query.filter_by(id=subject_id, is_deleted=False).first_or_404()
     
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
@@ -415,6 +601,7 @@ def create_chapter(subject_id):
     try:
         db.session.add(chapter)
         db.session.commit()
+        content_cache.bump_catalog(get_redis())
         
         # Ensure SQLite sequence is updated
         utils.ensure_id_sequence(db.session, Chapter, 'chapter')
@@ -429,7 +616,7 @@ def create_chapter(subject_id):
         db.session.rollback()
         return jsonify({"msg": f"Error creating chapter: {str(e)}"}), 500
 
-@app.route('/api/chapters/<int:chapter_id>', methods=['PUT'])
+@api.route('/api/chapters/<int:chapter_id>', methods=['PUT'])
 @jwt_required()
 def update_chapter(chapter_id):
     # Check admin privileges
@@ -440,13 +627,14 @@ def update_chapter(chapter_id):
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
     
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = Chapter.query.filter_by(id=chapter_id, is_deleted=False).first_or_404()
     data = request.json
     
     chapter.name = data.get('name', chapter.name)
     chapter.description = data.get('description', chapter.description)
     
     db.session.commit()
+    content_cache.bump_catalog(get_redis())
     
     return jsonify({
         'id': chapter.id,
@@ -455,9 +643,9 @@ def update_chapter(chapter_id):
         'subject_id': chapter.subject_id
     }), 200
 
-@app.route('/api/chapters/<int:chapter_id>', methods=['GET'])
+@api.route('/api/chapters/<int:chapter_id>', methods=['GET'])
 def get_chapter_by_id(chapter_id):
-    chapter = Chapter.query.get_or_404(chapter_id)
+    chapter = Chapter.query.filter_by(id=chapter_id, is_deleted=False).first_or_404()
     
     return jsonify({
         'id': chapter.id,
@@ -466,7 +654,7 @@ def get_chapter_by_id(chapter_id):
         'subject_id': chapter.subject_id
     }), 200
 
-@app.route('/api/chapters/<int:chapter_id>', methods=['DELETE'])
+@api.route('/api/chapters/<int:chapter_id>', methods=['DELETE'])
 @jwt_required()
 def delete_chapter(chapter_id):
     # Check admin privileges
@@ -474,29 +662,66 @@ def delete_chapter(chapter_id):
     if admin_check:
         return admin_check
     
-    current_user = get_jwt_identity()
+    chapter = Chapter.query.filter_by(id=chapter_id, is_deleted=False).first_or_404()
     
-    if not current_user.get('is_admin'):
-        return jsonify({"msg": "Admin privileges required"}), 403
-    
-    chapter = Chapter.query.get_or_404(chapter_id)
-    
-    db.session.delete(chapter)
+    # Hide the chapter and its quizzes immediately; the rows are removed in the background
+    chapter.is_deleted = True
+    live_quiz_ids = [quiz_id for (quiz_id,) in db.session.query(Quiz.id).filter_by(chapter_id=chapter.id, is_deleted=False)]
+    progress.quizzes_removed(db.session, chapter.subject_id, live_quiz_ids)
+    if live_quiz_ids:
+        Quiz.query.filter(Quiz.id.in_(live_quiz_ids)).update({Quiz.is_deleted: True}, synchronize_session=False)
     db.session.commit()
+    content_cache.bump_catalog(get_redis())
+    remove_from_leaderboards('chapter', chapter.id)
+    job_id = queue_cascade_delete('chapter', chapter.id)
     
-    return jsonify({"msg": "Chapter deleted successfully"}), 200
+    return jsonify({"msg": "Chapter deleted successfully", "job_id": job_id}), 202
 
 # Quiz routes
-@app.route('/api/chapters/<int:chapter_id>/quizzes', methods=['GET'])
+def parse_pool_settings(data, quiz=None):
+    """
+    Read pool_size and draw_count (positive integers, or null for none) from a quiz request.
+    
+    Returns:
+        tuple: ({field: value} of the fields present, None) or (None, error message)
+    """
+    settings = {}
+    for field in ('pool_size', 'draw_count'):
+        if field not in data:
+            continue
+        value = data[field]
+        if value in (None, ''):
+            settings[field] = None
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return None, f"{field} must be a positive integer or null"
+        if value < 1:
+            return None, f"{field} must be a positive integer or null"
+        settings[field] = value
+    
+    # Drawing from the chapter's pool needs a number of questions to draw
+    pool_size = settings.get('pool_size', quiz.pool_size if quiz else None)
+    draw_count = settings.get('draw_count', quiz.draw_count if quiz else None)
+    if pool_size is not None and draw_count is None:
+        return None, "draw_count is required when pool_size is set"
+    if pool_size is not None and draw_count > pool_size:
+        return None, "draw_count cannot be larger than pool_size"
+    return settings, None
+
+@api.route('/api/chapters/<int:chapter_id>/quizzes', methods=['GET'])
 def get_quizzes(chapter_id):
-    Chapter.query.get_or_404(chapter_id)
-    quizzes = Quiz.query.filter_by(chapter_id=chapter_id).all()
+    Chapter.query.filter_by(id=chapter_id, is_deleted=False).first_or_404()
+    # Question counts come from one grouped query instead of one query per quiz
+    quizzes = db.session.query(Quiz, func.count(Question.id)) \
+        .outerjoin(Question, Question.quiz_id == Quiz.id) \
+        .filter(Quiz.chapter_id == chapter_id, Quiz.is_deleted == False) \
+        .group_by(Quiz.id) \
+        .all()
     
     result = []
-    for quiz in quizzes:
-        # Get the number of questions for this quiz
-        question_count = Question.query.filter_by(quiz_id=quiz.id).count()
-        
+    for quiz, question_count in quizzes:
         result.append({
             'id': quiz.id,
             'title': quiz.title,
@@ -505,14 +730,16 @@ def get_quizzes(chapter_id):
             'duration': quiz.duration,
             'date_of_quiz': quiz.date_of_quiz.strftime('%Y-%m-%d %H:%M:%S'),
             'remarks': quiz.remarks,
-            'question_count': question_count
+            'question_count': question_count,
+            'pool_size': quiz.pool_size,
+            'draw_count': quiz.draw_count
         })
     
     return jsonify({
         'quizzes': result
     }), 200
 
-@app.route('/api/chapters/<int:chapter_id>/quizzes', methods=['POST'])
+@api.route('/api/chapters/<int:chapter_id>/quizzes', methods=['POST'])
 @jwt_required()
 def create_quiz(chapter_id):
     # Check admin privileges
@@ -524,8 +751,11 @@ def create_quiz(chapter_id):
         return jsonify({"msg": "Missing JSON in request"}), 400
     
     # Get chapter 
-    Chapter.query.get_or_404(chapter_id)
+    chapter = Chapter.query.filter_by(id=chapter_id, is_deleted=False).first_or_404()
     data = request.json
+    pool_settings, error = parse_pool_settings(data)
+    if error:
+        return jsonify({"msg": error}), 400
     
     try:
         # Generate a professional-looking ID
@@ -539,11 +769,14 @@ def create_quiz(chapter_id):
             duration=int(data.get('duration', 30)),
             chapter_id=chapter_id,
             date_of_quiz=datetime.utcnow(),  # Default to current time
-            remarks=''  # Empty remarks by default
+            remarks='',  # Empty remarks by default
+            **pool_settings
         )
         
         db.session.add(quiz)
+        progress.quiz_added(db.session, chapter.subject_id)
         db.session.commit()
+        content_cache.bump_catalog(get_redis())
         
         # Ensure SQLite sequence is updated
         utils.ensure_id_sequence(db.session, Quiz, 'quiz')
@@ -553,13 +786,15 @@ def create_quiz(chapter_id):
             'title': quiz.title,
             'description': quiz.description,
             'duration': quiz.duration,
-            'chapter_id': quiz.chapter_id
+            'chapter_id': quiz.chapter_id,
+            'pool_size': quiz.pool_size,
+            'draw_count': quiz.draw_count
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": f"Error creating quiz: {str(e)}"}), 500
 
-@app.route('/api/quizzes/<int:quiz_id>', methods=['PUT'])
+@api.route('/api/quizzes/<int:quiz_id>', methods=['PUT'])
 @jwt_required()
 def update_quiz(quiz_id):
     # Check admin privileges
@@ -570,26 +805,36 @@ def update_quiz(quiz_id):
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
     
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
     data = request.json
+    pool_settings, error = parse_pool_settings(data, quiz)
+    if error:
+        return jsonify({"msg": error}), 400
     
     quiz.title = data.get('title', quiz.title)
     quiz.description = data.get('description', quiz.description)
     quiz.duration = data.get('duration', quiz.duration)
+    for field, value in pool_settings.items():
+        setattr(quiz, field, value)
     
     db.session.commit()
+    redis_conn = get_redis()
+    content_cache.bump_quiz(redis_conn, quiz.id)
+    content_cache.bump_catalog(redis_conn)
     
     return jsonify({
         'id': quiz.id,
         'title': quiz.title,
         'description': quiz.description,
         'duration': quiz.duration,
-        'chapter_id': quiz.chapter_id
+        'chapter_id': quiz.chapter_id,
+        'pool_size': quiz.pool_size,
+        'draw_count': quiz.draw_count
     }), 200
 
-@app.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
+@api.route('/api/quizzes/<int:quiz_id>', methods=['GET'])
 def get_quiz_by_id(quiz_id):
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
     
     # Get the number of questions for this quiz
     question_count = Question.query.filter_by(quiz_id=quiz_id).count()
@@ -600,10 +845,30 @@ def get_quiz_by_id(quiz_id):
         'description': quiz.description,
         'duration': quiz.duration,
         'chapter_id': quiz.chapter_id,
-        'question_count': question_count
+        'question_count': question_count,
+        'pool_size': quiz.pool_size,
+        'draw_count': quiz.draw_count
     }), 200
 
-@app.route('/api/quizzes/<int:quiz_id>', methods=['DELETE'])
+@api.route('/api/quizzes/<int:quiz_id>/session', methods=['GET'])
+@jwt_required()
+def get_quiz_session(quiz_id):
+    # Quiz, breadcrumb and questions in one response for the quiz-taking page
+    redis_conn = get_redis()
+    bundle = content_cache.get_quiz_bundle(redis_conn, quiz_id)
+    if bundle is None:
+        return jsonify({"msg": "Quiz not found"}), 404
+    if bundle['quiz']['pooled']:
+        # The questions come with the attempt's draw; the pool only tells how many
+        bundle['quiz']['question_count'] = question_pools.questions_per_attempt(Quiz.query.get(quiz_id), redis_conn)
+    
+    response = make_response(jsonify(bundle), 200)
+    if bundle['version']:
+        response.set_etag(f"quiz-{quiz_id}-{bundle['version']}")
+        response.make_conditional(request)
+    return response
+
+@api.route('/api/quizzes/<int:quiz_id>', methods=['DELETE'])
 @jwt_required()
 def delete_quiz(quiz_id):
     # Check admin privileges
@@ -611,24 +876,28 @@ def delete_quiz(quiz_id):
     if admin_check:
         return admin_check
     
-    current_user = get_jwt_identity()
-    
-    if not current_user.get('is_admin'):
-        return jsonify({"msg": "Admin privileges required"}), 403
-    
-    quiz = Quiz.query.get_or_404(quiz_id)
+    quiz = Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
     
-    db.session.delete(quiz)
+    # Hide the quiz immediately; its questions and scores are removed in the background
+    quiz.is_deleted = True
+    chapter = Chapter.query.get(quiz.chapter_id)
+    if chapter and not chapter.is_deleted:
+        progress.quizzes_removed(db.session, chapter.subject_id, [quiz.id])
     db.session.commit()
+    redis_conn = get_redis()
+    content_cache.bump_quiz(redis_conn, quiz.id)
+    content_cache.bump_catalog(redis_conn)
+    remove_from_leaderboards('quiz', quiz.id)
+    job_id = queue_cascade_delete('quiz', quiz.id)
     
-    return jsonify({"msg": "Quiz deleted successfully"}), 200
+    return jsonify({"msg": "Quiz deleted successfully", "job_id": job_id}), 202
 
 # Question routes
-@app.route('/api/quizzes/<int:quiz_id>/questions', methods=['GET'])
+@api.route('/api/quizzes/<int:quiz_id>/questions', methods=['GET'])
 @jwt_required()
 def get_questions(quiz_id):
     # Verify quiz exists
-    Quiz.query.get_or_404(quiz_id)
+    Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
     
     # Get questions for this quiz
     questions = Question.query.filter_by(quiz_id=quiz_id).all()
@@ -658,7 +927,7 @@ def get_questions(quiz_id):
     
     return jsonify({'questions': result}), 200
 
-@app.route('/api/quizzes/<int:quiz_id>/questions', methods=['POST'])
+@api.route('/api/quizzes/<int:quiz_id>/questions', methods=['POST'])
 @jwt_required()
 def create_question(quiz_id):
     # Check admin privileges
@@ -669,7 +938,7 @@ def create_question(quiz_id):
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
     
-    Quiz.query.get_or_404(quiz_id)
+    Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
     data = request.json
     
     # Generate a professional-looking ID
@@ -687,7 +956,14 @@ def create_question(quiz_id):
     )
     
     db.session.add(question)
+    # NumPy is imported on first use: only admins edit questions
+    import near_duplicates
+    near_duplicates.update_signature(db.session, question)
     db.session.commit()
+    # The catalog shows question counts
+    redis_conn = get_redis()
+    content_cache.bump_quiz(redis_conn, quiz_id)
+    content_cache.bump_catalog(redis_conn)
     
     # Ensure SQLite sequence is updated
     utils.ensure_id_sequence(db.session, Question, 'question')
@@ -703,7 +979,7 @@ def create_question(quiz_id):
         'correct_option': question.correct_option
     }), 201
 
-@app.route('/api/questions/<int:question_id>', methods=['PUT'])
+@api.route('/api/questions/<int:question_id>', methods=['PUT'])
 @jwt_required()
 def update_question(question_id):
     # Check admin privileges
@@ -711,11 +987,6 @@ def update_question(question_id):
     if admin_check:
         return admin_check
     
-    current_user = get_jwt_identity()
-    
-    if not current_user.get('is_admin'):
-        return jsonify({"msg": "Admin privileges required"}), 403
-    
     if not request.is_json:
         return jsonify({"msg": "Missing JSON in request"}), 400
     
@@ -729,7 +1000,10 @@ def update_question(question_id):
     question.option4 = data.get('option4', question.option4)
     question.correct_option = data.get('correct_option', question.correct_option)
     
+    import near_duplicates
+    near_duplicates.update_signature(db.session, question)
     db.session.commit()
+    content_cache.bump_quiz(get_redis(), question.quiz_id)
     
     return jsonify({
         'id': question.id,
@@ -742,7 +1016,7 @@ def update_question(question_id):
         'correct_option': question.correct_option
     }), 200
 
-@app.route('/api/questions/<int:question_id>', methods=['DELETE'])
+@api.route('/api/questions/<int:question_id>', methods=['DELETE'])
 @jwt_required()
 def delete_question(question_id):
     # Check admin privileges
@@ -751,163 +1025,400 @@ def delete_question(question_id):
         return admin_check
     
     question = Question.query.get_or_404(question_id)
+    quiz_id = question.quiz_id
     
+    QuestionSignature.query.filter_by(question_id=question_id).delete()
     db.session.delete(question)
     db.session.commit()
+    redis_conn = get_redis()
+    content_cache.bump_quiz(redis_conn, quiz_id)
+    content_cache.bump_catalog(redis_conn)
     
     return jsonify({"msg": "Question deleted successfully"}), 200
 
 # Quiz attempt routes
-@app.route('/api/quizzes/<int:quiz_id>/attempt', methods=['POST'])
+def score_attempt_response(score, question_results=None):
+    """Build the attempt response body for a saved score"""
+    response = {
+        'id': score.id,
+        'quiz_id': score.quiz_id,
+        'score': score.score,
+        'total_questions': score.total_questions,
+        'correct_answers': score.correct_answers,
+        'time_taken': score.time_taken,
+        'timestamp': score.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if question_results is not None:
+        response['question_results'] = question_results
+    return response
+
+def find_submitted_attempt(user_id, quiz_id, idempotency_key):
+    """Return the original result for an idempotency key that was already used, or None"""
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        result = attempt_queue.get_replayed_result(redis_conn, user_id, quiz_id, idempotency_key)
+        if result:
+            return result
+    
+    # Past the Redis TTL the saved row is still the source of truth
+    score = Score.query.filter_by(user_id=user_id, quiz_id=quiz_id, idempotency_key=idempotency_key).first()
+    if score:
+        return score_attempt_response(score)
+    return None
+
+def save_graded_attempt(user_id, quiz_id, submitted_answers, time_taken, idempotency_key, draw=None):
+    """
+    Grade submitted answers and save the attempt (or queue it in write-behind mode).
+    
+    Args:
+        draw (dict): Questions drawn for the attempt of a pooled quiz; only they are graded
+    
+    Returns:
+        tuple: (response, status code)
+    """
+    # Calculate score
+    if draw is not None:
+        questions = question_pools.load_drawn_questions(draw)
+    else:
+        questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    
+    # Check if there are any questions for this quiz
+    if not questions:
+        return jsonify({"msg": "No questions found for this quiz"}), 400
+        
+    correct_answers, question_results = quiz_sessions.grade_answers(questions, submitted_answers)
+    
+    total_questions = len(questions)
+    score_value = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+    
+    # Write-behind mode: return the graded result now and let the queue consumer save it
+    if current_app.config['ATTEMPT_WRITE_BEHIND']:
+        redis_conn = get_redis()
+        if redis_conn is not None:
+            record = attempt_queue.build_record(
+                user_id, quiz_id, score_value, total_questions, correct_answers,
+                time_taken,
+                idempotency_key,
+                attempt_detail.build_detail(None, quiz_id, question_results, draw)
+            )
+            result, is_new = attempt_queue.enqueue_attempt(redis_conn, record, {
+                'id': None,
+                'quiz_id': quiz_id,
+                'score': score_value,
+                'total_questions': total_questions,
+                'correct_answers': correct_answers,
+                'time_taken': record['time_taken'],
+                'timestamp': record['timestamp'],
+                'question_results': question_results,
+                'pending': True
+            })
+            print(f"Queued score for user {user_id}, quiz {quiz_id} (new: {is_new})")
+            if is_new:
+                live_monitor.publish_attempts(redis_conn, [(quiz_id, score_value)])
+            return jsonify(result), 202
+    
+    # Create score record
+    try:
+        # Generate a professional-looking ID
+        new_id = utils.get_next_id(db.session, Score, 'score')
+        
+        # Packed per-question answers; built first since a new layout commits on its own
+        detail = attempt_detail.build_detail(new_id, quiz_id, question_results, draw)
+        
+        score = Score(
+            id=new_id,
+            user_id=user_id,
+            quiz_id=quiz_id,
+            score=score_value,
+            total_questions=total_questions,
+            correct_answers=correct_answers,
+            time_taken=time_taken,
+            idempotency_key=idempotency_key
+        )
+        
+        progress.record_attempts(db.session, {(user_id, quiz_id)})
+        
+        db.session.add(score)
+        db.session.flush()
+        db.session.add(detail)
+        db.session.commit()
+        print(f"Score saved successfully with ID: {score.id}")
+        
+        # Ensure SQLite sequence is updated
+        utils.ensure_id_sequence(db.session, Score, 'score')
+        
+        response = score_attempt_response(score, question_results)
+        redis_conn = get_redis()
+        if redis_conn is not None:
+            # The score is already saved; Redis problems must not fail the submission
+            try:
+                if idempotency_key:
+                    attempt_queue.remember_result(redis_conn, user_id, quiz_id, idempotency_key, response)
+                leaderboard.record_saved_attempts(redis_conn, [(user_id, quiz_id, score.score, score.time_taken)])
+            except Exception as e:
+                print(f"Warning: Could not update Redis after saving score: {str(e)}")
+            live_monitor.publish_attempts(redis_conn, [(quiz_id, score.score)])
+        
+        return jsonify(response), 201
+    except IntegrityError:
+        # A concurrent retry with the same key won the insert
+        db.session.rollback()
+        original_result = find_submitted_attempt(user_id, quiz_id, idempotency_key) if idempotency_key else None
+        if original_result:
+            return jsonify(original_result), 200
+        return jsonify({"msg": "Error saving score: duplicate submission"}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error saving score: {str(e)}")
+        return jsonify({"msg": f"Error saving score: {str(e)}"}), 500
+
+@api.route('/api/quizzes/<int:quiz_id>/attempt', methods=['POST'])
 @jwt_required()
+@rate_limited('attempt')
 def submit_quiz_attempt(quiz_id):
     try:
-        current_username = get_jwt_identity()
-        # Get additional claims to access user info
-        claims = get_jwt()
-        user_id = claims.get('id')
-        
-        # If user ID is not in claims, look it up by username
-        if not user_id:
-            user = User.query.filter_by(username=current_username).first()
-            if not user:
-                return jsonify({"msg": "User not found"}), 404
-            user_id = user.id
+        user_id = current_user.id
         
         if not request.is_json:
             return jsonify({"msg": "Missing JSON in request"}), 400
         
         # Check if quiz exists
         quiz = Quiz.query.get(quiz_id)
-        if not quiz:
+        if not quiz or quiz.is_deleted:
             return jsonify({"msg": "Quiz not found"}), 404
             
         data = request.json
         
+        # Retries of the same submission carry the same key and get the original result back
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key:
+            idempotency_key = str(idempotency_key)
+            if len(idempotency_key) > attempt_queue.MAX_KEY_LENGTH:
+                return jsonify({"msg": "Idempotency key is too long"}), 400
+            
+            original_result = find_submitted_attempt(user_id, quiz_id, idempotency_key)
+            if original_result:
+                print(f"Replayed submission for user {user_id}, quiz {quiz_id}")
+                return jsonify(original_result), 200
+        
         # Get the answers submitted by the user
         submitted_answers = data.get('answers', {})
-        print(f"Received answers: {submitted_answers}")
         
-        # Calculate score
-        questions = Question.query.filter_by(quiz_id=quiz_id).all()
+        if not question_pools.is_pooled(quiz):
+            return save_graded_attempt(
+                user_id, quiz_id, submitted_answers, data.get('time_taken', 0), idempotency_key
+            )
         
-        # Check if there are any questions for this quiz
-        if not questions:
-            return jsonify({"msg": "No questions found for this quiz"}), 400
-            
-        correct_answers = 0
-        question_results = []
+        # A pooled quiz is graded on the user's open draw, never the whole pool, and only once
+        if not data.get('draw'):
+            return jsonify({"msg": "Missing question draw for this quiz"}), 400
+        redis_conn = get_redis()
+        if redis_conn is None:
+            return jsonify({"msg": "Question draws are temporarily unavailable"}), 503
+        draw = question_pools.read_draw(redis_conn, user_id, quiz_id, data['draw'])
+        if draw is None:
+            return jsonify({"msg": "Invalid or already submitted question draw"}), 400
+        if not question_pools.claim_draw(redis_conn, user_id, quiz_id, draw):
+            return jsonify({"msg": "Question draw is already being submitted"}), 409
         
-        for question in questions:
-            # Convert question ID to string for comparison with JSON keys
-            question_id_str = str(question.id)
-            
-            # Check if the user answered this question and if it's correct
-            is_correct = False
-            user_answer = None
-            
-            if question_id_str in submitted_answers:
-                user_answer = submitted_answers[question_id_str]
-                # Ensure user_answer and correct_option are comparable
-                try:
-                    # Convert both to integers for reliable comparison
-                    user_answer_int = int(user_answer) if user_answer is not None else None
-                    correct_option_int = int(question.correct_option) if question.correct_option is not None else None
-                    
-                    # Debug output
-                    print(f"Question {question.id}: User answer = {user_answer_int} ({type(user_answer_int)}), Correct = {correct_option_int} ({type(correct_option_int)})")
-                    
-                    is_correct = user_answer_int == correct_option_int
-                    
-                    if is_correct:
-                        correct_answers += 1
-                        print(f"✓ Correct answer for question {question.id}")
-                    else:
-                        print(f"✗ Wrong answer for question {question.id}")
-                        
-                except (ValueError, TypeError) as e:
-                    print(f"Error comparing answers for question {question.id}: {str(e)}")
-                    is_correct = False
-            
-            # Store details about each question for debugging
-            question_results.append({
-                'question_id': question.id,
-                'question_text': question.question_text,
-                'user_answer': user_answer,
-                'correct_answer': question.correct_option,
-                'is_correct': is_correct
-            })
+        saved = False
+        try:
+            response, status = save_graded_attempt(
+                user_id, quiz_id, submitted_answers, data.get('time_taken', 0), idempotency_key, draw
+            )
+            saved = status < 400
+            return response, status
+        finally:
+            if not saved:
+                # Failed or errored: the client may retry with the same draw
+                question_pools.release_draw(redis_conn, user_id, quiz_id, draw)
+    except Exception as e:
+        print(f"Error processing quiz attempt: {str(e)}")
+        return jsonify({"msg": f"Error processing quiz attempt: {str(e)}"}), 500
+
+@api.route('/api/quizzes/<int:quiz_id>/draw', methods=['POST'])
+@jwt_required()
+def draw_quiz_questions(quiz_id):
+    # Questions for an attempt on a pooled quiz submitted without a quiz session
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz or quiz.is_deleted:
+        return jsonify({"msg": "Quiz not found"}), 404
+    if not question_pools.is_pooled(quiz):
+        return jsonify({"msg": "Quiz does not draw its questions from a pool"}), 400
+    
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return jsonify({"msg": "Question draws are temporarily unavailable"}), 503
+    
+    # Drawing again before submitting returns the same questions
+    draw = question_pools.open_draw(redis_conn, current_user.id, quiz)
+    if draw is None:
+        return jsonify({"msg": "No questions found for this quiz"}), 400
+    
+    return jsonify({
+        'draw': question_pools.sign_draw(current_user.id, quiz_id, draw),
+        'questions': question_pools.question_views(question_pools.load_drawn_questions(draw))
+    }), 201
+
+# Quiz sessions: server-timed attempts with answers autosaved to Redis (see quiz_sessions.py)
+def session_response(session):
+    """Session state with its saved answers, and its questions when they were drawn for it"""
+    view = quiz_sessions.session_view(session, session['answers'])
+    if session['draw'] is not None:
+        view['questions'] = question_pools.question_views(question_pools.load_drawn_questions(session['draw']))
+    return view
+
+def load_own_session(session_id, with_answers=False):
+    """
+    Load one of the current user's quiz sessions.
+    
+    Returns:
+        tuple: (redis client, session, None) or (None, None, error response)
+    """
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return None, None, (jsonify({"msg": "Quiz sessions are temporarily unavailable"}), 503)
+    session = quiz_sessions.get_session(redis_conn, session_id, with_answers)
+    if session is None or session['user_id'] != current_user.id:
+        return None, None, (jsonify({"msg": "Quiz session not found"}), 404)
+    return redis_conn, session, None
+
+@api.route('/api/quizzes/<int:quiz_id>/sessions', methods=['POST'])
+@jwt_required()
+def start_quiz_session(quiz_id):
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz or quiz.is_deleted:
+        return jsonify({"msg": "Quiz not found"}), 404
+    
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return jsonify({"msg": "Quiz sessions are temporarily unavailable"}), 503
+    
+    # An open session on the same quiz is resumed with its saved answers and its own questions
+    session = quiz_sessions.get_open_session(redis_conn, current_user.id, quiz_id)
+    if session is not None:
+        return jsonify(session_response(session)), 201
+    
+    # A pooled quiz draws the new session's questions now
+    draw = None
+    if question_pools.is_pooled(quiz):
+        draw = question_pools.new_draw(quiz, redis_conn)
+        if draw is None:
+            return jsonify({"msg": "No questions found for this quiz"}), 400
+    
+    # start_session still resumes a session another request opened in the meantime
+    session = quiz_sessions.start_session(redis_conn, current_user.id, quiz_id, quiz.duration, draw)
+    return jsonify(session_response(session)), 201
+
+@api.route('/api/quiz-sessions/<session_id>', methods=['GET'])
+@jwt_required()
+def get_quiz_session_state(session_id):
+    redis_conn, session, error = load_own_session(session_id, with_answers=True)
+    if error:
+        return error
+    return jsonify(session_response(session)), 200
+
+@api.route('/api/quiz-sessions/<session_id>/answers', methods=['PUT'])
+@jwt_required()
+def save_quiz_session_answers(session_id):
+    if not request.is_json:
+        return jsonify({"msg": "Missing JSON in request"}), 400
+    
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"msg": "Request body must be a JSON object"}), 400
+    
+    redis_conn, session, error = load_own_session(session_id)
+    if error:
+        return error
+    if not quiz_sessions.is_open(session):
+        return jsonify({"msg": "Quiz session has ended"}), 409
+    
+    # Only the answers changed since the last save are sent
+    try:
+        saved = quiz_sessions.save_answers(redis_conn, session, data.get('answers') or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"msg": f"Invalid answers: {str(e)}"}), 400
+    
+    return jsonify({
+        'saved': saved,
+        'remaining_seconds': quiz_sessions.session_view(session)['remaining_seconds']
+    }), 200
+
+@api.route('/api/quiz-sessions/<session_id>/submit', methods=['POST'])
+@jwt_required()
+@rate_limited('attempt')
+def submit_quiz_session(session_id):
+    try:
+        redis_conn, session, error = load_own_session(session_id)
+        if error:
+            return error
+        user_id = current_user.id
+        quiz_id = session['quiz_id']
         
-        total_questions = len(questions)
-        score_value = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+        # Answers not autosaved yet may come with the submission, until the grace period ends
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({"msg": "Request body must be a JSON object"}), 400
+        final_answers = data.get('answers') or {}
+        if final_answers and quiz_sessions.is_open(session):
+            try:
+                quiz_sessions.save_answers(redis_conn, session, final_answers)
+            except (TypeError, ValueError) as e:
+                return jsonify({"msg": f"Invalid answers: {str(e)}"}), 400
         
-        print(f"Score calculation: {correct_answers}/{total_questions} = {score_value}%")
-        print(f"Question results: {question_results}")
+        # The session ID is the idempotency key, so retries get the original result
+        original_result = find_submitted_attempt(user_id, quiz_id, session_id)
+        if original_result:
+            return jsonify(original_result), 200
+        if not quiz_sessions.claim_session(redis_conn, session_id):
+            return jsonify({"msg": "Quiz session is already being submitted"}), 409
         
-        # Create score record
+        closed = False
         try:
-            # Generate a professional-looking ID
-            print(f"Generating score ID for user {user_id}, quiz {quiz_id}")
-            new_id = utils.get_next_id(db.session, Score, 'score')
-            print(f"Generated score ID: {new_id}")
+            quiz = Quiz.query.get(quiz_id)
+            if not quiz or quiz.is_deleted:
+                quiz_sessions.close_session(redis_conn, session)
+                closed = True
+                return jsonify({"msg": "Quiz not found"}), 404
             
-            score = Score(
-                id=new_id,
-                user_id=user_id,
-                quiz_id=quiz_id,
-                score=score_value,
-                total_questions=total_questions,
-                correct_answers=correct_answers,
-                time_taken=data.get('time_taken', 0)
+            # Grade what Redis holds, timed by the server clock
+            submitted_answers = quiz_sessions.get_session(redis_conn, session_id, with_answers=True)['answers']
+            response, status = save_graded_attempt(
+                user_id, quiz_id, submitted_answers, quiz_sessions.time_taken(session), session_id, session['draw']
             )
-            
-            print(f"Adding score to session: {score.id}, user: {score.user_id}, quiz: {score.quiz_id}")
-            db.session.add(score)
-            db.session.commit()
-            print(f"Score saved successfully with ID: {score.id}")
-            
-            # Ensure SQLite sequence is updated
-            utils.ensure_id_sequence(db.session, Score, 'score')
-            print(f"SQLite sequence updated for score table")
-            
-            return jsonify({
-                'id': score.id,
-                'quiz_id': score.quiz_id,
-                'score': score.score,
-                'total_questions': score.total_questions,
-                'correct_answers': score.correct_answers,
-                'time_taken': score.time_taken,
-                'timestamp': score.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'question_results': question_results
-            }), 201
-        except Exception as e:
-            db.session.rollback()
-            print(f"Error saving score: {str(e)}")
-            return jsonify({"msg": f"Error saving score: {str(e)}"}), 500
-            
+            if status < 400:
+                quiz_sessions.close_session(redis_conn, session)
+                closed = True
+            return response, status
+        finally:
+            if not closed:
+                # Failed or errored: let the client retry, or the sweep finalize it
+                redis_conn.zadd(quiz_sessions.EXPIRING_KEY, {session_id: session['expires_at']})
     except Exception as e:
-        print(f"Error processing quiz attempt: {str(e)}")
-        return jsonify({"msg": f"Error processing quiz attempt: {str(e)}"}), 500
+        print(f"Error submitting quiz session: {str(e)}")
+        return jsonify({"msg": f"Error submitting quiz session: {str(e)}"}), 500
 
 # User scores
-@app.route('/api/users/scores', methods=['GET'])
+@api.route('/api/users/scores', methods=['GET'])
 @jwt_required()
 def get_user_scores():
-    current_username = get_jwt_identity()
-    # Get additional claims to access user info
-    claims = get_jwt()
-    user_id = claims.get('id')
-    
-    # If user ID is not in claims, look it up by username
-    if not user_id:
-        user = User.query.filter_by(username=current_username).first()
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
-        user_id = user.id
+    user_id = current_user.id
     
     # Get all user scores
     scores = Score.query.filter_by(user_id=user_id).all()
     
+    # Attempts still queued by the write-behind mode, so students see their own submissions
+    pending_attempts = []
+    if current_app.config['ATTEMPT_WRITE_BEHIND']:
+        redis_conn = get_redis()
+        if redis_conn is not None:
+            stored_keys = {score.idempotency_key for score in scores if score.idempotency_key}
+            pending_attempts = [
+                attempt for attempt in attempt_queue.get_pending_attempts(redis_conn, user_id)
+                if attempt['idempotency_key'] not in stored_keys
+            ]
+    
     # Build detailed score list
     score_details = []
     for score in scores:
@@ -928,13 +1439,32 @@ def get_user_scores():
             'timestamp': score.timestamp.strftime('%Y-%m-%d %H:%M:%S')
         })
     
+    for attempt in pending_attempts:
+        quiz = Quiz.query.get(attempt['quiz_id'])
+        chapter = Chapter.query.get(quiz.chapter_id) if quiz else None
+        subject = Subject.query.get(chapter.subject_id) if chapter else None
+        
+        score_details.append({
+            'id': None,
+            'quiz_id': attempt['quiz_id'],
+            'quiz_title': quiz.title if quiz else "Unknown Quiz",
+            'chapter_name': chapter.name if chapter else "Unknown Chapter",
+            'subject_name': subject.name if subject else "Unknown Subject",
+            'score': attempt['score'],
+            'total_questions': attempt['total_questions'],
+            'correct_answers': attempt['correct_answers'],
+            'time_taken': attempt['time_taken'],
+            'timestamp': attempt['timestamp'],
+            'pending': True
+        })
+    
     # Get count of all subjects
-    subjects_count = Subject.query.count()
+    subjects_count = Subject.query.filter_by(is_deleted=False).count()
     
     # Calculate average score
     average_score = 0
-    if scores:
-        average_score = round(sum(score.score for score in scores) / len(scores), 1)
+    if score_details:
+        average_score = round(sum(detail['score'] for detail in score_details) / len(score_details), 1)
     
     # Get recent scores (last 5)
     recent_scores = []
@@ -946,46 +1476,169 @@ def get_user_scores():
             'score': round(score_detail['score'], 1)
         })
     
-    # Calculate subject progress
-    subject_progress = []
-    subjects = Subject.query.all()
-    
-    for subject in subjects:
-        # Get all chapters for this subject
-        chapters = Chapter.query.filter_by(subject_id=subject.id).all()
-        chapter_ids = [chapter.id for chapter in chapters]
-        
-        # Get all quizzes for these chapters
-        quizzes = Quiz.query.filter(Quiz.chapter_id.in_(chapter_ids)).all()
-        quiz_ids = [quiz.id for quiz in quizzes]
-        
-        # Get all scores for these quizzes by this user
-        user_scores = Score.query.filter(Score.quiz_id.in_(quiz_ids), Score.user_id == user_id).all()
-        
-        # Calculate progress percentage based on quizzes attempted vs total quizzes
-        progress = 0
-        if quizzes:
-            completed_quizzes = len(set(score.quiz_id for score in user_scores))
-            progress = round((completed_quizzes / len(quizzes)) * 100)
-        
-        subject_progress.append({
-            'id': subject.id,
-            'name': subject.name,
-            'progress': progress
-        })
+    # Subject progress is kept up to date on every attempt and catalog change
+    subject_progress = progress.get_subject_progress(
+        user_id, {attempt['quiz_id'] for attempt in pending_attempts}
+    )
     
     return jsonify({
         'scores': score_details,
         'subjects_count': subjects_count,
-        'attempts_count': len(scores),
+        'attempts_count': len(score_details),
         'average_score': average_score,
         'recent_scores': recent_scores,
         'subject_progress': subject_progress
     }), 200
 
+@api.route('/api/admin/quizzes/<int:quiz_id>/item-analysis', methods=['GET'])
+@jwt_required()
+def get_item_analysis(quiz_id):
+    # Check admin privileges
+    admin_check = check_admin_access()
+    if admin_check:
+        return admin_check
+    
+    Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
+    
+    import item_analysis
+    # The cached analysis stays valid until an attempt is added or removed
+    version = item_analysis.get_attempts_version(quiz_id)
+    redis_conn = get_redis()
+    cached = item_analysis.get_cached_analysis(redis_conn, quiz_id) if redis_conn is not None else None
+    if cached and cached['version'] == version:
+        return jsonify(cached), 200
+    
+    job = queue_item_analysis(quiz_id, redis_conn)
+    if job.ready() and job.successful():
+        return jsonify(job.result), 200
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': 'computing',
+        'stale_result': cached
+    }), 202
+
+@api.route('/api/admin/question-duplicates', methods=['GET'])
+@jwt_required()
+def get_question_duplicates():
+    # Check admin privileges
+    admin_check = check_admin_access()
+    if admin_check:
+        return admin_check
+    
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    def page(result):
+        return dict(result, total_clusters=len(result['clusters']), clusters=result['clusters'][offset:offset + limit],
+                    limit=limit, offset=offset)
+    
+    import near_duplicates
+    # The cached scan stays valid until a question is added, edited or removed
+    version = near_duplicates.get_bank_version()
+    redis_conn = get_redis()
+    cached = near_duplicates.get_cached_clusters(redis_conn) if redis_conn is not None else None
+    if cached and cached['version'] == version:
+        return jsonify(page(cached)), 200
+    
+    job = queue_duplicate_scan(redis_conn)
+    if job.ready() and job.successful():
+        return jsonify(page(job.result)), 200
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': 'computing',
+        'stale_result': page(cached) if cached else None
+    }), 202
+
+# Per-question answers of a stored attempt
+@api.route('/api/scores/<int:score_id>/answers', methods=['GET'])
+@jwt_required()
+def get_score_answers(score_id):
+    score = Score.query.get_or_404(score_id)
+    
+    # Students may only see their own attempts
+    if not current_user.is_admin and score.user_id != current_user.id:
+        return jsonify({"msg": "Not allowed to view this attempt"}), 403
+    
+    detail = AttemptDetail.query.get(score_id)
+    if not detail:
+        return jsonify({"msg": "No answer details stored for this attempt"}), 404
+    
+    return jsonify({
+        'score_id': score.id,
+        'quiz_id': score.quiz_id,
+        'answers': attempt_detail.decode_detail(detail)
+    }), 200
+
+# Leaderboards
+@api.route('/api/leaderboards/<scope>/<int:scope_id>', methods=['GET'])
+@jwt_required()
+def get_leaderboard(scope, scope_id):
+    if scope not in leaderboard.SCOPES:
+        return jsonify({"msg": "Unknown leaderboard"}), 404
+    
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return jsonify({"msg": "Leaderboards are temporarily unavailable"}), 503
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    
+    return jsonify({
+        'scope': scope,
+        'scope_id': scope_id,
+        'leaders': leaderboard.get_top(redis_conn, scope, scope_id, limit)
+    }), 200
+
+@api.route('/api/leaderboards/<scope>/<int:scope_id>/me', methods=['GET'])
+@jwt_required()
+def get_my_rank(scope, scope_id):
+    user_id = current_user.id
+    
+    if scope not in leaderboard.SCOPES:
+        return jsonify({"msg": "Unknown leaderboard"}), 404
+    
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return jsonify({"msg": "Leaderboards are temporarily unavailable"}), 503
+    
+    return jsonify({
+        'scope': scope,
+        'scope_id': scope_id,
+        'user_id': user_id,
+        **leaderboard.get_rank(redis_conn, scope, scope_id, user_id)
+    }), 200
+
 # Statistics routes for admin
-@app.route('/api/admin/statistics', methods=['GET'])
+@api.route('/api/admin/quizzes/<int:quiz_id>/question-stats', methods=['GET'])
+@jwt_required()
+@reads_from_replica
+def get_question_stats(quiz_id):
+    # Check admin privileges
+    admin_check = check_admin_access()
+    if admin_check:
+        return admin_check
+    
+    Quiz.query.filter_by(id=quiz_id, is_deleted=False).first_or_404()
+    stats = attempt_detail.question_stats(quiz_id)
+    questions = Question.query.filter(Question.id.in_(stats.keys())).all() if stats else []
+    question_texts = {question.id: question.question_text for question in questions}
+    
+    return jsonify({
+        'quiz_id': quiz_id,
+        'questions': [
+            {
+                'question_id': question_id,
+                'question_text': question_texts.get(question_id, "Deleted Question"),
+                **entry
+            }
+            for question_id, entry in sorted(stats.items())
+        ]
+    }), 200
+
+@api.route('/api/admin/statistics', methods=['GET'])
 @jwt_required()
+@reads_from_replica
 def get_admin_statistics():
     # Check admin privileges
     admin_check = check_admin_access()
@@ -993,10 +1646,10 @@ def get_admin_statistics():
         return admin_check
     
     # Count total users, subjects, chapters, quizzes
-    user_count = User.query.filter_by(is_admin=False).count()
-    subject_count = Subject.query.count()
-    chapter_count = Chapter.query.count()
-    quiz_count = Quiz.query.count()
+    user_count = User.query.filter_by(is_admin=False, is_deleted=False).count()
+    subject_count = Subject.query.filter_by(is_deleted=False).count()
+    chapter_count = Chapter.query.filter_by(is_deleted=False).count()
+    quiz_count = Quiz.query.filter_by(is_deleted=False).count()
     question_count = Question.query.count()
     attempt_count = Score.query.count()
     
@@ -1012,7 +1665,7 @@ def get_admin_statistics():
         print("Quiz IDs without chapters:", [q.id for q in quizzes_without_chapters])
     
     # Get average scores per subject
-    subjects = Subject.query.all()
+    subjects = Subject.query.filter_by(is_deleted=False).all()
     subject_scores = []
     
     for subject in subjects:
@@ -1181,8 +1834,63 @@ def get_admin_statistics():
         'quiz_distribution': quiz_distribution
     }), 200
 
+# Live exam monitoring (Server-Sent Events)
+@api.route('/api/admin/live', methods=['GET'])
+@jwt_required()
+def get_live_metrics():
+    # Check admin privileges
+    admin_check = check_admin_access()
+    if admin_check:
+        return admin_check
+    
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return jsonify({"msg": "Live monitoring is temporarily unavailable"}), 503
+    
+    # Each stream holds a worker thread for as long as it is open
+    if not live_monitor.feed.add_watcher(current_app.config['LIVE_MAX_WATCHERS']):
+        response = jsonify({"msg": "Too many live monitor connections, use the async server or retry later"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(live_monitor.KEEPALIVE_SECONDS)
+        return response
+    
+    # Every watcher is sent the snapshots of this process's single aggregator
+    live_monitor.feed.ensure_started(redis_conn)
+    response = Response(live_monitor.feed.watch(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the client disconnects and the server closes the stream
+    response.call_on_close(live_monitor.feed.remove_watcher)
+    return response
+
+# Background job status
+@api.route('/api/admin/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    # Check admin privileges
+    admin_check = check_admin_access()
+    if admin_check:
+        return admin_check
+    
+    from workers import celery
+    job = celery.AsyncResult(job_id)
+    response = {
+        'job_id': job_id,
+        'status': job.state
+    }
+    
+    if job.state == 'PROGRESS':
+        response['progress'] = job.info
+    elif job.state == 'SUCCESS':
+        response['result'] = job.result
+    elif job.state == 'FAILURE':
+        response['error'] = str(job.info)
+    
+    return jsonify(response), 200
+
 # Test route to check database operations
-@app.route('/api/test-db', methods=['GET'])
+@api.route('/api/test-db', methods=['GET'])
 def test_db():
     try:
         # Test read operation
@@ -1210,45 +1918,17 @@ def test_db():
 def ensure_app_context(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if app.app_context().get_current_object() is None:
-            with app.app_context():
+        if not has_app_context():
+            with create_app().app_context():
                 return func(*args, **kwargs)
         else:
             return func(*args, **kwargs)
     return wrapper
 
 if __name__ == '__main__':
-    # Create the database directory if it doesn't exist
-    db_dir = os.path.dirname(db_path)
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir)
-    
-    # Initialize database within app context
-    with app.app_context():
-        try:
-            db.create_all()
-            print("Database tables created successfully!")
-            
-            # Check if admin user exists, if not create one
-            admin = User.query.filter_by(is_admin=True).first()
-            if not admin:
-                admin = User(
-                    username='admin',
-                    full_name='Administrator',
-                    email='admin@quizmaster.com',
-                    is_admin=True
-                )
-                admin.set_password('admin123')  # Change this in production
-                db.session.add(admin)
-                db.session.commit()
-                print("Admin user created successfully!")
-            else:
-                print("Admin user already exists!")
-                
-            # Print the database path for verification
-            print(f"Using database at: {db_path}")
-        except Exception as e:
-            print(f"Error initializing database: {str(e)}")
-    
-    # Run the app
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    # Development server: prepare the database, then serve with Flask's reloader.
+    # In production run `python bootstrap.py` once and serve wsgi:app with gunicorn.
+    from bootstrap import bootstrap_database
+    app = create_app()
+    bootstrap_database(app)
+    app.run(debug=True, host='0.0.0.0', port=5000) 
@@ -0,0 +1,402 @@
+"""
+Asynchronous server for the read-only catalog routes.
+
+During exam windows most requests only read subjects, chapters, quizzes and
+questions. This ASGI app serves those GET routes from a single event loop
+with a small pool of read-only aiosqlite connections, so thousands of open
+connections no longer need a Flask worker thread each. Responses are
+byte-for-byte what the Flask routes return (same keys, order and encoding).
+
+It is optional: install requirements-async.txt and run it next to the Flask
+API, routing the GET paths below to it at the reverse proxy:
+    uvicorn async_api:app --port 5001
+
+    GET /api/subjects
+    GET /api/subjects/<id>
+    GET /api/subjects/<id>/chapters
+    GET /api/chapters/<id>
+    GET /api/chapters/<id>/quizzes
+    GET /api/quizzes/<id>
+    GET /api/quizzes/<id>/questions   (JWT required)
+    GET /api/admin/live               (admin JWT, Server-Sent Events, see live_monitor.py)
+
+Compare it with the threaded Flask server using benchmark_read_api.py.
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+import aiosqlite
+import jwt as pyjwt
+import redis
+import redis.asyncio as aioredis
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import NotFound
+from base_app import db_path
+from redis_client import REDIS_URL
+import live_monitor
+import token_blocklist
+
+# Read connections kept open; each one runs its queries on its own thread
+POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', 8))
+
+# Seconds a user's token version is reused before it is read again (as auth_context.py)
+USER_CACHE_TTL = 60
+
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'super-secret-key')
+
+class ConnectionPool:
+    """Fixed set of read-only aiosqlite connections handed out one request at a time"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = asyncio.Queue()
+
+    async def open(self):
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.row_factory = aiosqlite.Row
+            await self._idle.put(conn)
+
+    async def close(self):
+        while not self._idle.empty():
+            conn = await self._idle.get()
+            await conn.close()
+
+    async def fetch_all(self, sql, params=()):
+        conn = await self._idle.get()
+        try:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def fetch_one(self, sql, params=()):
+        rows = await self.fetch_all(sql, params)
+        return rows[0] if rows else None
+
+class AsyncLiveFeed:
+    """Live monitoring aggregator of this server: one subscriber task, any number of watchers"""
+
+    def __init__(self):
+        self.snapshot = None
+        self.version = 0
+        self._pushed = asyncio.Event()
+        self._task = None
+        self._redis = None
+
+    async def ensure_started(self):
+        """Start the aggregator on the first watcher; False if Redis is unreachable"""
+        if self._task is not None and not self._task.done():
+            return True
+        if self._redis is None:
+            self._redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            await self._redis.ping()
+        except redis.RedisError as e:
+            print(f"Warning: Redis unavailable at {REDIS_URL}: {str(e)}")
+            return False
+        self._task = asyncio.create_task(self.run())
+        return True
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._redis is not None:
+            await self._redis.close()
+
+    def publish(self, snapshot):
+        self.snapshot = snapshot
+        self.version += 1
+        # Wake every waiting watcher at once; later waiters get a fresh event
+        pushed, self._pushed = self._pushed, asyncio.Event()
+        pushed.set()
+
+    async def run(self):
+        metrics = live_monitor.LiveMetrics()
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Subscribe before loading the totals so no attempt falls in between;
+                # attempts already in the totals are skipped by their seq
+                await pubsub.subscribe(live_monitor.CHANNEL)
+                metrics.day = None
+                next_push = time.monotonic()
+                while True:
+                    day = live_monitor.today()
+                    if day != metrics.day:
+                        totals = await self._redis.hgetall(live_monitor.QUIZ_TOTALS_KEY.format(day=day))
+                        metrics.load_totals(day, totals)
+                    # Apply everything that arrived before the next push is due
+                    while True:
+                        message = await pubsub.get_message(timeout=max(0.0, next_push - time.monotonic()))
+                        if message is None:
+                            break
+                        metrics.apply(message['data'])
+                    now = time.time()
+                    active_sessions = await self._redis.zcount(
+                        live_monitor.quiz_sessions.EXPIRING_KEY,
+                        now - live_monitor.quiz_sessions.GRACE_SECONDS, '+inf'
+                    )
+                    metrics.tick(now, active_sessions)
+                    if metrics.changed or self.snapshot is None:
+                        self.publish(metrics.snapshot())
+                    next_push = time.monotonic() + live_monitor.PUSH_INTERVAL
+            except redis.RedisError as e:
+                print(f"Live monitor lost Redis, reconnecting: {str(e)}")
+                await asyncio.sleep(live_monitor.PUSH_INTERVAL)
+            finally:
+                await pubsub.close()
+
+    async def watch(self):
+        """Stream of one watcher, starting with the current snapshot"""
+        seen = 0
+        yield "retry: 5000\n\n"
+        while True:
+            if self.version == seen:
+                try:
+                    await asyncio.wait_for(self._pushed.wait(), live_monitor.KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                continue
+            seen = self.version
+            yield live_monitor.sse_message(self.snapshot)
+
+def database_path():
+    """Database file of the Flask app (DATABASE_URL or the bundled quizmaster.db)"""
+    url = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
+    return url.replace('sqlite:///', '', 1)
+
+pool = ConnectionPool(database_path(), POOL_SIZE)
+live_feed = AsyncLiveFeed()
+_token_versions = {}
+
+def flask_json(data, status_code=200):
+    """Serialise like Flask's jsonify: sorted keys, compact, ASCII, trailing newline"""
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) + '\n'
+    return Response(body, status_code=status_code, media_type='application/json')
+
+def not_found():
+    """The HTML page Flask's first_or_404 answers with"""
+    return Response(NotFound().get_body(), status_code=404, media_type='text/html')
+
+def format_timestamp(value):
+    return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+
+async def get_claims(request):
+    """
+    Validate the access token the way the Flask routes do.
+
+    Returns:
+        tuple: (claims, None) or (None, error response)
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None, flask_json({"msg": "Missing Authorization Header"}, 401)
+    try:
+        claims = pyjwt.decode(header[len('Bearer '):], JWT_SECRET_KEY, algorithms=['HS256'])
+    except pyjwt.ExpiredSignatureError:
+        return None, flask_json({"msg": "Token has expired"}, 401)
+    except pyjwt.InvalidTokenError as e:
+        return None, flask_json({"msg": str(e)}, 422)
+    if claims.get('type') != 'access':
+        return None, flask_json({"msg": "Only non-refresh tokens are allowed"}, 422)
+
+    if await asyncio.to_thread(token_blocklist.is_token_revoked, None, claims):
+        return None, flask_json({"msg": "Token has been revoked"}, 401)
+
+    # Same rule as auth_context.load_user: the token must match the user's current version
+    user_id = claims.get('id')
+    cached = _token_versions.get(user_id)
+    if not cached or cached[0] <= time.monotonic():
+        row = await pool.fetch_one(
+            "SELECT COALESCE(token_version, 0), COALESCE(is_deleted, 0) FROM user WHERE id = ?", (user_id,)
+        )
+        version = row[0] if row and not row[1] else None
+        cached = (time.monotonic() + USER_CACHE_TTL, version)
+        _token_versions[user_id] = cached
+    if cached[1] is None or cached[1] != claims.get('ver', 0):
+        return None, flask_json({"msg": f"Error loading the user {claims.get('sub')}"}, 401)
+    return claims, None
+
+async def get_subjects(request):
+    rows = await pool.fetch_all(
+        "SELECT id, name, description FROM subject WHERE is_deleted = 0"
+    )
+    return flask_json({
+        'subjects': [
+            {'id': row['id'], 'name': row['name'], 'description': row['description']}
+            for row in rows
+        ]
+    })
+
+async def get_subject_by_id(request):
+    row = await pool.fetch_one(
+        "SELECT id, name, description FROM subject WHERE id = ? AND is_deleted = 0",
+        (request.path_params['subject_id'],)
+    )
+    if not row:
+        return not_found()
+    return flask_json({'id': row['id'], 'name': row['name'], 'description': row['description']})
+
+async def get_chapters(request):
+    subject_id = request.path_params['subject_id']
+    if not await pool.fetch_one("SELECT 1 FROM subject WHERE id = ? AND is_deleted = 0", (subject_id,)):
+        return not_found()
+    rows = await pool.fetch_all(
+        "SELECT id, name, description, subject_id FROM chapter WHERE subject_id = ? AND is_deleted = 0",
+        (subject_id,)
+    )
+    return flask_json({
+        'chapters': [
+            {
+                'id': row['id'],
+                'name': row['name'],
+                'description': row['description'],
+                'subject_id': row['subject_id']
+            }
+            for row in rows
+        ]
+    })
+
+async def get_chapter_by_id(request):
+    row = await pool.fetch_one(
+        "SELECT id, name, description, subject_id FROM chapter WHERE id = ? AND is_deleted = 0",
+        (request.path_params['chapter_id'],)
+    )
+    if not row:
+        return not_found()
+    return flask_json({
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'],
+        'subject_id': row['subject_id']
+    })
+
+async def get_quizzes(request):
+    chapter_id = request.path_params['chapter_id']
+    if not await pool.fetch_one("SELECT 1 FROM chapter WHERE id = ? AND is_deleted = 0", (chapter_id,)):
+        return not_found()
+    # Question counts come from one grouped query instead of one query per quiz
+    rows = await pool.fetch_all("""
+        SELECT quiz.id, quiz.title, quiz.description, quiz.chapter_id, quiz.duration,
+               quiz.date_of_quiz, quiz.remarks, quiz.pool_size, quiz.draw_count,
+               COUNT(question.id) AS question_count
+        FROM quiz
+        LEFT JOIN question ON question.quiz_id = quiz.id
+        WHERE quiz.chapter_id = ? AND quiz.is_deleted = 0
+        GROUP BY quiz.id
+        ORDER BY quiz.rowid
+    """, (chapter_id,))
+    return flask_json({
+        'quizzes': [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'chapter_id': row['chapter_id'],
+                'duration': row['duration'],
+                'date_of_quiz': format_timestamp(row['date_of_quiz']),
+                'remarks': row['remarks'],
+                'question_count': row['question_count'],
+                'pool_size': row['pool_size'],
+                'draw_count': row['draw_count']
+            }
+            for row in rows
+        ]
+    })
+
+async def get_quiz_by_id(request):
+    row = await pool.fetch_one("""
+        SELECT quiz.id, quiz.title, quiz.description, quiz.duration, quiz.chapter_id,
+               quiz.pool_size, quiz.draw_count,
+               (SELECT COUNT(*) FROM question WHERE question.quiz_id = quiz.id) AS question_count
+        FROM quiz
+        WHERE quiz.id = ? AND quiz.is_deleted = 0
+    """, (request.path_params['quiz_id'],))
+    if not row:
+        return not_found()
+    return flask_json({
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'duration': row['duration'],
+        'chapter_id': row['chapter_id'],
+        'question_count': row['question_count'],
+        'pool_size': row['pool_size'],
+        'draw_count': row['draw_count']
+    })
+
+async def get_questions(request):
+    claims, error = await get_claims(request)
+    if error:
+        return error
+    quiz_id = request.path_params['quiz_id']
+    if not await pool.fetch_one("SELECT 1 FROM quiz WHERE id = ? AND is_deleted = 0", (quiz_id,)):
+        return not_found()
+    rows = await pool.fetch_all(
+        "SELECT id, quiz_id, question_text, option1, option2, option3, option4, correct_option "
+        "FROM question WHERE quiz_id = ?",
+        (quiz_id,)
+    )
+
+    # Only include correct answer for admins
+    is_admin = claims.get('is_admin', False)
+    result = []
+    for row in rows:
+        question_data = {
+            'id': row['id'],
+            'quiz_id': row['quiz_id'],
+            'question_text': row['question_text'],
+            'option1': row['option1'],
+            'option2': row['option2'],
+            'option3': row['option3'],
+            'option4': row['option4']
+        }
+        if is_admin:
+            question_data['correct_option'] = row['correct_option']
+        result.append(question_data)
+    return flask_json({'questions': result})
+
+async def get_live_metrics(request):
+    claims, error = await get_claims(request)
+    if error:
+        return error
+    if not claims.get('is_admin'):
+        return flask_json({"msg": "Admin privileges required"}, 403)
+    if not await live_feed.ensure_started():
+        return flask_json({"msg": "Live monitoring is temporarily unavailable"}, 503)
+    return StreamingResponse(live_feed.watch(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+app = Starlette(
+    routes=[
+        Route('/api/subjects', get_subjects),
+        Route('/api/subjects/{subject_id:int}', get_subject_by_id),
+        Route('/api/subjects/{subject_id:int}/chapters', get_chapters),
+        Route('/api/chapters/{chapter_id:int}', get_chapter_by_id),
+        Route('/api/chapters/{chapter_id:int}/quizzes', get_quizzes),
+        Route('/api/quizzes/{quiz_id:int}', get_quiz_by_id),
+        Route('/api/quizzes/{quiz_id:int}/questions', get_questions),
+        Route('/api/admin/live', get_live_metrics),
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["http://localhost:8080", "http://127.0.0.1:8080"],
+            allow_methods=['GET', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization', 'If-None-Match'],
+            allow_credentials=True
+        )
+    ],
+    on_startup=[pool.open],
+    on_shutdown=[pool.close, live_feed.close]
+)
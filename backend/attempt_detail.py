@@ -0,0 +1,312 @@
+"""
+Compact storage of per-question answers for quiz attempts.
+
+Each attempt is stored as a single AttemptDetail row instead of one row per question:
+  answers  - 2 bits per question holding (selected option - 1), 4 questions per byte
+  answered - bitmap, 1 bit per question
+  correct  - bitmap, 1 bit per question
+Bits are stored least significant first. The question order lives in a shared
+AttemptLayout row, so a 100-question attempt costs 51 bytes of answer data.
+
+Attempts on a quiz with a question pool (question_pools.py) each get a random
+subset of the pool in random order. Their layout is the whole pool, and the
+questions are recovered from it with draw_seed and draw_count by
+drawn_question_ids, so no per-attempt layout is stored.
+"""
+import base64
+from collections import Counter
+from sqlalchemy.exc import IntegrityError
+from models import db, AttemptLayout, AttemptDetail
+
+# Attempts fetched per round trip by question_stats
+ANALYTICS_CHUNK_SIZE = 5000
+
+# (quiz_id, question_ids) -> AttemptLayout.id, filled as layouts are looked up
+_layout_cache = {}
+
+MASK64 = (1 << 64) - 1
+
+def pack_options(options):
+    """Pack option numbers (1-4, or None for unanswered) into 2 bits each"""
+    packed = bytearray((len(options) + 3) // 4)
+    for index, option in enumerate(options):
+        if option:
+            packed[index >> 2] |= (option - 1) << ((index & 3) * 2)
+    return bytes(packed)
+
+def unpack_options(blob, count):
+    """Inverse of pack_options; unanswered questions decode as option 1"""
+    return [((blob[index >> 2] >> ((index & 3) * 2)) & 3) + 1 for index in range(count)]
+
+def pack_bits(flags):
+    """Pack a list of booleans into a bitmap"""
+    packed = bytearray((len(flags) + 7) // 8)
+    for index, flag in enumerate(flags):
+        if flag:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+def unpack_bits(blob, count):
+    """Inverse of pack_bits"""
+    return [bool((blob[index >> 3] >> (index & 7)) & 1) for index in range(count)]
+
+def get_layout_id(quiz_id, question_ids):
+    """
+    Get the AttemptLayout ID for a question order, creating the layout on first use.
+    The layout is committed on its own so it never depends on the attempt's transaction.
+    """
+    key = (quiz_id, ','.join(str(question_id) for question_id in question_ids))
+    layout_id = _layout_cache.get(key)
+    if layout_id is not None:
+        return layout_id
+
+    layout = AttemptLayout.query.filter_by(quiz_id=quiz_id, question_ids=key[1]).first()
+    if not layout:
+        try:
+            layout = AttemptLayout(quiz_id=quiz_id, question_ids=key[1])
+            db.session.add(layout)
+            db.session.commit()
+        except IntegrityError:
+            # Another request created the same layout first
+            db.session.rollback()
+            layout = AttemptLayout.query.filter_by(quiz_id=quiz_id, question_ids=key[1]).first()
+
+    _layout_cache[key] = layout.id
+    return layout.id
+
+def drawn_question_ids(pool_question_ids, seed, count):
+    """
+    Questions drawn from a pool, in the order they are asked.
+
+    A partial Fisher-Yates shuffle driven by SplitMix64 from the seed, so the same
+    pool, seed and count always give the same questions, in O(count) time.
+    """
+    size = len(pool_question_ids)
+    moved = {}
+    drawn = []
+    state = seed & MASK64
+    for index in range(min(count, size)):
+        state = (state + 0x9E3779B97F4A7C15) & MASK64
+        mixed = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        mixed = ((mixed ^ (mixed >> 27)) * 0x94D049BB133111EB) & MASK64
+        mixed ^= mixed >> 31
+        pick = index + mixed % (size - index)
+        drawn.append(moved.get(pick, pool_question_ids[pick]))
+        moved[pick] = moved.get(index, pool_question_ids[index])
+    return drawn
+
+def encode_attempt(question_results):
+    """
+    Pack graded question results into the three AttemptDetail blobs.
+
+    Args:
+        question_results (list): Dicts with 'user_answer' and 'is_correct', in layout order
+
+    Returns:
+        tuple: (answers, answered, correct) as bytes
+    """
+    options = []
+    for result in question_results:
+        try:
+            option = int(result['user_answer'])
+        except (TypeError, ValueError):
+            option = None
+        options.append(option if option in (1, 2, 3, 4) else None)
+
+    return (
+        pack_options(options),
+        pack_bits([option is not None for option in options]),
+        pack_bits([result['is_correct'] for result in question_results])
+    )
+
+def build_detail(score_id, quiz_id, question_results, draw=None):
+    """
+    Create the AttemptDetail row for a graded attempt.
+
+    Args:
+        draw (dict): Draw of a pooled attempt ('pool_version', 'seed', 'count', 'question_ids')
+    """
+    answers, answered, correct = encode_attempt(question_results)
+    question_ids = [result['question_id'] for result in question_results]
+    if draw is not None and question_ids == draw['question_ids']:
+        return AttemptDetail(
+            score_id=score_id,
+            layout_id=draw['pool_version'],
+            answers=answers,
+            answered=answered,
+            correct=correct,
+            draw_seed=draw['seed'],
+            draw_count=draw['count']
+        )
+    # Not drawn, or a drawn question was deleted before grading: store the order itself
+    return AttemptDetail(
+        score_id=score_id,
+        layout_id=get_layout_id(quiz_id, question_ids),
+        answers=answers,
+        answered=answered,
+        correct=correct
+    )
+
+def detail_to_record(detail):
+    """JSON-safe form of an unsaved AttemptDetail, used by the write-behind queue"""
+    return {
+        'layout_id': detail.layout_id,
+        'answers': base64.b64encode(detail.answers).decode('ascii'),
+        'answered': base64.b64encode(detail.answered).decode('ascii'),
+        'correct': base64.b64encode(detail.correct).decode('ascii'),
+        'draw_seed': detail.draw_seed,
+        'draw_count': detail.draw_count
+    }
+
+def detail_from_record(score_id, record):
+    """Inverse of detail_to_record"""
+    return AttemptDetail(
+        score_id=score_id,
+        layout_id=record['layout_id'],
+        answers=base64.b64decode(record['answers']),
+        answered=base64.b64decode(record['answered']),
+        correct=base64.b64decode(record['correct']),
+        # Records queued before question pools existed have no draw
+        draw_seed=record.get('draw_seed'),
+        draw_count=record.get('draw_count')
+    )
+
+def attempt_question_ids(detail, layout_question_ids):
+    """Questions of a stored attempt in answer order, given its parsed layout"""
+    if detail.draw_seed is None:
+        return layout_question_ids
+    return drawn_question_ids(layout_question_ids, detail.draw_seed, detail.draw_count)
+
+def decode_detail(detail, layout=None):
+    """
+    Unpack a stored attempt.
+
+    Returns:
+        list: One dict per question with question_id, user_answer (None if unanswered) and is_correct
+    """
+    layout = layout or AttemptLayout.query.get(detail.layout_id)
+    return unpack_attempt(detail, attempt_question_ids(
+        detail, [int(question_id) for question_id in layout.question_ids.split(',')]
+    ))
+
+def unpack_attempt(detail, question_ids):
+    """Unpack a stored attempt whose questions, in answer order, are known"""
+    count = len(question_ids)
+
+    options = unpack_options(detail.answers, count)
+    answered = unpack_bits(detail.answered, count)
+    correct = unpack_bits(detail.correct, count)
+
+    return [
+        {
+            'question_id': question_id,
+            'user_answer': options[index] if answered[index] else None,
+            'is_correct': correct[index]
+        }
+        for index, question_id in enumerate(question_ids)
+    ]
+
+def count_byte_columns(blobs, counters):
+    """Tally how often each byte value occurs at each position across equal-length blobs"""
+    for position, column in enumerate(zip(*blobs)):
+        counters[position].update(column)
+
+def question_stats(quiz_id):
+    """
+    Per-question correct rates and option counts across every stored attempt of a quiz.
+
+    Attempts are never unpacked individually: each byte position of the blobs is
+    tallied with a Counter, and the bit counts are expanded from the (at most 256)
+    distinct byte values afterwards. Drawn attempts are the exception, since every
+    one of them asks different questions at each position.
+
+    Returns:
+        dict: question_id -> {'attempts', 'answered', 'correct', 'correct_rate', 'option_counts'}
+    """
+    stats = {}
+
+    def add(question_id, attempts, answered, correct, option_counts):
+        entry = stats.setdefault(question_id, {
+            'attempts': 0, 'answered': 0, 'correct': 0, 'option_counts': [0, 0, 0, 0]
+        })
+        entry['attempts'] += attempts
+        entry['answered'] += answered
+        entry['correct'] += correct
+        entry['option_counts'] = [a + b for a, b in zip(entry['option_counts'], option_counts)]
+
+    layouts = AttemptLayout.query.filter_by(quiz_id=quiz_id).all()
+    for layout in layouts:
+        question_ids = [int(question_id) for question_id in layout.question_ids.split(',')]
+        count = len(question_ids)
+        answer_counters = [Counter() for _ in range((count + 3) // 4)]
+        answered_counters = [Counter() for _ in range((count + 7) // 8)]
+        correct_counters = [Counter() for _ in range((count + 7) // 8)]
+        attempts = 0
+
+        rows = db.session.query(AttemptDetail.answers, AttemptDetail.answered, AttemptDetail.correct) \
+            .filter(AttemptDetail.layout_id == layout.id, AttemptDetail.draw_seed.is_(None)) \
+            .yield_per(ANALYTICS_CHUNK_SIZE)
+
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == ANALYTICS_CHUNK_SIZE:
+                attempts += len(chunk)
+                count_byte_columns([r.answers for r in chunk], answer_counters)
+                count_byte_columns([r.answered for r in chunk], answered_counters)
+                count_byte_columns([r.correct for r in chunk], correct_counters)
+                chunk = []
+        if chunk:
+            attempts += len(chunk)
+            count_byte_columns([r.answers for r in chunk], answer_counters)
+            count_byte_columns([r.answered for r in chunk], answered_counters)
+            count_byte_columns([r.correct for r in chunk], correct_counters)
+
+        if not attempts:
+            continue
+
+        answered_totals = [0] * count
+        correct_totals = [0] * count
+        for totals, counters in ((answered_totals, answered_counters), (correct_totals, correct_counters)):
+            for position, counter in enumerate(counters):
+                for value, frequency in counter.items():
+                    for bit in range(8):
+                        index = position * 8 + bit
+                        if index < count and (value >> bit) & 1:
+                            totals[index] += frequency
+
+        option_totals = [[0, 0, 0, 0] for _ in range(count)]
+        for position, counter in enumerate(answer_counters):
+            for value, frequency in counter.items():
+                for slot in range(4):
+                    index = position * 4 + slot
+                    if index < count:
+                        option_totals[index][(value >> (slot * 2)) & 3] += frequency
+
+        for index, question_id in enumerate(question_ids):
+            # Unanswered questions are packed as option 1
+            option_totals[index][0] -= attempts - answered_totals[index]
+            add(question_id, attempts, answered_totals[index], correct_totals[index], option_totals[index])
+
+    # Drawn attempts are unpacked one by one against their pool
+    pools = {layout.id: layout for layout in layouts}
+    pool_question_ids = {}
+    drawn = AttemptDetail.query \
+        .filter(AttemptDetail.layout_id.in_(list(pools)), AttemptDetail.draw_seed.isnot(None)) \
+        .yield_per(ANALYTICS_CHUNK_SIZE)
+    for detail in drawn:
+        if detail.layout_id not in pool_question_ids:
+            pool_question_ids[detail.layout_id] = [
+                int(question_id) for question_id in pools[detail.layout_id].question_ids.split(',')
+            ]
+        question_ids = attempt_question_ids(detail, pool_question_ids[detail.layout_id])
+        for result in unpack_attempt(detail, question_ids):
+            option_counts = [0, 0, 0, 0]
+            if result['user_answer'] is not None:
+                option_counts[result['user_answer'] - 1] = 1
+            add(result['question_id'], 1, int(result['user_answer'] is not None), int(result['is_correct']), option_counts)
+
+    for entry in stats.values():
+        entry['correct_rate'] = round(entry['correct'] / entry['attempts'], 4) if entry['attempts'] else 0
+
+    return stats
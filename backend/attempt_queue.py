@@ -0,0 +1,301 @@
+"""
+Write-behind queue for quiz attempts.
+
+When ATTEMPT_WRITE_BEHIND is enabled, submit_quiz_attempt grades the attempt,
+pushes the Score record to a Redis stream and answers the student right away.
+A consumer (the flush_attempt_queue Celery task, or this module run as a
+script) drains the stream into SQLite in batched transactions. An entry that
+cannot be written (malformed, or rejected by the database) is moved to the
+DEAD_LETTER_KEY stream with its error and acknowledged, so it does not block
+the entries behind it.
+
+It also holds the idempotency-key result cache used by both submission modes,
+so a retried submission returns the original result without re-grading.
+
+Run a dedicated consumer from the backend directory with:
+    python attempt_queue.py
+"""
+import json
+import os
+import socket
+import uuid
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
+from models import db, Score
+import attempt_detail
+import leaderboard
+import progress
+import utils
+
+STREAM_KEY = 'quizmaster:attempts'
+DEAD_LETTER_KEY = 'quizmaster:attempts:dead-letter'
+CONSUMER_GROUP = 'score-writers'
+PENDING_KEY = 'quizmaster:pending:{user_id}'
+IDEMPOTENCY_KEY = 'quizmaster:attempt-key:{user_id}:{quiz_id}:{key}'
+
+# How long a replayed submission returns the original result from Redis
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Longest idempotency key accepted (matches Score.idempotency_key)
+MAX_KEY_LENGTH = 64
+
+# Maximum attempts written per SQLite transaction
+BATCH_SIZE = 500
+
+# Messages delivered to a consumer that died are reclaimed after this long
+RECLAIM_IDLE_MS = 60 * 1000
+
+# Dead-lettered entries kept for inspection (oldest are trimmed)
+DEAD_LETTER_MAXLEN = 10000
+
+def build_record(user_id, quiz_id, score_value, total_questions, correct_answers, time_taken, idempotency_key=None, detail=None):
+    """Build the queued form of a Score row (and its packed answers), timestamped at grading time"""
+    return {
+        'user_id': user_id,
+        'quiz_id': quiz_id,
+        'score': score_value,
+        'total_questions': total_questions,
+        'correct_answers': correct_answers,
+        'time_taken': time_taken,
+        'timestamp': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        # Every queued attempt carries a key so the consumer can skip redeliveries
+        'idempotency_key': idempotency_key or uuid.uuid4().hex,
+        'detail': attempt_detail.detail_to_record(detail) if detail is not None else None
+    }
+
+def get_replayed_result(redis_conn, user_id, quiz_id, key):
+    """Return the stored result for a previously used idempotency key, or None"""
+    original = redis_conn.get(IDEMPOTENCY_KEY.format(user_id=user_id, quiz_id=quiz_id, key=key))
+    return json.loads(original) if original else None
+
+def remember_result(redis_conn, user_id, quiz_id, key, response):
+    """Store the result for an idempotency key so replays within the TTL can return it"""
+    redis_conn.set(
+        IDEMPOTENCY_KEY.format(user_id=user_id, quiz_id=quiz_id, key=key),
+        json.dumps(response),
+        ex=IDEMPOTENCY_TTL
+    )
+
+def enqueue_attempt(redis_conn, record, response):
+    """
+    Queue an attempt for persistence unless its idempotency key was already used.
+
+    Args:
+        redis_conn: Redis client
+        record (dict): Output of build_record
+        response (dict): Result returned to the student for this attempt
+
+    Returns:
+        tuple: (response, is_new) - the original response is returned for replays
+    """
+    key_name = IDEMPOTENCY_KEY.format(
+        user_id=record['user_id'], quiz_id=record['quiz_id'], key=record['idempotency_key']
+    )
+    if not redis_conn.set(key_name, json.dumps(response), nx=True, ex=IDEMPOTENCY_TTL):
+        original = redis_conn.get(key_name)
+        if original:
+            return json.loads(original), False
+
+    payload = json.dumps(record)
+    pipe = redis_conn.pipeline()
+    pipe.xadd(STREAM_KEY, {'data': payload})
+    pipe.hset(PENDING_KEY.format(user_id=record['user_id']), record['idempotency_key'], payload)
+    pipe.execute()
+    return response, True
+
+def get_pending_attempts(redis_conn, user_id):
+    """Return queued attempts for a user that have not reached SQLite yet"""
+    return [json.loads(value) for value in redis_conn.hvals(PENDING_KEY.format(user_id=user_id))]
+
+def ensure_consumer_group(redis_conn):
+    """Create the stream and consumer group on first use"""
+    try:
+        redis_conn.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id='0', mkstream=True)
+    except Exception as e:
+        # BUSYGROUP means it already exists
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+def write_batch(records):
+    """
+    Insert a batch of queued attempts in one transaction.
+    Records whose (user, quiz, idempotency key) is already stored are skipped;
+    keys are chosen by clients, so different users may send the same one.
+
+    Returns:
+        list: The records that were inserted
+    """
+    keys = {record['idempotency_key'] for record in records}
+    seen = {
+        (row.user_id, row.quiz_id, row.idempotency_key)
+        for row in db.session.query(Score.user_id, Score.quiz_id, Score.idempotency_key)
+            .filter(Score.idempotency_key.in_(keys))
+    }
+
+    new_records = []
+    for record in records:
+        attempt = (record['user_id'], record['quiz_id'], record['idempotency_key'])
+        if attempt not in seen:
+            seen.add(attempt)
+            new_records.append(record)
+
+    if not new_records:
+        return []
+
+    ids = utils.reserve_ids(db.session, Score, 'score', len(new_records))
+    progress.record_attempts(db.session, {(record['user_id'], record['quiz_id']) for record in new_records})
+    db.session.add_all([
+        Score(
+            id=new_id,
+            user_id=record['user_id'],
+            quiz_id=record['quiz_id'],
+            score=record['score'],
+            total_questions=record['total_questions'],
+            correct_answers=record['correct_answers'],
+            time_taken=record['time_taken'],
+            timestamp=datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S'),
+            idempotency_key=record['idempotency_key']
+        )
+        for new_id, record in zip(ids, new_records)
+    ])
+    db.session.flush()
+    db.session.add_all([
+        attempt_detail.detail_from_record(new_id, record['detail'])
+        for new_id, record in zip(ids, new_records)
+        if record.get('detail')
+    ])
+    db.session.commit()
+
+    # Ensure SQLite sequence is updated, once per batch
+    utils.ensure_id_sequence(db.session, Score, 'score')
+    return new_records
+
+def write_separately(records):
+    """
+    Insert records one transaction each, after their batch failed.
+
+    Returns:
+        tuple: (inserted records, [(record, error)] of the records the database rejected)
+    """
+    saved, failed = [], []
+    for record in records:
+        try:
+            saved.extend(write_batch([record]))
+        except OperationalError:
+            # Locked or unavailable database: leave the batch in the stream for a retry
+            db.session.rollback()
+            raise
+        except Exception as e:
+            db.session.rollback()
+            failed.append((record, repr(e)))
+    return saved, failed
+
+def write_records(records):
+    """
+    Insert records in one batch, or one transaction each if the batch is rejected,
+    so one bad record does not hold back the rest.
+
+    Returns:
+        tuple: (inserted records, [(payload, error)] of the records the database rejected)
+    """
+    try:
+        return write_batch(records), []
+    except OperationalError:
+        # Locked or unavailable database: the caller retries the whole batch later
+        db.session.rollback()
+        raise
+    except Exception as e:
+        db.session.rollback()
+        print(f"Attempt batch failed ({e!r}), writing its records separately")
+        saved, failed = write_separately(records)
+        return saved, [(json.dumps(record), error) for record, error in failed]
+
+def add_dead_letters(pipe, dead):
+    """Queue (payload, error) pairs of records that cannot be saved onto the dead-letter stream"""
+    for payload, error in dead:
+        print(f"Dead-lettered attempt {payload[:200]}: {error}")
+        pipe.xadd(DEAD_LETTER_KEY, {'data': payload, 'error': error}, maxlen=DEAD_LETTER_MAXLEN, approximate=True)
+
+def drain_attempts(redis_conn, consumer_name=None, block_ms=None, max_batches=None):
+    """
+    Move queued attempts from the stream into SQLite.
+
+    Args:
+        redis_conn: Redis client
+        consumer_name (str, optional): Consumer name within the group
+        block_ms (int, optional): Block this long waiting for new entries
+        max_batches (int, optional): Stop after this many batches
+
+    Returns:
+        int: Number of Score rows inserted
+    """
+    consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+    ensure_consumer_group(redis_conn)
+
+    # Pick up entries left unacknowledged by a consumer that crashed mid-batch
+    _, claimed, *_ = redis_conn.xautoclaim(
+        STREAM_KEY, CONSUMER_GROUP, consumer_name, RECLAIM_IDLE_MS, start_id='0-0', count=BATCH_SIZE
+    )
+
+    inserted = 0
+    batches = 0
+    # Entries trimmed from the stream since delivery come back without fields
+    entries = [(entry_id, fields) for entry_id, fields in claimed if fields]
+    while True:
+        if not entries:
+            response = redis_conn.xreadgroup(
+                CONSUMER_GROUP, consumer_name, {STREAM_KEY: '>'}, count=BATCH_SIZE, block=block_ms
+            )
+            entries = response[0][1] if response else []
+            if not entries:
+                break
+
+        records = []
+        dead = []
+        for _, fields in entries:
+            try:
+                record = json.loads(fields['data'])
+                if not isinstance(record, dict):
+                    raise ValueError("attempt record is not an object")
+                records.append(record)
+            except (KeyError, TypeError, ValueError) as e:
+                dead.append((fields.get('data', ''), repr(e)))
+        saved, failed = write_records(records)
+        dead.extend(failed)
+        inserted += len(saved)
+        leaderboard.record_saved_attempts(redis_conn, [
+            (record['user_id'], record['quiz_id'], record['score'], record['time_taken'])
+            for record in saved
+        ])
+
+        # Only acknowledge once the rows are committed, or the entry is kept in the dead-letter stream
+        pipe = redis_conn.pipeline()
+        add_dead_letters(pipe, dead)
+        pipe.xack(STREAM_KEY, CONSUMER_GROUP, *[entry_id for entry_id, _ in entries])
+        pipe.xdel(STREAM_KEY, *[entry_id for entry_id, _ in entries])
+        for record in records:
+            if 'user_id' in record and 'idempotency_key' in record:
+                pipe.hdel(PENDING_KEY.format(user_id=record['user_id']), record['idempotency_key'])
+        pipe.execute()
+
+        entries = []
+        batches += 1
+        if max_batches and batches >= max_batches:
+            break
+
+    return inserted
+
+if __name__ == "__main__":
+    from base_app import create_base_app
+    from redis_client import get_redis
+
+    redis_conn = get_redis()
+    if redis_conn is None:
+        raise SystemExit("Redis is required to run the attempt consumer")
+
+    print(f"Draining {STREAM_KEY} into the database. Press Ctrl+C to stop.")
+    with create_base_app().app_context():
+        while True:
+            count = drain_attempts(redis_conn, block_ms=5000)
+            if count:
+                print(f"Persisted {count} attempts")
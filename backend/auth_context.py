@@ -0,0 +1,80 @@
+"""
+Authentication context for JWT-protected requests.
+
+Registered as Flask-JWT-Extended's user_lookup_loader, so the current user is
+resolved once per request from the token's `id` and `ver` claims and is then
+available as flask_jwt_extended.current_user. Resolved users are kept in a
+small in-process TTL cache keyed by (user id, token version); routes that only
+need the user's ID read it from the cache instead of querying the User table.
+
+Bumping User.token_version (password change, account deletion) makes existing
+tokens stop resolving. invalidate_user() drops cached entries immediately in
+this process; other processes pick the change up within USER_CACHE_TTL.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from models import User
+
+# Seconds a resolved user is reused before it is read again
+USER_CACHE_TTL = 60
+# Entries kept before the least recently used ones are evicted
+USER_CACHE_SIZE = 10000
+
+# Detached snapshot of the fields routes need, safe to share across requests
+AuthUser = namedtuple('AuthUser', [
+    'id', 'username', 'full_name', 'email', 'qualification', 'date_of_birth', 'is_admin', 'token_version'
+])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+def load_user(jwt_header, jwt_data):
+    """
+    Resolve the user a token belongs to.
+
+    Returns:
+        AuthUser: The token's user, or None to reject the token (unknown or
+        deleted user, token issued before the last token_version bump, or a
+        token without an `id` claim)
+    """
+    user_id = jwt_data.get('id')
+    if user_id is None:
+        return None
+    key = (user_id, jwt_data.get('ver', 0))
+    now = time.monotonic()
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry[0] > now:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    user = User.query.get(user_id)
+    auth_user = None
+    if user and not user.is_deleted and (user.token_version or 0) == key[1]:
+        auth_user = AuthUser(
+            id=user.id,
+            username=user.username,
+            full_name=user.full_name,
+            email=user.email,
+            qualification=user.qualification,
+            date_of_birth=user.date_of_birth,
+            is_admin=user.is_admin,
+            token_version=user.token_version or 0
+        )
+
+    # Rejections are cached too, so a revoked token cannot force a query per request
+    with _lock:
+        _cache[key] = (now + USER_CACHE_TTL, auth_user)
+        _cache.move_to_end(key)
+        while len(_cache) > USER_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return auth_user
+
+def invalidate_user(user_id):
+    """Drop every cached entry for a user after their record changes"""
+    with _lock:
+        for key in [key for key in _cache if key[0] == user_id]:
+            del _cache[key]
@@ -0,0 +1,52 @@
+"""
+Minimal Flask application for Celery workers and command-line tools.
+
+It carries the shared configuration and the database binding, and nothing
+of the web stack: no routes, CORS or JWT. Tasks and scripts that only need
+models (and templates) start from here, so they do not import app.py and its
+dependencies. The API server builds on the same base in app.create_app().
+"""
+import os
+from datetime import timedelta
+from flask import Flask
+from models import db
+
+# Use an absolute path for the database
+db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'quizmaster.db'))
+
+def create_base_app(config=None):
+    """
+    Build a Flask application with the shared configuration and the database bound.
+
+    Args:
+        config (dict, optional): Settings overriding the defaults below
+
+    Returns:
+        Flask: The application
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'super-secret-key')  # Change this in production
+    # Access tokens are short-lived and renewed with the refresh token (POST /api/token/refresh)
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=15)
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=7)
+    # Queue graded attempts in Redis and persist them in batches (see attempt_queue.py)
+    app.config['ATTEMPT_WRITE_BEHIND'] = os.environ.get('ATTEMPT_WRITE_BEHIND', '0') == '1'
+    # Analytics read from a snapshot of the database (see replica.py)
+    app.config['REPLICA_ENABLED'] = os.environ.get('REPLICA_ENABLED', '1') == '1'
+    # Defaults to <database>-replica.db next to the database file
+    app.config['REPLICA_PATH'] = os.environ.get('REPLICA_PATH')
+    # Older snapshots are ignored and the primary is read instead (seconds)
+    app.config['REPLICA_MAX_STALENESS'] = int(os.environ.get('REPLICA_MAX_STALENESS', 300))
+    # Refresh every this many seconds, and early after this many write transactions
+    app.config['REPLICA_REFRESH_SECONDS'] = int(os.environ.get('REPLICA_REFRESH_SECONDS', 60))
+    app.config['REPLICA_REFRESH_WRITES'] = int(os.environ.get('REPLICA_REFRESH_WRITES', 1000))
+    # Columnar exports for analysts (see export_scores.py)
+    app.config['EXPORT_DIR'] = os.environ.get('EXPORT_DIR', os.path.join(os.path.dirname(db_path), 'exports'))
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 10000))
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    return app
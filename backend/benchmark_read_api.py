@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark the read routes on the threaded Flask server and on async_api.py.
+
+Starts each server as a single process against the same database,
+then holds N keep-alive connections open, each requesting the catalog and a
+quiz's questions in a loop for a fixed time. Reports throughput, latency
+percentiles and failed requests per concurrency level.
+
+Usage:
+    python benchmark_read_api.py [--connections 50,200,1000] [--duration 10] [--threads 8]
+
+Requires gunicorn (requirements.txt) and requirements-async.txt.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import sqlite3
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+def start_servers(threads, pool_size):
+    env = dict(os.environ, RATE_LIMIT_ENABLED='0', ASYNC_POOL_SIZE=str(pool_size))
+    # Worker recycling (max_requests) is off so a restart does not drop every connection mid-run
+    flask_server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--workers', '1', '--threads', str(threads),
+         '--max-requests', '0', '--bind', '127.0.0.1:5101', '--access-logfile', '/dev/null', '--log-level', 'warning', 'wsgi:app'],
+        cwd=BACKEND_DIR, env=env
+    )
+    async_server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'async_api:app', '--port', '5102', '--no-access-log', '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env
+    )
+    wait_for_port(5101)
+    wait_for_port(5102)
+    return [flask_server, async_server]
+
+def pick_paths():
+    """Catalog and question paths for an existing subject, chapter and quiz"""
+    db_file = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(BACKEND_DIR, 'quizmaster.db'))
+    conn = sqlite3.connect(db_file.replace('sqlite:///', '', 1))
+    subject_id, chapter_id, quiz_id = conn.execute("""
+        SELECT subject.id, chapter.id, quiz.id FROM subject
+        JOIN chapter ON chapter.subject_id = subject.id
+        JOIN quiz ON quiz.chapter_id = chapter.id
+        WHERE subject.is_deleted = 0 AND chapter.is_deleted = 0 AND quiz.is_deleted = 0
+        LIMIT 1
+    """).fetchone()
+    admin = conn.execute("SELECT id, username, COALESCE(token_version, 0) FROM user WHERE is_admin = 1 LIMIT 1").fetchone()
+    conn.close()
+    return [
+        '/api/subjects',
+        f'/api/subjects/{subject_id}/chapters',
+        f'/api/chapters/{chapter_id}/quizzes',
+        f'/api/quizzes/{quiz_id}',
+        f'/api/quizzes/{quiz_id}/questions'
+    ], admin
+
+def make_token(admin):
+    import jwt as pyjwt
+    now = int(time.time())
+    return pyjwt.encode({
+        'sub': admin[1], 'type': 'access', 'fresh': False, 'iat': now, 'nbf': now, 'exp': now + 3600,
+        'jti': f'benchmark-{now}', 'id': admin[0], 'username': admin[1], 'is_admin': True, 'ver': admin[2]
+    }, os.environ.get('JWT_SECRET_KEY', 'super-secret-key'), algorithm='HS256')
+
+async def client(port, paths, token, stop_at, latencies, failures):
+    """One keep-alive connection issuing requests back to back until stop_at"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 10)
+    except (OSError, asyncio.TimeoutError):
+        failures.append('connect')
+        return
+    index = 0
+    try:
+        while time.perf_counter() < stop_at:
+            path = paths[index % len(paths)]
+            index += 1
+            request = (f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n"
+                       f"Connection: keep-alive\r\n\r\n")
+            started = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+            headers = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            length = 0
+            for line in headers.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await asyncio.wait_for(reader.readexactly(length), 10)
+            if not headers.startswith(b'HTTP/1.1 200'):
+                failures.append(headers.split(b'\r\n')[0].decode())
+            latencies.append(time.perf_counter() - started)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        failures.append('connection lost')
+    finally:
+        writer.close()
+
+async def run_level(port, connections, duration, paths, token):
+    latencies, failures = [], []
+    stop_at = time.perf_counter() + duration
+    await asyncio.gather(*(client(port, paths, token, stop_at, latencies, failures) for _ in range(connections)))
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else 0
+    return len(latencies) / duration, percentile(0.5), percentile(0.99), len(failures)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Flask and async read APIs under concurrent connections")
+    parser.add_argument('--connections', default='50,200,1000', help="Comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per level and server")
+    parser.add_argument('--threads', type=int, default=8, help="Flask worker threads (async pool uses the same)")
+    args = parser.parse_args()
+
+    paths, admin = pick_paths()
+    token = make_token(admin)
+    servers = start_servers(args.threads, args.threads)
+    try:
+        print(f"{'Server':<10}{'Conns':>7}{'Req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'Failed':>9}")
+        for connections in [int(level) for level in args.connections.split(',')]:
+            for name, port in (('flask', 5101), ('async', 5102)):
+                rate, p50, p99, failed = asyncio.run(run_level(port, connections, args.duration, paths, token))
+                print(f"{name:<10}{connections:>7}{rate:>10.0f}{p50:>10.1f}{p99:>10.1f}{failed:>9}")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
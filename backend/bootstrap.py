@@ -0,0 +1,75 @@
+"""
+One-time database preparation for a deployment.
+
+Switches the database to WAL mode, creates missing tables, applies the
+column/index upgrades from utils.py, creates the search index (search.py),
+recounts the live quizzes of every subject, fills the subject progress
+summary and creates the admin account if there is none.
+Every step is idempotent. Run it once before starting the API servers (they
+no longer touch the schema on start-up):
+    python bootstrap.py
+"""
+import os
+import time
+from models import db, User, Score, UserSubjectProgress
+import utils
+import progress
+import search
+
+def bootstrap_database(app):
+    """Prepare the application's database; safe to run repeatedly"""
+    started = time.perf_counter()
+    db_file = app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+    db_dir = os.path.dirname(db_file)
+    # Create the database directory if it doesn't exist
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+
+    with app.app_context():
+        try:
+            # WAL is stored in the database file: readers in every server process
+            # keep working while one of them writes
+            db.session.execute("PRAGMA journal_mode=WAL")
+            db.create_all()
+            utils.upgrade_schema(db.session)
+            # Full-text index and the triggers that keep it in sync
+            search.install(db.session)
+            db.session.commit()
+
+            # Fill the progress summary the first time it exists
+            if not UserSubjectProgress.query.first() and Score.query.first():
+                progress.rebuild_progress(db.session)
+                print("Subject progress summary built!")
+            else:
+                # Quiz counts do not depend on attempts: a catalog without scores needs them too
+                progress.rebuild_quiz_counts(db.session)
+                db.session.commit()
+            print("Database tables created successfully!")
+
+            # Check if admin user exists, if not create one
+            admin = User.query.filter_by(is_admin=True).first()
+            if not admin:
+                admin = User(
+                    username='admin',
+                    full_name='Administrator',
+                    email='admin@quizmaster.com',
+                    is_admin=True
+                )
+                admin.set_password(os.environ.get('ADMIN_PASSWORD', 'admin123'))  # Change this in production
+                db.session.add(admin)
+                db.session.commit()
+                print("Admin user created successfully!")
+            else:
+                print("Admin user already exists!")
+
+            # Print the database path for verification
+            print(f"Using database at: {db_file}")
+        except Exception as e:
+            print(f"Error initializing database: {str(e)}")
+
+    print(f"Bootstrap finished in {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    from base_app import create_base_app
+
+    bootstrap_database(create_base_app())
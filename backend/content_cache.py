@@ -0,0 +1,268 @@
+"""
+Redis cache of read-mostly quiz content, invalidated by version counters.
+
+Every quiz has a version counter that admin changes to the quiz or its
+questions increment, and the catalog (every subject, chapter and quiz with
+its question count) has one shared counter that any change to it increments.
+A cached entry stores the versions it was built from and is only served
+while they are still current, so nothing has to be deleted on change and
+concurrent rebuilds cannot resurrect stale data. Without Redis every request
+is built from the database.
+
+GET /api/quizzes/<id>/session returns a quiz session bundle: the quiz, its
+breadcrumb and its answer-stripped questions from one joined query (none for
+a pooled quiz, whose attempts draw their own).
+GET /api/catalog returns the subject -> chapter -> quiz tree, built from one
+joined query and cut down to the requested depth and subject on the way out.
+"""
+import json
+import redis
+from sqlalchemy import and_, func
+from models import db, Subject, Chapter, Quiz, Question
+
+QUIZ_VERSION_KEY = 'quizmaster:content-version:quiz:{quiz_id}'
+CATALOG_VERSION_KEY = 'quizmaster:content-version:catalog'
+QUIZ_BUNDLE_KEY = 'quizmaster:quiz-bundle:{quiz_id}'
+CATALOG_KEY = 'quizmaster:catalog'
+
+# Levels of the catalog tree, from the shallowest; ?depth=subjects leaves out chapters and quizzes
+CATALOG_DEPTHS = ('subjects', 'chapters', 'quizzes')
+
+# Bundles are replaced when their version moves on; the TTL only cleans up unused quizzes
+CACHE_TTL = 24 * 60 * 60
+
+def bump_quiz(redis_conn, quiz_id):
+    """Invalidate cached content of a quiz after it or its questions changed"""
+    if redis_conn is None:
+        return
+    try:
+        redis_conn.incr(QUIZ_VERSION_KEY.format(quiz_id=quiz_id))
+    except redis.RedisError as e:
+        print(f"Could not invalidate quiz {quiz_id} content: {str(e)}")
+
+def bump_catalog(redis_conn):
+    """Invalidate cached content after a subject, chapter or quiz was added, changed or removed"""
+    if redis_conn is None:
+        return
+    try:
+        redis_conn.incr(CATALOG_VERSION_KEY)
+    except redis.RedisError as e:
+        print(f"Could not invalidate catalog content: {str(e)}")
+
+def get_quiz_version(redis_conn, quiz_id):
+    """Current content version of a quiz, e.g. '3.17', or None without Redis"""
+    if redis_conn is None:
+        return None
+    try:
+        quiz_version, catalog_version = redis_conn.mget(QUIZ_VERSION_KEY.format(quiz_id=quiz_id), CATALOG_VERSION_KEY)
+    except redis.RedisError:
+        return None
+    return f"{quiz_version or 0}.{catalog_version or 0}"
+
+def build_quiz_bundle(quiz_id):
+    """
+    Load a quiz with its chapter, subject and questions in one query.
+
+    Returns:
+        dict: JSON-ready bundle without correct answers, or None if the quiz does not exist
+    """
+    rows = db.session.query(Quiz, Chapter.name, Subject.id, Subject.name, Question) \
+        .outerjoin(Chapter, Chapter.id == Quiz.chapter_id) \
+        .outerjoin(Subject, Subject.id == Chapter.subject_id) \
+        .outerjoin(Question, Question.quiz_id == Quiz.id) \
+        .filter(Quiz.id == quiz_id, Quiz.is_deleted == False) \
+        .order_by(Question.id) \
+        .all()
+    if not rows:
+        return None
+
+    quiz, chapter_name, subject_id, subject_name, _ = rows[0]
+    # Attempts of a pooled quiz get their own questions when they start (question_pools.py)
+    pooled = quiz.draw_count is not None or quiz.pool_size is not None
+    questions = [
+        {
+            'id': question.id,
+            'quiz_id': question.quiz_id,
+            'question_text': question.question_text,
+            'option1': question.option1,
+            'option2': question.option2,
+            'option3': question.option3,
+            'option4': question.option4
+        }
+        for *_, question in rows
+        if question is not None and not pooled
+    ]
+    return {
+        'quiz': {
+            'id': quiz.id,
+            'title': quiz.title,
+            'description': quiz.description,
+            'duration': quiz.duration,
+            'chapter_id': quiz.chapter_id,
+            'question_count': len(questions),
+            'pooled': pooled,
+            'pool_size': quiz.pool_size,
+            'draw_count': quiz.draw_count
+        },
+        'chapter': {'id': quiz.chapter_id, 'name': chapter_name, 'subject_id': subject_id},
+        'subject': {'id': subject_id, 'name': subject_name},
+        'questions': questions
+    }
+
+def get_quiz_bundle(redis_conn, quiz_id):
+    """
+    Quiz session bundle from the cache, rebuilt when its version is out of date.
+
+    Returns:
+        dict: Bundle with its 'version' (None without Redis), or None if the quiz does not exist
+    """
+    version = get_quiz_version(redis_conn, quiz_id)
+    if version is None:
+        bundle = build_quiz_bundle(quiz_id)
+        return dict(bundle, version=None) if bundle else None
+
+    key = QUIZ_BUNDLE_KEY.format(quiz_id=quiz_id)
+    try:
+        cached = redis_conn.get(key)
+    except redis.RedisError:
+        cached = None
+    if cached:
+        bundle = json.loads(cached)
+        if bundle['version'] == version:
+            return bundle
+
+    bundle = build_quiz_bundle(quiz_id)
+    if bundle is None:
+        return None
+    bundle['version'] = version
+    try:
+        redis_conn.set(key, json.dumps(bundle), ex=CACHE_TTL)
+    except redis.RedisError:
+        pass
+    return bundle
+
+# Parsed catalog of this process and its version, so cache hits skip the JSON decoding
+_local_catalog = (None, None)
+
+def get_catalog_version(redis_conn):
+    """Current catalog version, e.g. '17', or None without Redis"""
+    if redis_conn is None:
+        return None
+    try:
+        return str(redis_conn.get(CATALOG_VERSION_KEY) or 0)
+    except redis.RedisError:
+        return None
+
+def build_catalog():
+    """
+    Load every live subject, chapter and quiz with its question count in one query.
+
+    Returns:
+        list: Subjects with nested chapters and quizzes
+    """
+    question_counts = db.session.query(Question.quiz_id, func.count(Question.id).label('question_count')) \
+        .group_by(Question.quiz_id).subquery()
+    rows = db.session.query(
+        Subject.id, Subject.name, Subject.description,
+        Chapter.id, Chapter.name, Chapter.description,
+        Quiz.id, Quiz.title, Quiz.description, Quiz.duration, Quiz.date_of_quiz, Quiz.remarks,
+        Quiz.pool_size, Quiz.draw_count, question_counts.c.question_count
+    ) \
+        .outerjoin(Chapter, and_(Chapter.subject_id == Subject.id, Chapter.is_deleted == False)) \
+        .outerjoin(Quiz, and_(Quiz.chapter_id == Chapter.id, Quiz.is_deleted == False)) \
+        .outerjoin(question_counts, question_counts.c.quiz_id == Quiz.id) \
+        .filter(Subject.is_deleted == False) \
+        .order_by(Subject.id, Chapter.id, Quiz.id) \
+        .all()
+
+    # Rows arrive grouped by subject, then chapter, so each level is appended in one pass
+    subjects = []
+    subject = chapter = None
+    for (subject_id, subject_name, subject_description, chapter_id, chapter_name, chapter_description,
+         quiz_id, title, description, duration, date_of_quiz, remarks, pool_size, draw_count,
+         question_count) in rows:
+        if subject is None or subject['id'] != subject_id:
+            subject = {'id': subject_id, 'name': subject_name, 'description': subject_description, 'chapters': []}
+            subjects.append(subject)
+            chapter = None
+        if chapter_id is None:
+            continue
+        if chapter is None or chapter['id'] != chapter_id:
+            chapter = {
+                'id': chapter_id,
+                'name': chapter_name,
+                'description': chapter_description,
+                'subject_id': subject_id,
+                'quizzes': []
+            }
+            subject['chapters'].append(chapter)
+        if quiz_id is None:
+            continue
+        chapter['quizzes'].append({
+            'id': quiz_id,
+            'title': title,
+            'description': description,
+            'chapter_id': chapter_id,
+            'duration': duration,
+            'date_of_quiz': date_of_quiz.strftime('%Y-%m-%d %H:%M:%S'),
+            'remarks': remarks,
+            'question_count': question_count or 0,
+            'pool_size': pool_size,
+            'draw_count': draw_count
+        })
+    return subjects
+
+def get_full_catalog(redis_conn):
+    """
+    Complete catalog tree from this process, Redis or the database, in that order.
+
+    Returns:
+        tuple: (list of subjects, version or None without Redis)
+    """
+    global _local_catalog
+    version = get_catalog_version(redis_conn)
+    if version is None:
+        return build_catalog(), None
+    if _local_catalog[0] == version:
+        return _local_catalog[1], version
+
+    try:
+        cached = redis_conn.get(CATALOG_KEY)
+    except redis.RedisError:
+        cached = None
+    catalog = json.loads(cached) if cached else None
+    if not catalog or catalog['version'] != version:
+        catalog = {'version': version, 'subjects': build_catalog()}
+        try:
+            redis_conn.set(CATALOG_KEY, json.dumps(catalog), ex=CACHE_TTL)
+        except redis.RedisError:
+            pass
+    _local_catalog = (version, catalog['subjects'])
+    return catalog['subjects'], version
+
+def get_catalog(redis_conn, depth='quizzes', subject_id=None):
+    """
+    Catalog tree cut down to a depth and optionally one subject.
+
+    Args:
+        redis_conn: Redis client or None
+        depth (str): One of CATALOG_DEPTHS
+        subject_id (int, optional): Only include this subject
+
+    Returns:
+        dict: JSON-ready catalog with its 'version' (None without Redis)
+    """
+    subjects, version = get_full_catalog(redis_conn)
+    if subject_id is not None:
+        subjects = [subject for subject in subjects if subject['id'] == subject_id]
+
+    level = CATALOG_DEPTHS.index(depth)
+    if level < 2:
+        subjects = [
+            dict(subject, chapters=[
+                {key: value for key, value in chapter.items() if key != 'quizzes'}
+                for chapter in subject['chapters']
+            ]) if level == 1 else {key: value for key, value in subject.items() if key != 'chapters'}
+            for subject in subjects
+        ]
+    return {'version': version, 'depth': depth, 'subjects': subjects}
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Health and integrity report for a QuizMaster SQLite database.
+
+Reports, for any database file:
+    - row counts of every table
+    - ID range use per utils.ID_RANGES: how close each entity is to running out of IDs
+    - orphaned rows: children whose foreign key points at a missing parent (anti-joins)
+    - index coverage: foreign keys without an index, and expected indexes that are missing
+    - page, freelist and WAL statistics
+    - PRAGMA quick_check
+
+Every check is one set-based query on a read-only connection, so it is safe
+to run against the live database. Each query is interrupted after
+--time-limit seconds and reported as timed out, which keeps the run bounded
+on multi-gigabyte files.
+
+Exits with status 1 if a problem was found (failed quick_check, orphans,
+missing expected indexes, an ID range above --warn-at), so it can run from
+cron or a monitoring check with --json. Unindexed foreign keys are reported
+as warnings only.
+
+Usage:
+    python db_health.py [DB_FILE] [--json] [--table-sizes] [--no-quick-check]
+                        [--time-limit SECONDS] [--warn-at FRACTION]
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from utils import ID_RANGES, INDEX_UPGRADES
+
+# Default fraction of an ID range in use above which it is reported as a problem
+WARN_AT = 0.9
+
+# Default seconds any single check may run before it is interrupted
+TIME_LIMIT = 60
+
+# Orphaned IDs listed per foreign key
+ORPHAN_SAMPLE = 5
+
+# Virtual machine instructions between checks of the time limit
+PROGRESS_STEPS = 10000
+
+class TimedOut(Exception):
+    pass
+
+def open_database(db_file):
+    """Read-only connection, so the check never takes a write lock"""
+    return sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+
+def query(conn, sql, params=(), time_limit=TIME_LIMIT):
+    """
+    Run a query, interrupting it once it has run for time_limit seconds.
+
+    Raises:
+        TimedOut: If the query was interrupted
+    """
+    deadline = time.monotonic() + time_limit
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'interrupted' in str(e):
+            raise TimedOut(f"Interrupted after {time_limit}s")
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+def list_tables(conn):
+    return [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )
+    ]
+
+def check_counts(conn, tables, time_limit):
+    counts = {}
+    for table in tables:
+        try:
+            counts[table] = query(conn, f'SELECT COUNT(*) FROM "{table}"', time_limit=time_limit)[0][0]
+        except TimedOut:
+            counts[table] = None
+    return counts
+
+def check_id_ranges(conn, tables, time_limit, warn_at):
+    """Highest ID against the end of each entity's range; IDs are handed out upwards from the highest"""
+    ranges = {}
+    for entity, (range_min, range_max) in ID_RANGES.items():
+        if entity not in tables:
+            continue
+        # MIN/MAX on the rowid and the range counts are index lookups and range scans
+        try:
+            (min_id, max_id), = query(conn, f'SELECT MIN(id), MAX(id) FROM "{entity}"', time_limit=time_limit)
+        except TimedOut as e:
+            ranges[entity] = {
+                'range': [range_min, range_max],
+                'min_id': None,
+                'max_id': None,
+                'remaining_ids': None,
+                'used_fraction': None,
+                'rows_outside_range': None,
+                'problem': False,
+                'error': str(e)
+            }
+            continue
+        try:
+            outside = query(
+                conn, f'SELECT COUNT(*) FROM "{entity}" WHERE id < ? OR id > ?', (range_min, range_max),
+                time_limit=time_limit
+            )[0][0]
+        except TimedOut:
+            outside = None
+        used = 0.0 if max_id is None else (min(max_id, range_max) - range_min + 1) / (range_max - range_min + 1)
+        ranges[entity] = {
+            'range': [range_min, range_max],
+            'min_id': min_id,
+            'max_id': max_id,
+            'remaining_ids': None if max_id is None else max(0, range_max - max(max_id, range_min - 1)),
+            'used_fraction': round(max(0.0, used), 4),
+            'rows_outside_range': outside,
+            'problem': max_id is not None and (used >= warn_at or max_id > range_max)
+        }
+    return ranges
+
+def check_orphans(conn, tables, time_limit):
+    """Anti-join every declared foreign key against its parent table"""
+    orphans = []
+    for table in tables:
+        for row in conn.execute(f'PRAGMA foreign_key_list("{table}")'):
+            parent, column, parent_column = row[2], row[3], row[4] or 'rowid'
+            entry = {'table': table, 'column': column, 'parent': parent}
+            if parent not in tables:
+                entry.update(orphans=None, error=f"Parent table {parent} does not exist")
+                orphans.append(entry)
+                continue
+            try:
+                rows = query(conn, f"""
+                    SELECT c."{column}", COUNT(*) OVER ()
+                    FROM "{table}" c
+                    WHERE c."{column}" IS NOT NULL
+                      AND NOT EXISTS (SELECT 1 FROM "{parent}" p WHERE p."{parent_column}" = c."{column}")
+                    LIMIT {ORPHAN_SAMPLE}
+                """, time_limit=time_limit)
+                entry.update(orphans=rows[0][1] if rows else 0, sample=[value for value, _ in rows])
+            except TimedOut as e:
+                entry.update(orphans=None, error=str(e))
+            orphans.append(entry)
+    return orphans
+
+def index_columns(conn, table):
+    """Leading column of every index on a table (including primary keys), by index name"""
+    indexes = {}
+    for row in conn.execute(f'PRAGMA index_list("{table}")'):
+        columns = [info[2] for info in conn.execute(f'PRAGMA index_info("{row[1]}")')]
+        indexes[row[1]] = columns
+    return indexes
+
+def check_indexes(conn, tables):
+    """Foreign keys without an index that starts with them, and INDEX_UPGRADES indexes that are missing"""
+    unindexed = []
+    for table in tables:
+        leading = {columns[0] for columns in index_columns(conn, table).values() if columns}
+        # An INTEGER PRIMARY KEY is the rowid and needs no separate index
+        leading.update(row[1] for row in conn.execute(f'PRAGMA table_info("{table}")') if row[5] == 1)
+        for row in conn.execute(f'PRAGMA foreign_key_list("{table}")'):
+            if row[3] not in leading:
+                unindexed.append({'table': table, 'column': row[3], 'parent': row[2]})
+
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    expected = [re.search(r'INDEX IF NOT EXISTS (\w+)', statement).group(1) for statement in INDEX_UPGRADES]
+    return {
+        'unindexed_foreign_keys': unindexed,
+        'missing_expected': [name for name in expected if name not in existing],
+        'analyzed': 'sqlite_stat1' in {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    }
+
+def check_storage(conn, db_file, table_sizes, time_limit):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_file = db_file + '-wal'
+    storage = {
+        'file_bytes': os.path.getsize(db_file),
+        'wal_bytes': os.path.getsize(wal_file) if os.path.exists(wal_file) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'freelist_fraction': round(freelist_count / page_count, 4) if page_count else 0.0,
+        'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+        'auto_vacuum': ('none', 'full', 'incremental')[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]
+    }
+    if table_sizes:
+        # dbstat reads every page, so it is opt-in
+        try:
+            storage['bytes_by_object'] = dict(query(
+                conn, "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC", time_limit=time_limit
+            ))
+        except (TimedOut, sqlite3.OperationalError) as e:
+            storage['bytes_by_object'] = {'error': str(e)}
+    return storage
+
+def check_quick(conn, time_limit):
+    started = time.perf_counter()
+    try:
+        messages = [row[0] for row in query(conn, "PRAGMA quick_check", time_limit=time_limit)]
+    except TimedOut as e:
+        return {'ok': None, 'messages': [str(e)], 'seconds': round(time.perf_counter() - started, 2)}
+    return {'ok': messages == ['ok'], 'messages': messages[:20], 'seconds': round(time.perf_counter() - started, 2)}
+
+def check_database(db_file, quick_check=True, table_sizes=False, time_limit=TIME_LIMIT, warn_at=WARN_AT):
+    """
+    Run every check against a database file.
+
+    Returns:
+        dict: JSON-ready report with a 'problems' list (empty when healthy)
+    """
+    started = time.perf_counter()
+    conn = open_database(db_file)
+    try:
+        tables = list_tables(conn)
+        report = {
+            'database': os.path.abspath(db_file),
+            'sqlite_version': sqlite3.sqlite_version,
+            'counts': check_counts(conn, tables, time_limit),
+            'id_ranges': check_id_ranges(conn, tables, time_limit, warn_at),
+            'orphans': check_orphans(conn, tables, time_limit),
+            'indexes': check_indexes(conn, tables),
+            'storage': check_storage(conn, db_file, table_sizes, time_limit),
+            'quick_check': check_quick(conn, time_limit) if quick_check else None
+        }
+    finally:
+        conn.close()
+
+    problems = []
+    if report['quick_check'] and report['quick_check']['ok'] is False:
+        problems.append(f"quick_check failed: {report['quick_check']['messages'][0]}")
+    for entity, info in report['id_ranges'].items():
+        if info['problem']:
+            problems.append(f"{entity} IDs are {info['used_fraction']:.0%} used ({info['remaining_ids']} left)")
+    for entry in report['orphans']:
+        if entry['orphans']:
+            problems.append(f"{entry['orphans']} {entry['table']} rows with a missing {entry['parent']} ({entry['column']})")
+    for name in report['indexes']['missing_expected']:
+        problems.append(f"Index {name} is missing (run bootstrap.py)")
+    timed_out = [name for name, count in report['counts'].items() if count is None]
+    timed_out += [f"{entry['table']}.{entry['column']}" for entry in report['orphans'] if 'error' in entry]
+    if timed_out:
+        problems.append(f"Checks did not finish within {time_limit}s: {', '.join(timed_out)}")
+    report['problems'] = problems
+    # Reported but not failing: they cost speed, not correctness
+    report['warnings'] = [
+        f"{entry['table']}.{entry['column']} has no index (joins and orphan checks on it scan the table)"
+        for entry in report['indexes']['unindexed_foreign_keys']
+    ]
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    return report
+
+def print_report(report):
+    print("=" * 60)
+    print(f"Database health: {report['database']}")
+    print("=" * 60)
+
+    print("\nRow counts:")
+    for table, count in report['counts'].items():
+        print(f"  {table:<24}{'timed out' if count is None else count:>12}")
+
+    print("\nID ranges:")
+    for entity, info in report['id_ranges'].items():
+        low, high = info['range']
+        if info.get('error'):
+            print(f"  {entity:<10} {low}-{high}: {info['error']}")
+            continue
+        flag = "  <-- running out" if info['problem'] else ""
+        print(f"  {entity:<10} {low}-{high}: highest {info['max_id']}, {info['used_fraction']:.1%} used, "
+              f"{info['remaining_ids']} left, {info['rows_outside_range']} outside the range{flag}")
+
+    print("\nOrphaned rows:")
+    for entry in report['orphans']:
+        if entry.get('error'):
+            detail = entry['error']
+        elif entry['orphans']:
+            detail = f"{entry['orphans']} (e.g. {', '.join(map(str, entry['sample']))})"
+        else:
+            detail = "none"
+        print(f"  {entry['table']}.{entry['column']} -> {entry['parent']}: {detail}")
+
+    indexes = report['indexes']
+    print("\nIndexes:")
+    for entry in indexes['unindexed_foreign_keys']:
+        print(f"  No index on {entry['table']}.{entry['column']}")
+    for name in indexes['missing_expected']:
+        print(f"  Missing {name}")
+    if not indexes['unindexed_foreign_keys'] and not indexes['missing_expected']:
+        print("  Every foreign key is indexed and every expected index exists")
+    print(f"  ANALYZE statistics: {'present' if indexes['analyzed'] else 'absent'}")
+
+    storage = report['storage']
+    print("\nStorage:")
+    print(f"  File {storage['file_bytes'] / 1024 / 1024:.1f} MB, WAL {storage['wal_bytes'] / 1024 / 1024:.1f} MB, "
+          f"journal {storage['journal_mode']}, auto_vacuum {storage['auto_vacuum']}")
+    print(f"  {storage['page_count']} pages of {storage['page_size']} bytes, "
+          f"{storage['freelist_count']} free ({storage['freelist_fraction']:.1%})")
+    for name, size in storage.get('bytes_by_object', {}).items():
+        print(f"    {name:<40}{size if name == 'error' else f'{size / 1024:.0f} KB':>12}")
+
+    quick = report['quick_check']
+    if quick is not None:
+        result = 'timed out' if quick['ok'] is None else 'ok' if quick['ok'] else 'FAILED'
+        print(f"\nquick_check: {result} ({quick['seconds']:.2f}s)")
+        if quick['ok'] is False:
+            for message in quick['messages']:
+                print(f"  {message}")
+
+    print(f"\nProblems: {len(report['problems'])}")
+    for problem in report['problems']:
+        print(f"  - {problem}")
+    if report['warnings']:
+        print(f"Warnings: {len(report['warnings'])}")
+        for warning in report['warnings']:
+            print(f"  - {warning}")
+    print(f"\nChecked in {report['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the health and integrity of a QuizMaster database")
+    parser.add_argument('db_file', nargs='?', default='quizmaster.db', help="Database file (default quizmaster.db)")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--table-sizes', action='store_true', help="Measure the size of every table and index (reads every page)")
+    parser.add_argument('--no-quick-check', action='store_true', help="Skip PRAGMA quick_check")
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help="Seconds any single check may run")
+    parser.add_argument('--warn-at', type=float, default=WARN_AT, help="Fraction of an ID range that counts as running out")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_file):
+        print(f"Database file {args.db_file} not found!")
+        sys.exit(2)
+
+    report = check_database(args.db_file, not args.no_quick_check, args.table_sizes, args.time_limit, args.warn_at)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    sys.exit(1 if report['problems'] else 0)
@@ -0,0 +1,223 @@
+"""
+Columnar export of quiz attempts for offline analytics.
+
+Streams every Score row, joined to its user, quiz, chapter and subject, into
+Parquet (or Arrow IPC) files partitioned by month:
+    <EXPORT_DIR>/scores/month=2025-03/part-<watermark>.parquet
+
+Analysts query the directory with pandas or DuckDB instead of running SQL on
+quizmaster.db, e.g.
+    duckdb -c "SELECT subject_name, AVG(score) FROM 'exports/scores/*/*.parquet' GROUP BY 1"
+
+Exports are incremental: the highest score.export_seq exported is kept in
+_watermark.json and the next run only reads rows above it. export_seq numbers
+attempts in the order they are saved (utils.TRIGGER_UPGRADES), so attempts
+saved late by write-behind (attempt_queue.py) or the session sweep are picked
+up even though their timestamp is older, and so are attempts whose ID wrapped
+around the score range. A watermark written before export_seq existed cannot
+tell which rows it missed, so that export is started over. Rows are read from the analytics replica when it is fresh (see replica.py),
+otherwise from a read-only connection to the primary, in batches of
+EXPORT_BATCH_SIZE, so memory use does not grow with the table.
+
+Requires requirements-export.txt. Run from the command line or as the
+export_scores Celery task:
+    python export_scores.py [--format parquet|arrow] [--output DIR]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+import replica
+
+WATERMARK_FILE = '_watermark.json'
+
+SCHEMA = pa.schema([
+    ('score_id', pa.int64()),
+    ('timestamp', pa.timestamp('us')),
+    ('user_id', pa.int64()),
+    ('username', pa.string()),
+    ('quiz_id', pa.int64()),
+    ('quiz_title', pa.string()),
+    ('chapter_id', pa.int64()),
+    ('chapter_name', pa.string()),
+    ('subject_id', pa.int64()),
+    ('subject_name', pa.string()),
+    ('score', pa.float64()),
+    ('total_questions', pa.int32()),
+    ('correct_answers', pa.int32()),
+    ('time_taken', pa.int32()),
+])
+
+# Soft-deleted users and catalog entries are kept so past attempts stay complete
+EXPORT_QUERY = """
+    SELECT score.export_seq, score.id, score.timestamp, score.user_id, user.username,
+           score.quiz_id, quiz.title, quiz.chapter_id, chapter.name,
+           chapter.subject_id, subject.name, score.score, score.total_questions,
+           score.correct_answers, score.time_taken
+    FROM score
+    LEFT JOIN user ON user.id = score.user_id
+    LEFT JOIN quiz ON quiz.id = score.quiz_id
+    LEFT JOIN chapter ON chapter.id = quiz.chapter_id
+    LEFT JOIN subject ON subject.id = chapter.subject_id
+    WHERE score.export_seq > :export_seq
+    ORDER BY score.export_seq
+"""
+
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+class PartitionWriter:
+    """Writes the batches of one month partition to a single file, published when closed"""
+
+    def __init__(self, directory, month, name, file_format):
+        self.directory = os.path.join(directory, f'month={month}')
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, name + FORMATS[file_format])
+        self.temp_path = self.path + '.tmp'
+        if file_format == 'parquet':
+            self.writer = pq.ParquetWriter(self.temp_path, SCHEMA, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_file(self.temp_path, SCHEMA)
+        self.rows = 0
+
+    def write(self, batch):
+        self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.temp_path, self.path)
+
+def read_watermark(directory):
+    try:
+        with open(os.path.join(directory, WATERMARK_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'export_seq': 0, 'rows': 0}
+
+def write_watermark(directory, watermark):
+    path = os.path.join(directory, WATERMARK_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(watermark, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def clear_parts(directory):
+    """Remove every exported file, for an export that starts over"""
+    for month in os.listdir(directory):
+        month_dir = os.path.join(directory, month)
+        if month.startswith('month=') and os.path.isdir(month_dir):
+            for name in os.listdir(month_dir):
+                if name.startswith('part-'):
+                    os.remove(os.path.join(month_dir, name))
+
+def open_source(app):
+    """
+    Read-only connection to the replica if it is fresh enough, otherwise to the primary.
+
+    Returns:
+        tuple: (connection, name of the source)
+    """
+    staleness = replica.get_staleness(app) if app.config.get('REPLICA_ENABLED') else None
+    if staleness is not None and staleness <= app.config['REPLICA_MAX_STALENESS']:
+        path, source = replica.replica_file(app), 'replica'
+    else:
+        path, source = replica.database_file(app), 'primary'
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True), source
+
+def to_batch(rows):
+    """Turn fetched rows (without their leading export_seq) into a record batch"""
+    columns = list(zip(*rows))[1:]
+    columns[1] = [datetime.fromisoformat(value) for value in columns[1]]
+    return pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, SCHEMA)], schema=SCHEMA)
+
+def export_scores(app, output_dir=None, file_format='parquet'):
+    """
+    Export the attempts added since the last run.
+
+    Args:
+        app: Flask application (for the database paths and export settings)
+        output_dir (str, optional): Export root, defaults to EXPORT_DIR
+        file_format (str): 'parquet' or 'arrow'
+
+    Returns:
+        dict: Rows and files written, the source read and the new watermark
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+    started = time.perf_counter()
+    directory = os.path.join(output_dir or app.config['EXPORT_DIR'], 'scores')
+    os.makedirs(directory, exist_ok=True)
+    watermark = read_watermark(directory)
+    if 'export_seq' not in watermark:
+        # Written when score IDs were the watermark; rows below it may never have been exported
+        clear_parts(directory)
+        watermark = {'export_seq': 0, 'rows': 0}
+
+    conn, source = open_source(app)
+    # Files are named after the watermark they start from, so a run that is
+    # interrupted before saving the watermark is redone over the same files
+    name = f"part-{watermark['export_seq']}"
+
+    # Late attempts carry an older timestamp, so one run can touch several months
+    writers = {}
+    files = []
+    rows_written = 0
+    last_row = None
+    try:
+        cursor = conn.execute(EXPORT_QUERY, {'export_seq': watermark['export_seq']})
+        while True:
+            rows = cursor.fetchmany(app.config['EXPORT_BATCH_SIZE'])
+            if not rows:
+                break
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row[2][:7], []).append(row)
+            for month, month_rows in by_month.items():
+                if month not in writers:
+                    writers[month] = PartitionWriter(directory, month, name, file_format)
+                writers[month].write(to_batch(month_rows))
+            rows_written += len(rows)
+            last_row = rows[-1]
+        for month in sorted(writers):
+            writers[month].close()
+            files.append(writers[month].path)
+    finally:
+        conn.close()
+
+    if last_row is not None:
+        watermark = {
+            'export_seq': last_row[0],
+            'rows': watermark['rows'] + rows_written,
+            'exported_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        write_watermark(directory, watermark)
+
+    return {
+        'rows': rows_written,
+        'files': files,
+        'source': source,
+        'watermark': watermark,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export new quiz attempts to partitioned columnar files")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet', help="Output file format")
+    parser.add_argument('--output', help="Export root (defaults to EXPORT_DIR)")
+    args = parser.parse_args()
+
+    from base_app import create_base_app
+
+    result = export_scores(create_base_app(), args.output, args.format)
+    print(f"Exported {result['rows']} attempts from the {result['source']} into {len(result['files'])} file(s) "
+          f"in {result['seconds']:.2f}s")
+    for path in result['files']:
+        print(f"  {path}")
+    print(f"Watermark: export sequence {result['watermark']['export_seq']}")
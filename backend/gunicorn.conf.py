@@ -0,0 +1,51 @@
+"""
+Gunicorn settings for the QuizMaster API, tuned for a single SQLite file.
+
+SQLite lets one writer in at a time, so extra processes do not add write
+throughput; they only add memory and lock contention. A few processes with a
+handful of threads each keep reads concurrent (WAL readers do not block) while
+writes queue on the database lock.
+
+Override any value with the usual environment variables or command-line flags,
+e.g. WEB_CONCURRENCY=2 gunicorn -c gunicorn.conf.py wsgi:app
+Behind a reverse proxy, also set TRUSTED_PROXIES (see rate_limit.py).
+"""
+import multiprocessing
+import os
+import time
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# Processes: capped at 4 because writes are serialised by SQLite anyway
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+# Threads per process for requests waiting on SQLite, Redis or password hashing
+# (rate_limit.py sizes its per-route concurrency caps from the same variable)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import the app once in the master and fork workers from it; create_app()
+# opens no database or Redis connection, so nothing is shared across the fork
+preload_app = True
+
+# Recycle workers now and then to bound memory growth (caches, fragmentation);
+# the jitter keeps them from restarting together
+max_requests = 1000
+max_requests_jitter = 100
+
+# A request holding the SQLite write lock longer than this is stuck
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+
+_started = time.perf_counter()
+
+def when_ready(server):
+    server.log.info(f"Master ready in {time.perf_counter() - _started:.2f}s (app preloaded: {preload_app})")
+
+def post_fork(server, worker):
+    worker._forked_at = time.perf_counter()
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} ready in {(time.perf_counter() - worker._forked_at) * 1000:.1f}ms after fork")
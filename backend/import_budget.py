@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Check how long each backend entry point takes to import.
+
+Every entry point is imported in a fresh interpreter with `python -X importtime`
+and the cumulative time of its top-level imports is compared with a budget.
+The best of several runs is used so a busy machine does not fail the check.
+Exits with status 1 if any entry point is over budget.
+
+Usage:
+    python import_budget.py [--runs N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Entry point -> (modules it imports at start-up, budget in milliseconds).
+# Anything touching the models pays roughly 250 ms for Flask and SQLAlchemy.
+ENTRY_POINTS = {
+    'API server (wsgi:app)': (['wsgi'], 450),
+    'Celery worker (-A workers)': (['workers', 'task'], 450),
+    'bootstrap.py': (['bootstrap', 'base_app'], 350),
+    'progress.py / leaderboard.py': (['progress', 'leaderboard', 'base_app'], 350),
+    'attempt_queue.py consumer': (['attempt_queue', 'base_app'], 350),
+    'db_health.py': (['db_health'], 50),
+}
+
+def measure_import(modules):
+    """
+    Import modules in a fresh interpreter.
+
+    Returns:
+        tuple: (total milliseconds, list of (milliseconds, module) for the slowest imports)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {', '.join(modules)}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+
+    total = 0
+    nested = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        milliseconds = int(cumulative) / 1000
+        if not name.startswith('  '):
+            # Top-level import: its cumulative time includes everything below it
+            total += milliseconds
+        elif not name.startswith('    '):
+            nested.append((milliseconds, name.strip()))
+    return total, sorted(nested, reverse=True)[:5]
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time budgets of the backend entry points")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per entry point; the fastest counts")
+    args = parser.parse_args()
+
+    over_budget = []
+    print(f"{'Entry point':<32}{'Import (ms)':>12}{'Budget (ms)':>13}")
+    print("-" * 57)
+    for name, (modules, budget) in ENTRY_POINTS.items():
+        runs = [measure_import(modules) for _ in range(args.runs)]
+        total, slowest = min(runs, key=lambda run: run[0])
+        status = "" if total <= budget else "  OVER BUDGET"
+        print(f"{name:<32}{total:>12.1f}{budget:>13}{status}")
+        if status:
+            over_budget.append(name)
+            for milliseconds, module in slowest:
+                print(f"    {milliseconds:8.1f} ms  {module}")
+
+    if over_budget:
+        print(f"\n{len(over_budget)} entry point(s) over budget")
+        sys.exit(1)
+    print("\nAll entry points within budget")
+
+if __name__ == "__main__":
+    main()
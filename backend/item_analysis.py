@@ -0,0 +1,183 @@
+"""
+Classical item analysis of quiz questions from the packed attempt answers
+stored by attempt_detail.py.
+
+All attempts of a quiz are loaded into NumPy matrices in one pass per layout
+(attempts x questions) and every statistic is a vectorised reduction over
+those matrices:
+  p-value         - fraction of attempts answering the question correctly
+  discrimination  - p-value of the top 27% of attempts minus the bottom 27%
+  KR-20           - internal consistency of the quiz
+Results are cached in Redis, tagged with a version derived from the stored
+attempts, and recomputed by a Celery job once new attempts arrive.
+"""
+import json
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func
+from models import db, AttemptLayout, AttemptDetail
+from attempt_detail import attempt_question_ids
+
+CACHE_KEY = 'quizmaster:item-analysis:{quiz_id}'
+JOB_KEY = 'quizmaster:item-analysis-job:{quiz_id}'
+
+# Cached results are replaced when attempts change; the TTL only cleans up unused quizzes
+CACHE_TTL = 7 * 24 * 60 * 60
+# A queued job is reused by concurrent requests for this long
+JOB_TTL = 10 * 60
+
+# Share of attempts in each of the upper and lower groups for the discrimination index
+GROUP_FRACTION = 0.27
+
+def get_attempts_version(quiz_id):
+    """Cheap fingerprint of the stored attempts of a quiz, changes whenever one is added or removed"""
+    layout_ids = db.session.query(AttemptLayout.id).filter(AttemptLayout.quiz_id == quiz_id)
+    count, highest = db.session.query(func.count(AttemptDetail.score_id), func.max(AttemptDetail.score_id)) \
+        .filter(AttemptDetail.layout_id.in_(layout_ids)).one()
+    return f"{count}:{highest or 0}"
+
+def unpack_bitmaps(blobs, count):
+    """Stack equal-length bitmaps into an (attempts x count) boolean matrix"""
+    packed = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+    return np.unpackbits(packed, axis=1, bitorder='little')[:, :count].astype(bool)
+
+def unpack_option_blobs(blobs, count):
+    """Stack 2-bit packed answers into an (attempts x count) matrix of option numbers 1-4"""
+    packed = np.frombuffer(b''.join(blobs), dtype=np.uint8).reshape(len(blobs), -1)
+    options = (packed[:, :, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return options.reshape(len(blobs), -1)[:, :count].astype(np.int8) + 1
+
+def kr20(correct):
+    """Kuder-Richardson 20 reliability of a complete (attempts x items) 0/1 matrix"""
+    attempts, items = correct.shape
+    if attempts < 2 or items < 2:
+        return None
+    p = correct.mean(axis=0)
+    total_variance = correct.sum(axis=1).var()
+    if total_variance == 0:
+        return None
+    return float((items / (items - 1)) * (1 - (p * (1 - p)).sum() / total_variance))
+
+def group_p_values(correct, present, rows):
+    """Per-question p-values within a subset of attempts"""
+    correct_counts = correct[rows].sum(axis=0)
+    present_counts = present[rows].sum(axis=0)
+    return np.divide(correct_counts, present_counts, out=np.zeros(correct.shape[1]), where=present_counts > 0)
+
+def analyze_quiz(quiz_id):
+    """
+    Compute item statistics over every stored attempt of a quiz.
+
+    Attempts graded against different layouts (questions added or removed later)
+    share one matrix with a presence mask, and so do drawn attempts of a pooled
+    quiz. KR-20 needs a complete matrix and is computed on the layout with the
+    most attempts.
+
+    Returns:
+        dict: JSON-ready analysis
+    """
+    version = get_attempts_version(quiz_id)
+    layouts = AttemptLayout.query.filter_by(quiz_id=quiz_id).all()
+
+    # (question IDs in answer order, correct matrix, options matrix) per layout, and per drawn attempt
+    raw_blocks = []
+    for layout in layouts:
+        layout_question_ids = [int(question_id) for question_id in layout.question_ids.split(',')]
+        rows = db.session.query(
+            AttemptDetail.answers, AttemptDetail.answered, AttemptDetail.correct,
+            AttemptDetail.draw_seed, AttemptDetail.draw_count
+        ).filter(AttemptDetail.layout_id == layout.id).all()
+        shared = [row for row in rows if row.draw_seed is None]
+        if shared:
+            raw_blocks.append((layout_question_ids, shared))
+        # A drawn attempt asks its own questions from the pool (the layout), so it is a block of one
+        for row in rows:
+            if row.draw_seed is not None:
+                raw_blocks.append((attempt_question_ids(row, layout_question_ids), [row]))
+
+    question_ids = sorted({question_id for block_question_ids, _ in raw_blocks for question_id in block_question_ids})
+    columns = {question_id: index for index, question_id in enumerate(question_ids)}
+
+    blocks = []
+    for block_question_ids, rows in raw_blocks:
+        count = len(block_question_ids)
+        answered = unpack_bitmaps([row.answered for row in rows], count)
+        options = np.where(answered, unpack_option_blobs([row.answers for row in rows], count), 0)
+        blocks.append((
+            np.array([columns[question_id] for question_id in block_question_ids]),
+            unpack_bitmaps([row.correct for row in rows], count),
+            options
+        ))
+
+    attempts = sum(block[1].shape[0] for block in blocks)
+    result = {
+        'quiz_id': quiz_id,
+        'version': version,
+        'attempts': attempts,
+        'computed_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        'questions': [],
+        'reliability': {'kr20': None, 'items': 0, 'attempts': 0}
+    }
+    if not attempts:
+        return result
+
+    # Scatter every layout into one attempts x questions matrix
+    present = np.zeros((attempts, len(question_ids)), dtype=bool)
+    correct = np.zeros((attempts, len(question_ids)), dtype=bool)
+    options = np.zeros((attempts, len(question_ids)), dtype=np.int8)  # 0 = unanswered
+    offset = 0
+    for block_columns, block_correct, block_options in blocks:
+        rows = slice(offset, offset + block_correct.shape[0])
+        present[rows, block_columns] = True
+        correct[rows, block_columns] = block_correct
+        options[rows, block_columns] = block_options
+        offset += block_correct.shape[0]
+
+    attempts_per_question = present.sum(axis=0)
+    p_values = np.divide(correct.sum(axis=0), attempts_per_question,
+                         out=np.zeros(len(question_ids)), where=attempts_per_question > 0)
+
+    # Rank attempts by their fraction correct and compare the top and bottom groups
+    totals = correct.sum(axis=1) / present.sum(axis=1)
+    order = np.argsort(totals, kind='stable')
+    group_size = max(1, int(round(attempts * GROUP_FRACTION)))
+    discrimination = group_p_values(correct, present, order[-group_size:]) - \
+        group_p_values(correct, present, order[:group_size])
+
+    option_counts = np.stack([((options == option) & present).sum(axis=0) for option in range(5)], axis=1)
+
+    for index, question_id in enumerate(question_ids):
+        result['questions'].append({
+            'question_id': question_id,
+            'attempts': int(attempts_per_question[index]),
+            'p_value': round(float(p_values[index]), 4),
+            'discrimination': round(float(discrimination[index]), 4),
+            'option_distribution': {
+                '1': int(option_counts[index][1]),
+                '2': int(option_counts[index][2]),
+                '3': int(option_counts[index][3]),
+                '4': int(option_counts[index][4]),
+                'unanswered': int(option_counts[index][0])
+            }
+        })
+
+    largest = max(blocks, key=lambda block: block[1].shape[0])
+    reliability = kr20(largest[1].astype(np.float64))
+    result['reliability'] = {
+        'kr20': round(reliability, 4) if reliability is not None else None,
+        'items': int(largest[1].shape[1]),
+        'attempts': int(largest[1].shape[0])
+    }
+    return result
+
+def get_cached_analysis(redis_conn, quiz_id):
+    """Return the last computed analysis for a quiz, or None"""
+    cached = redis_conn.get(CACHE_KEY.format(quiz_id=quiz_id))
+    return json.loads(cached) if cached else None
+
+def store_analysis(redis_conn, analysis):
+    """Cache a computed analysis and release the job marker"""
+    pipe = redis_conn.pipeline()
+    pipe.set(CACHE_KEY.format(quiz_id=analysis['quiz_id']), json.dumps(analysis), ex=CACHE_TTL)
+    pipe.delete(JOB_KEY.format(quiz_id=analysis['quiz_id']))
+    pipe.execute()
@@ -0,0 +1,294 @@
+"""
+Quiz, chapter and subject leaderboards kept in Redis sorted sets.
+
+Each quiz set holds every user's best attempt, encoded so that a higher score
+wins and a shorter time_taken breaks ties. Chapter and subject sets hold the
+sum of a user's best quiz results below them, and are moved by the same delta
+whenever a quiz best improves. Top-N is ZREVRANGE and "my rank" is ZREVRANK,
+both O(log n). Deleting a user takes them off the sets their attempts put
+them on; deleting a quiz or chapter takes its results off the totals above it.
+
+Rebuild every leaderboard from the database with:
+    python leaderboard.py rebuild
+"""
+import sys
+from models import db, User, Subject, Chapter, Quiz, Score
+
+LEADERBOARD_KEY = 'quizmaster:leaderboard:{scope}:{scope_id}'
+SCOPES = ('quiz', 'chapter', 'subject')
+
+# Attempts longer than this tie-break as if they took this long (seconds)
+TIME_CAP = 99999
+# Score is stored to 0.01 and shifted above the tie-break part. Chapter and subject
+# sets add up one tie-break part per quiz, so this leaves room for 1000 quizzes
+# while keeping every value exact in a double.
+SCORE_FACTOR = 10 ** 8
+
+# Entries written per pipeline round trip during a rebuild
+REBUILD_BATCH_SIZE = 1000
+
+# Keep a user's best result per quiz and move the chapter/subject totals by the improvement
+UPDATE_BEST_SCRIPT = """
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local new = tonumber(ARGV[2])
+if old and tonumber(old) >= new then
+    return 0
+end
+local delta = new - (tonumber(old) or 0)
+redis.call('ZADD', KEYS[1], string.format('%.0f', new), ARGV[1])
+redis.call('ZINCRBY', KEYS[2], string.format('%.0f', delta), ARGV[1])
+redis.call('ZINCRBY', KEYS[3], string.format('%.0f', delta), ARGV[1])
+return 1
+"""
+
+# Take every member's value in KEYS[1] off the totals in the other keys, then drop KEYS[1].
+# Members left with nothing are removed so they do not count in ranks.
+REMOVE_SCOPE_SCRIPT = """
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 1, #entries, 2 do
+    local delta = string.format('%.0f', -tonumber(entries[i + 1]))
+    for k = 2, #KEYS do
+        if tonumber(redis.call('ZINCRBY', KEYS[k], delta, entries[i])) <= 0 then
+            redis.call('ZREM', KEYS[k], entries[i])
+        end
+    end
+end
+redis.call('DEL', KEYS[1])
+return #entries / 2
+"""
+
+def encode_result(score, time_taken):
+    """Combine a percentage score and time taken into one sortable number"""
+    time_taken = min(max(int(time_taken or 0), 0), TIME_CAP)
+    return round(score * 100) * SCORE_FACTOR + (TIME_CAP - time_taken)
+
+def decode_score(value):
+    """Recover the (summed) percentage score from a leaderboard value"""
+    return int(value) // SCORE_FACTOR / 100
+
+def leaderboard_key(scope, scope_id):
+    return LEADERBOARD_KEY.format(scope=scope, scope_id=scope_id)
+
+def record_attempt(redis_conn, user_id, quiz_id, chapter_id, subject_id, score, time_taken):
+    """
+    Update the leaderboards with a saved attempt.
+
+    Returns:
+        bool: True if the attempt is the user's new best on this quiz
+    """
+    improved = redis_conn.eval(
+        UPDATE_BEST_SCRIPT, 3,
+        leaderboard_key('quiz', quiz_id),
+        leaderboard_key('chapter', chapter_id),
+        leaderboard_key('subject', subject_id),
+        user_id,
+        encode_result(score, time_taken)
+    )
+    return bool(improved)
+
+def record_saved_attempts(redis_conn, attempts):
+    """
+    Update the leaderboards with attempts that were just committed.
+
+    Args:
+        redis_conn: Redis client
+        attempts (list): (user_id, quiz_id, score, time_taken) tuples
+    """
+    quiz_ids = {quiz_id for _, quiz_id, _, _ in attempts}
+    if not quiz_ids:
+        return
+    # Attempts saved just after their quiz was deleted must not come back onto the totals
+    parents = {
+        row.id: (row.chapter_id, row.subject_id)
+        for row in db.session.query(Quiz.id, Quiz.chapter_id, Chapter.subject_id)
+            .join(Chapter, Chapter.id == Quiz.chapter_id)
+            .join(Subject, Subject.id == Chapter.subject_id)
+            .filter(Quiz.id.in_(quiz_ids), Quiz.is_deleted == False, Chapter.is_deleted == False,
+                    Subject.is_deleted == False)
+    }
+    for user_id, quiz_id, score, time_taken in attempts:
+        if quiz_id in parents:
+            chapter_id, subject_id = parents[quiz_id]
+            record_attempt(redis_conn, user_id, quiz_id, chapter_id, subject_id, score, time_taken)
+
+def get_top(redis_conn, scope, scope_id, limit=10):
+    """
+    Get the leading users of a leaderboard.
+
+    Returns:
+        list: Dicts with rank, user_id, username, full_name and score, best first
+    """
+    key = leaderboard_key(scope, scope_id)
+    top = []
+    start = 0
+    while len(top) < limit:
+        entries = redis_conn.zrevrange(key, start, start + limit - 1, withscores=True)
+        if not entries:
+            break
+        start += len(entries)
+        user_ids = [int(member) for member, _ in entries]
+        users = {
+            user.id: user
+            for user in User.query.filter(User.id.in_(user_ids), User.is_deleted == False).all()
+        }
+        for member, value in entries:
+            user = users.get(int(member))
+            if not user:
+                # Deleted but not taken off the set yet; ranks only count live users
+                continue
+            top.append({
+                'rank': len(top) + 1,
+                'user_id': user.id,
+                'username': user.username,
+                'full_name': user.full_name,
+                'score': decode_score(value)
+            })
+            if len(top) == limit:
+                break
+    return top
+
+def get_rank(redis_conn, scope, scope_id, user_id):
+    """
+    Get a user's position on a leaderboard.
+
+    Returns:
+        dict: rank (1-based, None if the user has no attempt), score and total entries
+    """
+    key = leaderboard_key(scope, scope_id)
+    pipe = redis_conn.pipeline()
+    pipe.zrevrank(key, user_id)
+    pipe.zscore(key, user_id)
+    pipe.zcard(key)
+    rank, value, total = pipe.execute()
+    return {
+        'rank': rank + 1 if rank is not None else None,
+        'score': decode_score(value) if value is not None else None,
+        'total': total
+    }
+
+def remove_user(redis_conn, user_id):
+    """Take a deleted user off every leaderboard their attempts put them on"""
+    rows = db.session.query(Score.quiz_id, Quiz.chapter_id, Chapter.subject_id) \
+        .join(Quiz, Quiz.id == Score.quiz_id) \
+        .join(Chapter, Chapter.id == Quiz.chapter_id) \
+        .filter(Score.user_id == user_id) \
+        .distinct()
+    keys = set()
+    for quiz_id, chapter_id, subject_id in rows:
+        keys.update((leaderboard_key('quiz', quiz_id), leaderboard_key('chapter', chapter_id),
+                     leaderboard_key('subject', subject_id)))
+    if not keys:
+        return
+    pipe = redis_conn.pipeline()
+    for key in keys:
+        pipe.zrem(key, user_id)
+    pipe.execute()
+
+def remove_entity(redis_conn, entity_type, entity_id):
+    """
+    Drop the leaderboards of a deleted quiz, chapter or subject and take its
+    results off the chapter and subject totals above it.
+    """
+    if entity_type == 'quiz':
+        quiz = Quiz.query.get(entity_id)
+        chapter = Chapter.query.get(quiz.chapter_id) if quiz else None
+        if chapter is None:
+            return
+        redis_conn.eval(REMOVE_SCOPE_SCRIPT, 3, leaderboard_key('quiz', entity_id),
+                        leaderboard_key('chapter', chapter.id), leaderboard_key('subject', chapter.subject_id))
+        return
+
+    if entity_type == 'chapter':
+        chapter = Chapter.query.get(entity_id)
+        if chapter is None:
+            return
+        chapter_ids = [entity_id]
+        redis_conn.eval(REMOVE_SCOPE_SCRIPT, 2, leaderboard_key('chapter', entity_id),
+                        leaderboard_key('subject', chapter.subject_id))
+    elif entity_type == 'subject':
+        chapter_ids = [chapter_id for (chapter_id,) in db.session.query(Chapter.id).filter(Chapter.subject_id == entity_id)]
+        redis_conn.delete(leaderboard_key('subject', entity_id))
+    else:
+        raise ValueError(f"Unknown entity type: {entity_type}")
+
+    # Sets below the chapter or subject have nothing left to total into
+    keys = [leaderboard_key('chapter', chapter_id) for chapter_id in chapter_ids]
+    if chapter_ids:
+        keys += [leaderboard_key('quiz', quiz_id)
+                 for (quiz_id,) in db.session.query(Quiz.id).filter(Quiz.chapter_id.in_(chapter_ids))]
+    for start in range(0, len(keys), REBUILD_BATCH_SIZE):
+        redis_conn.delete(*keys[start:start + REBUILD_BATCH_SIZE])
+
+def rebuild_leaderboards(redis_conn):
+    """
+    Repopulate every leaderboard from the database in one streaming pass over Score.
+    New sets are written under temporary keys and swapped in with RENAME, so readers
+    never see a half-built leaderboard.
+
+    Returns:
+        int: Number of (user, quiz) best results written
+    """
+    best = {}
+    parents = {}
+    rows = db.session.query(Score.user_id, Score.quiz_id, Score.score, Score.time_taken,
+                            Quiz.chapter_id, Chapter.subject_id) \
+        .join(Quiz, Quiz.id == Score.quiz_id) \
+        .join(Chapter, Chapter.id == Quiz.chapter_id) \
+        .join(Subject, Subject.id == Chapter.subject_id) \
+        .join(User, User.id == Score.user_id) \
+        .filter(Quiz.is_deleted == False, Chapter.is_deleted == False, Subject.is_deleted == False,
+                User.is_deleted == False) \
+        .yield_per(REBUILD_BATCH_SIZE)
+
+    for row in rows:
+        value = encode_result(row.score, row.time_taken)
+        key = (row.user_id, row.quiz_id)
+        if value > best.get(key, -1):
+            best[key] = value
+        parents[row.quiz_id] = (row.chapter_id, row.subject_id)
+
+    totals = {}
+    for (user_id, quiz_id), value in best.items():
+        chapter_id, subject_id = parents[quiz_id]
+        for scope, scope_id in (('quiz', quiz_id), ('chapter', chapter_id), ('subject', subject_id)):
+            members = totals.setdefault((scope, scope_id), {})
+            members[user_id] = members.get(user_id, 0) + value
+
+    existing = set(redis_conn.scan_iter(match=LEADERBOARD_KEY.format(scope='*', scope_id='*')))
+    pipe = redis_conn.pipeline()
+    pending = 0
+    for (scope, scope_id), members in totals.items():
+        key = leaderboard_key(scope, scope_id)
+        temp_key = f"{key}:rebuild"
+        pipe.delete(temp_key)
+        items = list(members.items())
+        for start in range(0, len(items), REBUILD_BATCH_SIZE):
+            pipe.zadd(temp_key, dict(items[start:start + REBUILD_BATCH_SIZE]))
+            pending += 1
+            if pending >= REBUILD_BATCH_SIZE:
+                pipe.execute()
+                pending = 0
+        pipe.rename(temp_key, key)
+        existing.discard(key)
+    # Leaderboards for quizzes or scopes that no longer have results
+    for key in existing:
+        pipe.delete(key)
+    pipe.execute()
+
+    return len(best)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python leaderboard.py rebuild")
+        sys.exit(1)
+
+    from base_app import create_base_app
+    from redis_client import get_redis
+
+    redis_conn = get_redis()
+    if redis_conn is None:
+        raise SystemExit("Redis is required to rebuild leaderboards")
+
+    with create_base_app().app_context():
+        count = rebuild_leaderboards(redis_conn)
+    print(f"Rebuilt leaderboards from {count} best results")
@@ -0,0 +1,249 @@
+"""
+Live exam monitoring feed for admins, pushed as Server-Sent Events.
+
+Every graded attempt is published to one Redis pub/sub channel (and added to
+today's per-quiz totals). Each server process runs a single aggregator that
+subscribes to the channel and keeps the metrics incrementally:
+    active_sessions          open quiz sessions (quiz_sessions.py), counted once per tick
+    submissions_per_minute   attempts published in the last 60 seconds
+    quizzes                  attempts and running average score per quiz, today (UTC)
+
+The aggregator builds at most one snapshot per PUSH_INTERVAL, and only when
+something changed, and every watcher is sent that same snapshot. Watchers
+never query SQLite or Redis themselves, so hundreds of open admin dashboards
+cost one subscription and one ZCOUNT per second per process.
+
+GET /api/admin/live serves the stream from Flask (one worker thread per
+watcher) and from async_api.py (one event loop for every watcher); route it
+to the async server when many admins watch at once. Flask admits at most
+LIVE_MAX_WATCHERS watchers per process and answers 503 beyond that, so open
+dashboards cannot take the threads the rest of the API needs.
+
+Keys:
+    quizmaster:live:attempts                 channel  {"quiz_id", "score", "at", "day", "seq"} per attempt
+    quizmaster:live:quiz-totals:{YYYY-MM-DD} hash     {quiz_id}:count, {quiz_id}:sum, seq
+
+An attempt is added to the totals and published in one script, numbered by the
+day's seq field. The aggregator subscribes before it reads the totals, so an
+attempt published in between arrives on the channel although it is already in
+the totals; its seq is at or below the seq read with them and it is skipped.
+"""
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import redis
+import quiz_sessions
+
+CHANNEL = 'quizmaster:live:attempts'
+QUIZ_TOTALS_KEY = 'quizmaster:live:quiz-totals:{day}'
+
+# Most frequent snapshot push, in seconds
+PUSH_INTERVAL = 1.0
+
+# A comment is sent this often when nothing changed, so proxies keep the stream open
+KEEPALIVE_SECONDS = 15
+
+# Window of the submissions-per-minute rate
+RATE_WINDOW = 60
+
+# Daily totals outlive their day so a watcher connecting just after midnight still sees yesterday's
+TOTALS_TTL = 2 * 24 * 60 * 60
+
+# Add one attempt to the day's totals and publish it, numbered by the day's seq field
+PUBLISH_SCRIPT = """
+local seq = redis.call('HINCRBY', KEYS[1], 'seq', 1)
+redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':count', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], ARGV[1] .. ':sum', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('PUBLISH', ARGV[5], '{"quiz_id": ' .. ARGV[1] .. ', "score": ' .. ARGV[2] .. ', "at": ' .. ARGV[3]
+    .. ', "day": "' .. ARGV[4] .. '", "seq": ' .. seq .. '}')
+return seq
+"""
+
+def today():
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+def publish_attempts(redis_conn, attempts):
+    """
+    Publish graded attempts to the live feed.
+
+    Monitoring must never fail a submission, so Redis errors are only logged.
+
+    Args:
+        redis_conn: Redis client or None
+        attempts (list): (quiz_id, score) tuples
+    """
+    if redis_conn is None or not attempts:
+        return
+    day = today()
+    key = QUIZ_TOTALS_KEY.format(day=day)
+    now = time.time()
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for quiz_id, score in attempts:
+            pipe.eval(PUBLISH_SCRIPT, 1, key, int(quiz_id), float(score), now, day, CHANNEL, TOTALS_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Could not publish live attempts: {str(e)}")
+
+def active_session_count(redis_conn, now=None):
+    """Open quiz sessions whose deadline (plus grace period) has not passed"""
+    now = now or time.time()
+    return redis_conn.zcount(quiz_sessions.EXPIRING_KEY, now - quiz_sessions.GRACE_SECONDS, '+inf')
+
+class LiveMetrics:
+    """Aggregated live metrics, updated one event at a time"""
+
+    def __init__(self):
+        self.day = None
+        self.seq = 0
+        self.totals = {}
+        self.recent = deque()
+        self.active_sessions = 0
+        self.changed = True
+
+    def load_totals(self, day, fields):
+        """Start the day from its stored per-quiz totals and the seq of the last attempt in them"""
+        self.day = day
+        self.seq = int(fields.pop('seq', 0))
+        self.totals = {}
+        for field, value in fields.items():
+            quiz_id, kind = field.split(':')
+            counts = self.totals.setdefault(int(quiz_id), [0, 0.0])
+            if kind == 'count':
+                counts[0] = int(value)
+            else:
+                counts[1] = float(value)
+        self.changed = True
+
+    def apply(self, message):
+        """Count one published attempt, unless the loaded totals already include it"""
+        event = json.loads(message)
+        self.recent.append(event['at'])
+        self.changed = True
+        # Attempts of another day are picked up when that day's totals are loaded
+        if event['day'] != self.day or event['seq'] <= self.seq:
+            return
+        self.seq = event['seq']
+        counts = self.totals.setdefault(int(event['quiz_id']), [0, 0.0])
+        counts[0] += 1
+        counts[1] += float(event['score'])
+
+    def tick(self, now, active_sessions):
+        """Drop attempts that left the rate window and take the current session count"""
+        while self.recent and self.recent[0] <= now - RATE_WINDOW:
+            self.recent.popleft()
+            self.changed = True
+        if active_sessions != self.active_sessions:
+            self.active_sessions = active_sessions
+            self.changed = True
+
+    def snapshot(self):
+        self.changed = False
+        return {
+            'generated_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+            'day': self.day,
+            'active_sessions': self.active_sessions,
+            'submissions_per_minute': len(self.recent),
+            'quizzes': [
+                {'quiz_id': quiz_id, 'attempts': count, 'average_score': round(total / count, 2)}
+                for quiz_id, (count, total) in sorted(self.totals.items())
+                if count
+            ]
+        }
+
+def sse_message(snapshot):
+    return f"event: metrics\ndata: {json.dumps(snapshot)}\n\n"
+
+class LiveFeed:
+    """
+    Thread-based aggregator for the Flask server.
+
+    One background thread per process reads the channel and publishes a
+    snapshot; watcher threads wait on a condition for the next one.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.snapshot = None
+        self.version = 0
+        self.thread = None
+        self.watchers = 0
+
+    def ensure_started(self, redis_conn):
+        with self.condition:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, args=(redis_conn,), name='live-monitor', daemon=True)
+                self.thread.start()
+
+    def add_watcher(self, limit):
+        """Take a watcher slot; False when `limit` watchers are already connected"""
+        with self.condition:
+            if self.watchers >= limit:
+                return False
+            self.watchers += 1
+            return True
+
+    def remove_watcher(self):
+        with self.condition:
+            self.watchers -= 1
+
+    def publish(self, snapshot):
+        with self.condition:
+            self.snapshot = snapshot
+            self.version += 1
+            self.condition.notify_all()
+
+    def run(self, redis_conn):
+        metrics = LiveMetrics()
+        pubsub = None
+        while True:
+            try:
+                if pubsub is None:
+                    # Subscribe before loading the totals so no attempt falls in between;
+                    # attempts already in the totals are skipped by their seq
+                    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(CHANNEL)
+                    metrics.day = None
+                next_push = time.monotonic()
+                while True:
+                    day = today()
+                    if day != metrics.day:
+                        metrics.load_totals(day, redis_conn.hgetall(QUIZ_TOTALS_KEY.format(day=day)))
+                    # Apply everything that arrived before the next push is due
+                    while True:
+                        message = pubsub.get_message(timeout=max(0.0, next_push - time.monotonic()))
+                        if message is None:
+                            break
+                        metrics.apply(message['data'])
+                    now = time.time()
+                    metrics.tick(now, active_session_count(redis_conn, now))
+                    if metrics.changed or self.snapshot is None:
+                        self.publish(metrics.snapshot())
+                    next_push = time.monotonic() + PUSH_INTERVAL
+            except redis.RedisError as e:
+                print(f"Live monitor lost Redis, reconnecting: {str(e)}")
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+                pubsub = None
+                time.sleep(PUSH_INTERVAL)
+
+    def watch(self):
+        """Generate the SSE stream of one watcher, starting with the current snapshot"""
+        seen = 0
+        yield "retry: 5000\n\n"
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.version != seen, timeout=KEEPALIVE_SECONDS)
+                snapshot, version = self.snapshot, self.version
+            if version == seen:
+                yield ": keep-alive\n\n"
+                continue
+            seen = version
+            yield sse_message(snapshot)
+
+feed = LiveFeed()
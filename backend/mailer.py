@@ -0,0 +1,23 @@
+"""
+Minimal SMTP mailer used by the scheduled report tasks.
+Defaults target a local development SMTP server such as MailHog.
+"""
+import os
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'localhost')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 1025))
+SENDER_EMAIL = os.environ.get('SENDER_EMAIL', 'noreply@quizmaster.com')
+
+def send_email(to, subject, body):
+    """Send an HTML email to a single recipient"""
+    msg = MIMEMultipart()
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = to
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'html'))
+
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
+        server.send_message(msg)
@@ -1,8 +1,9 @@
-from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from replica import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+# Sessions route reads to the analytics replica where asked to (see replica.py)
+db = RoutingSQLAlchemy()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +15,8 @@ class User(db.Model):
     date_of_birth = db.Column(db.Date)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_deleted = db.Column(db.Boolean, default=False)  # Hidden while the cascade delete job runs
+    token_version = db.Column(db.Integer, default=0)  # Bumped to revoke issued tokens
     scores = db.relationship('Score', backref='user', lazy=True)
 
     def set_password(self, password):
@@ -27,31 +30,38 @@ class Subject(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_deleted = db.Column(db.Boolean, default=False)
+    quiz_count = db.Column(db.Integer, default=0)  # Live quizzes in all chapters, kept by progress.py
     chapters = db.relationship('Chapter', backref='subject', lazy=True)
 
 class Chapter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_deleted = db.Column(db.Boolean, default=False)
     quizzes = db.relationship('Quiz', backref='chapter', lazy=True)
 
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False, index=True)
     duration = db.Column(db.Integer, nullable=False)  # Duration in minutes
     date_of_quiz = db.Column(db.DateTime, nullable=False)
     remarks = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_deleted = db.Column(db.Boolean, default=False)
+    # Question pool (see question_pools.py): both None = every question of the quiz, in order
+    pool_size = db.Column(db.Integer)  # Pool of the chapter's newest questions instead of the quiz's own
+    draw_count = db.Column(db.Integer)  # Questions drawn per attempt, in shuffled order
     questions = db.relationship('Question', backref='quiz', lazy=True)
     scores = db.relationship('Score', backref='quiz', lazy=True)
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     question_text = db.Column(db.Text, nullable=False)
     option1 = db.Column(db.String(200), nullable=False)
     option2 = db.Column(db.String(200), nullable=False)
@@ -61,11 +71,54 @@ class Question(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Score(db.Model):
+    # A retried submission with the same key must not create a second attempt
+    __table_args__ = (
+        db.Index('ix_score_user_quiz_idempotency_key', 'user_id', 'quiz_id', 'idempotency_key', unique=True),
+        # Recent activity lists attempts newest first
+        db.Index('ix_score_timestamp_id', 'timestamp', 'id'),
+        # Incremental exports read attempts in the order they were saved
+        db.Index('ix_score_export_seq', 'export_seq'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     score = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     total_questions = db.Column(db.Integer, nullable=False)
     correct_answers = db.Column(db.Integer, nullable=False)
-    time_taken = db.Column(db.Integer, nullable=False)  # Time taken in seconds 
\ No newline at end of file
+    time_taken = db.Column(db.Integer, nullable=False)  # Time taken in seconds
+    idempotency_key = db.Column(db.String(64))  # Client or server generated key for the submission
+    export_seq = db.Column(db.Integer)  # Save order, set by the score_export_seq trigger (utils.TRIGGER_UPGRADES)
+
+class AttemptLayout(db.Model):
+    """Ordered question IDs that attempts were graded against, shared by every attempt with the same layout"""
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    question_ids = db.Column(db.Text, nullable=False)  # Comma separated, in answer order
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_attempt_layout_quiz_questions', 'quiz_id', 'question_ids', unique=True),
+    )
+
+class AttemptDetail(db.Model):
+    """Per-question answers of one attempt, packed (see attempt_detail.py)"""
+    score_id = db.Column(db.Integer, db.ForeignKey('score.id'), primary_key=True)
+    layout_id = db.Column(db.Integer, db.ForeignKey('attempt_layout.id'), nullable=False, index=True)
+    answers = db.Column(db.LargeBinary, nullable=False)   # 2 bits per question: selected option - 1
+    answered = db.Column(db.LargeBinary, nullable=False)  # 1 bit per question
+    correct = db.Column(db.LargeBinary, nullable=False)   # 1 bit per question
+    # Drawn attempts: the layout is the question pool and these pick the questions from it
+    draw_seed = db.Column(db.BigInteger)
+    draw_count = db.Column(db.Integer)
+
+class UserSubjectProgress(db.Model):
+    """Distinct quizzes a user has attempted in a subject, kept up to date by progress.py"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True, index=True)
+    quizzes_attempted = db.Column(db.Integer, nullable=False, default=0)
+
+class QuestionSignature(db.Model):
+    """MinHash signature of a question's text and options, kept up to date by near_duplicates.py"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # NUM_PERM little-endian uint32 values
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
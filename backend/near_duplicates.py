@@ -0,0 +1,261 @@
+"""
+Near-duplicate detection across the question bank with MinHash and LSH.
+
+The question text and each option are normalised (lower case, words only) and
+cut into character shingles. NUM_PERM hash functions over the shingle set give
+a question's MinHash signature: two signatures agree at a position with
+probability equal to the Jaccard similarity of the two shingle sets. Signatures
+are stored packed in question_signature (NUM_PERM uint32 values, 512 bytes per
+question) and recomputed in the same transaction as a question is created or
+edited.
+
+The scan fills in missing signatures (imported questions), then splits every
+signature into BANDS bands of ROWS values. Questions sharing a band land in
+the same bucket and only they are compared, instead of every pair in the bank.
+Candidates whose estimated similarity reaches THRESHOLD are grouped into
+clusters. Like item_analysis.py, results are cached in Redis, tagged with a
+version of the question bank, and recomputed by a Celery job.
+"""
+import json
+import re
+import zlib
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func, text
+from models import db, Quiz, Question, QuestionSignature
+
+CACHE_KEY = 'quizmaster:question-duplicates'
+JOB_KEY = 'quizmaster:question-duplicates-job'
+
+# Cached results are replaced when questions change; the TTL only cleans up after a quiet bank
+CACHE_TTL = 7 * 24 * 60 * 60
+# A queued job is reused by concurrent requests for this long
+JOB_TTL = 30 * 60
+
+# Characters per shingle
+SHINGLE_SIZE = 5
+
+# 16 bands of 8 rows: pairs at 0.8 similarity share a band with ~95% probability, pairs at 0.5 with ~6%
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SIGNATURE_BYTES = NUM_PERM * 4
+
+# Estimated Jaccard similarity from which two questions count as duplicates
+THRESHOLD = 0.8
+
+# Questions signed per transaction while filling in missing signatures
+BATCH_SIZE = 1000
+# Candidate pairs compared per vectorised step
+COMPARE_CHUNK = 100000
+
+# Hash functions (a * x + b) mod PRIME over 32-bit shingle hashes. a, b < 2^32 keep
+# a * x + b below 2^64, so the arithmetic is exact in uint64. The seed is fixed:
+# stored signatures are only comparable while it stays the same.
+PRIME = np.uint64(4294967311)
+_hash_parameters = np.random.default_rng(20240601).integers(1, 2 ** 32, size=(2, NUM_PERM), dtype=np.uint64)
+MULTIPLIERS = _hash_parameters[0][:, None]
+OFFSETS = _hash_parameters[1][:, None]
+
+UPSERT_SIGNATURE = text("""
+    INSERT INTO question_signature (question_id, signature, updated_at)
+    VALUES (:question_id, :signature, :updated_at)
+    ON CONFLICT (question_id)
+    DO UPDATE SET signature = excluded.signature, updated_at = excluded.updated_at
+""")
+
+def shingles(question):
+    """Character shingles of the question text and every option, shingled separately so option order does not matter"""
+    result = set()
+    for part in (question.question_text, question.option1, question.option2, question.option3, question.option4):
+        words = ' '.join(re.findall(r'\w+', (part or '').lower()))
+        if len(words) <= SHINGLE_SIZE:
+            result.add(words)
+        else:
+            result.update(words[i:i + SHINGLE_SIZE] for i in range(len(words) - SHINGLE_SIZE + 1))
+    return result
+
+def compute_signature(question):
+    """Packed MinHash signature of a question (or any object with its text columns)"""
+    hashes = np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(question)], dtype=np.uint64)
+    minimums = ((MULTIPLIERS * hashes + OFFSETS) % PRIME).min(axis=1)
+    return (minimums & np.uint64(0xffffffff)).astype('<u4').tobytes()
+
+def unpack_signatures(blobs):
+    """Stack packed signatures into an (questions x NUM_PERM) uint32 matrix"""
+    return np.frombuffer(b''.join(blobs), dtype='<u4').reshape(len(blobs), NUM_PERM)
+
+def update_signature(session, question):
+    """Store a question's signature; call after it has an ID, in the same transaction as the change"""
+    session.execute(UPSERT_SIGNATURE, {
+        'question_id': question.id,
+        'signature': compute_signature(question),
+        'updated_at': datetime.utcnow()
+    })
+
+def backfill_signatures(batch_size=BATCH_SIZE):
+    """
+    Sign every question without a current signature, in batches of question IDs.
+
+    Returns:
+        int: Signatures written
+    """
+    written = 0
+    last_id = 0
+    while True:
+        questions = db.session.query(Question) \
+            .outerjoin(QuestionSignature, QuestionSignature.question_id == Question.id) \
+            .filter(Question.id > last_id) \
+            .filter((QuestionSignature.question_id.is_(None)) |
+                    (func.length(QuestionSignature.signature) != SIGNATURE_BYTES)) \
+            .order_by(Question.id).limit(batch_size).all()
+        if not questions:
+            return written
+        now = datetime.utcnow()
+        db.session.execute(UPSERT_SIGNATURE, [
+            {'question_id': question.id, 'signature': compute_signature(question), 'updated_at': now}
+            for question in questions
+        ])
+        db.session.commit()
+        written += len(questions)
+        last_id = questions[-1].id
+
+def get_bank_version():
+    """Cheap fingerprint of the live questions and their signatures, changes whenever one is added, edited or removed"""
+    count, highest, updated = db.session.query(
+        func.count(Question.id), func.max(Question.id), func.max(QuestionSignature.updated_at)
+    ).join(Quiz, Quiz.id == Question.quiz_id) \
+        .outerjoin(QuestionSignature, QuestionSignature.question_id == Question.id) \
+        .filter(Quiz.is_deleted == False).one()
+    return f"{count}:{highest or 0}:{updated or ''}"
+
+def band_candidates(signatures):
+    """
+    Candidate pairs (i, j) of rows sharing at least one band.
+
+    Every member of a bucket is paired with the bucket's first row only, so a
+    bucket of any size costs linear work; pairs missed that way usually meet
+    in another band.
+    """
+    firsts, others = [], []
+    for band in range(BANDS):
+        keys = np.ascontiguousarray(signatures[:, band * ROWS:(band + 1) * ROWS]) \
+            .view(np.dtype((np.void, ROWS * 4))).ravel()
+        _, buckets, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        buckets = buckets.ravel()
+        members = np.flatnonzero(sizes[buckets] > 1)
+        if len(members) == 0:
+            continue
+        # members is ascending, so the first occurrence of a bucket is its lowest row
+        shared_buckets, first_positions = np.unique(buckets[members], return_index=True)
+        first_row = np.empty(len(sizes), dtype=np.int64)
+        first_row[shared_buckets] = members[first_positions]
+        pair_firsts = first_row[buckets[members]]
+        keep = pair_firsts != members
+        firsts.append(pair_firsts[keep])
+        others.append(members[keep])
+
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    pairs = np.unique(np.concatenate(firsts) * len(signatures) + np.concatenate(others))
+    return pairs // len(signatures), pairs % len(signatures)
+
+def estimate_similarity(signatures, left, right):
+    """Fraction of agreeing signature positions for each (left, right) row pair"""
+    similarity = np.empty(len(left))
+    for start in range(0, len(left), COMPARE_CHUNK):
+        chunk = slice(start, start + COMPARE_CHUNK)
+        similarity[chunk] = (signatures[left[chunk]] == signatures[right[chunk]]).mean(axis=1)
+    return similarity
+
+def group_pairs(pairs):
+    """Connected components (union-find) of the duplicate pairs, as lists of row indexes"""
+    parent = {}
+
+    def find(row):
+        parent.setdefault(row, row)
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for left, right in pairs:
+        root_left, root_right = find(left), find(right)
+        if root_left != root_right:
+            parent[max(root_left, root_right)] = min(root_left, root_right)
+
+    groups = {}
+    for row in parent:
+        groups.setdefault(find(row), []).append(row)
+    return [sorted(rows) for rows in groups.values()]
+
+def find_clusters():
+    """
+    Scan the live questions for clusters of near-duplicates.
+
+    Returns:
+        dict: JSON-ready result, largest clusters first
+    """
+    backfilled = backfill_signatures()
+    version = get_bank_version()
+    rows = db.session.query(Question.id, QuestionSignature.signature) \
+        .join(QuestionSignature, QuestionSignature.question_id == Question.id) \
+        .join(Quiz, Quiz.id == Question.quiz_id) \
+        .filter(Quiz.is_deleted == False) \
+        .order_by(Question.id).all()
+    question_ids = np.array([row.id for row in rows], dtype=np.int64)
+    signatures = unpack_signatures([row.signature for row in rows]) if rows else np.empty((0, NUM_PERM), np.uint32)
+
+    left, right = band_candidates(signatures)
+    similarity = estimate_similarity(signatures, left, right)
+    duplicates = similarity >= THRESHOLD
+    groups = group_pairs(zip(left[duplicates].tolist(), right[duplicates].tolist()))
+
+    # Question details for the clustered rows only
+    clustered_ids = [int(question_ids[row]) for group in groups for row in group]
+    details = {}
+    for start in range(0, len(clustered_ids), 500):
+        for question in db.session.query(Question.id, Question.quiz_id, Question.question_text, Quiz.title) \
+                .join(Quiz, Quiz.id == Question.quiz_id) \
+                .filter(Question.id.in_(clustered_ids[start:start + 500])):
+            details[question.id] = question
+
+    clusters = []
+    for group in groups:
+        first = group[0]
+        members = np.array(group)
+        member_similarity = estimate_similarity(signatures, np.full(len(group), first), members)
+        questions = []
+        for row, estimate in zip(group, member_similarity):
+            question = details[int(question_ids[row])]
+            questions.append({
+                'question_id': question.id,
+                'quiz_id': question.quiz_id,
+                'quiz_title': question.title,
+                'question_text': question.question_text,
+                'similarity': round(float(estimate), 4)
+            })
+        clusters.append({'size': len(questions), 'questions': questions})
+    clusters.sort(key=lambda cluster: (-cluster['size'], cluster['questions'][0]['question_id']))
+
+    return {
+        'version': version,
+        'computed_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        'questions_scanned': len(rows),
+        'signatures_added': backfilled,
+        'candidate_pairs': int(len(left)),
+        'threshold': THRESHOLD,
+        'clusters': clusters
+    }
+
+def get_cached_clusters(redis_conn):
+    """Return the last scan result, or None"""
+    cached = redis_conn.get(CACHE_KEY)
+    return json.loads(cached) if cached else None
+
+def store_clusters(redis_conn, result):
+    """Cache a scan result and release the job marker"""
+    pipe = redis_conn.pipeline()
+    pipe.set(CACHE_KEY, json.dumps(result), ex=CACHE_TTL)
+    pipe.delete(JOB_KEY)
+    pipe.execute()
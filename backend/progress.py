@@ -0,0 +1,144 @@
+"""
+Per-user subject progress for the user dashboard.
+
+UserSubjectProgress holds the number of distinct quizzes each user has attempted
+in each subject, and Subject.quiz_count the number of live quizzes in it. Both
+are adjusted in the same transaction as the change that affects them (first
+attempt of a quiz, quiz created, quiz or chapter deleted), so the dashboard
+reads every subject's progress with a single query.
+
+Recompute both from scratch with:
+    python progress.py rebuild
+"""
+import sys
+from sqlalchemy import func, and_
+from models import db, Subject, Chapter, Quiz, Score, UserSubjectProgress
+
+# Count a quiz in its subject's progress unless the user already has an attempt of it.
+# The check runs inside the INSERT, which holds SQLite's write lock, so a concurrent
+# first attempt of the same quiz waits for this one to commit and then sees its Score.
+RECORD_FIRST_ATTEMPT = """
+    INSERT INTO user_subject_progress (user_id, subject_id, quizzes_attempted)
+    SELECT :user_id, chapter.subject_id, 1
+    FROM quiz
+    JOIN chapter ON chapter.id = quiz.chapter_id
+    WHERE quiz.id = :quiz_id
+      AND NOT EXISTS (SELECT 1 FROM score WHERE score.user_id = :user_id AND score.quiz_id = :quiz_id)
+    ON CONFLICT (user_id, subject_id)
+    DO UPDATE SET quizzes_attempted = quizzes_attempted + 1
+"""
+
+def record_attempts(session, pairs):
+    """
+    Count quizzes attempted for the first time. Call before the new Score rows
+    are added to the session, in the same transaction.
+
+    Args:
+        session: SQLAlchemy session
+        pairs (set): (user_id, quiz_id) pairs about to be saved
+    """
+    if not pairs:
+        return
+    session.execute(RECORD_FIRST_ATTEMPT, [{'user_id': user_id, 'quiz_id': quiz_id} for user_id, quiz_id in pairs])
+
+def quiz_added(session, subject_id):
+    """Count a newly created quiz in its subject"""
+    session.query(Subject).filter(Subject.id == subject_id) \
+        .update({Subject.quiz_count: Subject.quiz_count + 1}, synchronize_session=False)
+
+def quizzes_removed(session, subject_id, quiz_ids):
+    """
+    Take deleted quizzes out of the subject total and out of the progress of
+    every user who attempted them, with two set-based UPDATEs.
+    """
+    if not quiz_ids:
+        return
+    session.query(Subject).filter(Subject.id == subject_id) \
+        .update({Subject.quiz_count: Subject.quiz_count - len(quiz_ids)}, synchronize_session=False)
+
+    attempted = session.query(func.count(func.distinct(Score.quiz_id))) \
+        .filter(Score.user_id == UserSubjectProgress.user_id, Score.quiz_id.in_(quiz_ids)) \
+        .scalar_subquery()
+    session.query(UserSubjectProgress).filter(UserSubjectProgress.subject_id == subject_id) \
+        .update({UserSubjectProgress.quizzes_attempted: UserSubjectProgress.quizzes_attempted - attempted},
+                synchronize_session=False)
+
+def get_subject_progress(user_id, extra_quiz_ids=()):
+    """
+    Progress of a user in every subject.
+
+    Args:
+        user_id (int): User ID
+        extra_quiz_ids (iterable, optional): Quizzes attempted but not saved yet
+            (write-behind queue); counted if the user has no saved attempt of them
+
+    Returns:
+        list: Dicts with id, name and progress percentage
+    """
+    rows = db.session.query(Subject.id, Subject.name, Subject.quiz_count, UserSubjectProgress.quizzes_attempted) \
+        .outerjoin(UserSubjectProgress, and_(
+            UserSubjectProgress.subject_id == Subject.id,
+            UserSubjectProgress.user_id == user_id
+        )) \
+        .filter(Subject.is_deleted == False) \
+        .all()
+
+    extra = {}
+    extra_quiz_ids = set(extra_quiz_ids)
+    if extra_quiz_ids:
+        saved = {quiz_id for (quiz_id,) in db.session.query(Score.quiz_id)
+                 .filter(Score.user_id == user_id, Score.quiz_id.in_(extra_quiz_ids)).distinct()}
+        for _, subject_id in db.session.query(Quiz.id, Chapter.subject_id) \
+                .join(Chapter, Chapter.id == Quiz.chapter_id) \
+                .filter(Quiz.id.in_(extra_quiz_ids - saved), Quiz.is_deleted == False):
+            extra[subject_id] = extra.get(subject_id, 0) + 1
+
+    subject_progress = []
+    for subject_id, name, quiz_count, attempted in rows:
+        progress = 0
+        if quiz_count:
+            completed_quizzes = (attempted or 0) + extra.get(subject_id, 0)
+            progress = min(round((completed_quizzes / quiz_count) * 100), 100)
+        subject_progress.append({
+            'id': subject_id,
+            'name': name,
+            'progress': progress
+        })
+    return subject_progress
+
+def rebuild_quiz_counts(session):
+    """Recompute Subject.quiz_count from the live catalog in one statement (not committed)"""
+    session.execute("""
+        UPDATE subject SET quiz_count = (
+            SELECT COUNT(*) FROM quiz
+            JOIN chapter ON chapter.id = quiz.chapter_id
+            WHERE chapter.subject_id = subject.id
+              AND COALESCE(quiz.is_deleted, 0) = 0 AND COALESCE(chapter.is_deleted, 0) = 0
+        )
+    """)
+
+def rebuild_progress(session):
+    """Recompute Subject.quiz_count and UserSubjectProgress from the live catalog with set-based SQL"""
+    rebuild_quiz_counts(session)
+    session.execute("DELETE FROM user_subject_progress")
+    session.execute("""
+        INSERT INTO user_subject_progress (user_id, subject_id, quizzes_attempted)
+        SELECT score.user_id, chapter.subject_id, COUNT(DISTINCT score.quiz_id)
+        FROM score
+        JOIN quiz ON quiz.id = score.quiz_id
+        JOIN chapter ON chapter.id = quiz.chapter_id
+        WHERE COALESCE(quiz.is_deleted, 0) = 0 AND COALESCE(chapter.is_deleted, 0) = 0
+        GROUP BY score.user_id, chapter.subject_id
+    """)
+    session.commit()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python progress.py rebuild")
+        sys.exit(1)
+
+    from base_app import create_base_app
+
+    with create_base_app().app_context():
+        rebuild_progress(db.session)
+    print("Rebuilt subject progress")
@@ -0,0 +1,247 @@
+"""
+Randomized question pools: every attempt draws its own questions.
+
+A quiz with draw_count or pool_size set is pooled. Its pool is either its own
+questions, or the newest pool_size questions of every live quiz in its chapter
+when pool_size is set. Each attempt draws min(draw_count, pool size) of the
+pool's questions in shuffled order (the whole pool if draw_count is None).
+Quizzes with neither set keep asking every question in ID order.
+
+The pool's question IDs, in ID order, are stored once as an AttemptLayout row
+whose ID is the pool version. A draw is recorded as (pool version, seed,
+count) and attempt_detail.drawn_question_ids turns it back into the questions,
+so attempts, sessions and stored answers never list their questions
+themselves. Each process keeps the ID arrays of current pools in memory and
+samples from them without touching the database. Pool membership only changes
+when questions or quizzes are added or removed, which moves the catalog
+version (content_cache.py). Without Redis, pools are reloaded after
+POOL_CACHE_SECONDS instead.
+
+Attempts submitted without a quiz session get their draw from the draw
+endpoint. A user has one open draw per quiz, kept in Redis until an attempt
+is submitted with it, so drawing again returns the same questions instead of
+a fresh set and a draw token is good for a single attempt.
+
+Keys:
+    quizmaster:quiz-draw:{user}:{quiz}    string  draw_id:pool_version:seed:count of the open draw
+"""
+import secrets
+import time
+import uuid
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+import attempt_detail
+import content_cache
+from models import db, AttemptLayout, Chapter, Quiz, Question
+
+# Pools are reloaded this often when there is no catalog version to check
+POOL_CACHE_SECONDS = 60
+
+# Pool versions whose question IDs are kept for reconstructing draws
+MAX_CACHED_VERSIONS = 64
+
+DRAW_KEY = 'quizmaster:quiz-draw:{user_id}:{quiz_id}'
+
+# Open draws nobody submitted are dropped after this long
+DRAW_KEEP_SECONDS = 24 * 60 * 60
+
+# Deletes the open draw only if it is still the one being submitted
+CLAIM_DRAW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# quiz_id -> (catalog version, loaded at, pool_size, pool version, question IDs)
+_pools = {}
+# pool version -> question IDs
+_pool_versions = {}
+
+def is_pooled(quiz):
+    """Whether attempts of the quiz draw their questions from a pool"""
+    return quiz.draw_count is not None or quiz.pool_size is not None
+
+def load_pool_ids(quiz):
+    """Question IDs of a quiz's pool, in ID order"""
+    if quiz.pool_size is None:
+        query = db.session.query(Question.id).filter(Question.quiz_id == quiz.id).order_by(Question.id)
+    else:
+        # The chapter's newest questions, so retired material ages out as the bank grows
+        newest = db.session.query(Question.id) \
+            .join(Quiz, Quiz.id == Question.quiz_id) \
+            .join(Chapter, Chapter.id == Quiz.chapter_id) \
+            .filter(Quiz.chapter_id == quiz.chapter_id, Quiz.is_deleted == False, Chapter.is_deleted == False) \
+            .order_by(Question.id.desc()) \
+            .limit(quiz.pool_size) \
+            .subquery()
+        query = db.session.query(newest.c.id).order_by(newest.c.id)
+    return [question_id for (question_id,) in query]
+
+def remember_version(pool_version, question_ids):
+    if len(_pool_versions) >= MAX_CACHED_VERSIONS:
+        _pool_versions.clear()
+    _pool_versions[pool_version] = question_ids
+
+def get_pool(quiz, redis_conn=None):
+    """
+    Current pool of a quiz, loaded once per catalog version and process.
+
+    Returns:
+        tuple: (pool version, list of question IDs)
+    """
+    catalog_version = content_cache.get_catalog_version(redis_conn)
+    cached = _pools.get(quiz.id)
+    if cached is not None:
+        cached_version, loaded_at, pool_size, pool_version, question_ids = cached
+        fresh = cached_version == catalog_version if catalog_version is not None \
+            else time.time() - loaded_at < POOL_CACHE_SECONDS
+        if fresh and pool_size == quiz.pool_size:
+            return pool_version, question_ids
+
+    question_ids = load_pool_ids(quiz)
+    pool_version = attempt_detail.get_layout_id(quiz.id, question_ids) if question_ids else None
+    _pools[quiz.id] = (catalog_version, time.time(), quiz.pool_size, pool_version, question_ids)
+    if pool_version is not None:
+        remember_version(pool_version, question_ids)
+    return pool_version, question_ids
+
+def get_version_ids(pool_version):
+    """Question IDs of a pool version, which may no longer be current"""
+    question_ids = _pool_versions.get(pool_version)
+    if question_ids is None:
+        layout = AttemptLayout.query.get(pool_version)
+        question_ids = [int(question_id) for question_id in layout.question_ids.split(',')] if layout else []
+        remember_version(pool_version, question_ids)
+    return question_ids
+
+def questions_per_attempt(quiz, redis_conn=None):
+    """Number of questions every attempt of a pooled quiz gets"""
+    _, pool_ids = get_pool(quiz, redis_conn)
+    return len(pool_ids) if quiz.draw_count is None else min(quiz.draw_count, len(pool_ids))
+
+def new_draw(quiz, redis_conn=None):
+    """
+    Draw the questions of a new attempt.
+
+    Returns:
+        dict: 'pool_version', 'seed', 'count' and the drawn 'question_ids', or None for an empty pool
+    """
+    pool_version, pool_ids = get_pool(quiz, redis_conn)
+    if not pool_ids:
+        return None
+    count = questions_per_attempt(quiz, redis_conn)
+    # 63 bits, so the seed fits a signed SQLite integer
+    seed = secrets.randbits(63)
+    return {
+        'pool_version': pool_version,
+        'seed': seed,
+        'count': count,
+        'question_ids': attempt_detail.drawn_question_ids(pool_ids, seed, count)
+    }
+
+def restore_draw(pool_version, seed, count):
+    """Rebuild a recorded draw from its pool version, seed and count"""
+    return {
+        'pool_version': pool_version,
+        'seed': seed,
+        'count': count,
+        'question_ids': attempt_detail.drawn_question_ids(get_version_ids(pool_version), seed, count)
+    }
+
+def load_drawn_questions(draw):
+    """Question rows of a draw in the order they are asked; deleted questions are left out"""
+    questions = {
+        question.id: question
+        for question in Question.query.filter(Question.id.in_(draw['question_ids'])).all()
+    }
+    return [questions[question_id] for question_id in draw['question_ids'] if question_id in questions]
+
+def question_views(questions):
+    """JSON-ready questions for the student taking the quiz, without correct answers"""
+    return [
+        {
+            'id': question.id,
+            'quiz_id': question.quiz_id,
+            'question_text': question.question_text,
+            'option1': question.option1,
+            'option2': question.option2,
+            'option3': question.option3,
+            'option4': question.option4
+        }
+        for question in questions
+    ]
+
+def encode_draw(draw):
+    return f"{draw['draw_id']}:{draw['pool_version']}:{draw['seed']}:{draw['count']}"
+
+def decode_draw(value):
+    draw_id, pool_version, seed, count = value.split(':')
+    draw = restore_draw(int(pool_version), int(seed), int(count))
+    draw['draw_id'] = draw_id
+    return draw
+
+def draw_key(user_id, quiz_id):
+    return DRAW_KEY.format(user_id=user_id, quiz_id=quiz_id)
+
+def get_open_draw(redis_conn, user_id, quiz_id):
+    """The user's open draw on a quiz, or None"""
+    value = redis_conn.get(draw_key(user_id, quiz_id))
+    return decode_draw(value) if value else None
+
+def open_draw(redis_conn, user_id, quiz):
+    """
+    The user's open draw on a quiz, drawing it first if there is none.
+
+    Returns:
+        dict: The draw with its 'draw_id', or None for an empty pool
+    """
+    draw = get_open_draw(redis_conn, user_id, quiz.id)
+    if draw is not None:
+        return draw
+    draw = new_draw(quiz, redis_conn)
+    if draw is None:
+        return None
+    draw['draw_id'] = uuid.uuid4().hex
+    if redis_conn.set(draw_key(user_id, quiz.id), encode_draw(draw), nx=True, ex=DRAW_KEEP_SECONDS):
+        return draw
+    # A concurrent request opened the draw first
+    return get_open_draw(redis_conn, user_id, quiz.id)
+
+def claim_draw(redis_conn, user_id, quiz_id, draw):
+    """
+    Close the open draw so only one attempt is graded on it.
+
+    Returns:
+        bool: True for the caller that won the claim
+    """
+    return redis_conn.eval(CLAIM_DRAW_SCRIPT, 1, draw_key(user_id, quiz_id), encode_draw(draw)) == 1
+
+def release_draw(redis_conn, user_id, quiz_id, draw):
+    """Reopen a claimed draw whose attempt was not saved, so the client can retry"""
+    redis_conn.set(draw_key(user_id, quiz_id), encode_draw(draw), nx=True, ex=DRAW_KEEP_SECONDS)
+
+def serializer():
+    return URLSafeSerializer(current_app.config['JWT_SECRET_KEY'], salt='question-draw')
+
+def sign_draw(user_id, quiz_id, draw):
+    """Token a client hands back with its attempt, naming the open draw it was given"""
+    return serializer().dumps([user_id, quiz_id, draw['draw_id']])
+
+def read_draw(redis_conn, user_id, quiz_id, token):
+    """
+    Verify a draw token against the user's open draw.
+
+    Returns:
+        dict: The draw, or None if the token is invalid, for another user or quiz, or already submitted
+    """
+    try:
+        token_user_id, token_quiz_id, draw_id = serializer().loads(token)
+    except (BadSignature, TypeError, ValueError):
+        return None
+    if token_user_id != user_id or token_quiz_id != quiz_id:
+        return None
+    draw = get_open_draw(redis_conn, user_id, quiz_id)
+    if draw is None or draw['draw_id'] != draw_id:
+        return None
+    return draw
@@ -0,0 +1,332 @@
+"""
+Server-side quiz sessions held in Redis.
+
+Starting a quiz creates a session stamped with the server time and a deadline
+of started_at + quiz duration. While the student works, the page autosaves
+the answers that changed since the last save into a Redis hash (one HSET per
+request, no SQLite work). Submitting grades the answers saved in Redis and
+takes time_taken from the server clock, so a dropped connection near the end
+of an exam loses at most the last few seconds of work and resubmitting is
+safe: the session ID is the attempt's idempotency key.
+
+Sessions nobody submitted are finalized by the finalize_quiz_sessions Celery
+task once their deadline (plus GRACE_SECONDS) has passed, with whatever
+answers were saved. An attempt the database rejects goes to the attempt
+queue's dead-letter stream (attempt_queue.py) instead of being retried.
+
+A session on a pooled quiz (question_pools.py) draws its questions when it
+starts and keeps only the draw's pool version, seed and count; its questions
+are rebuilt from those whenever they are needed.
+
+Keys:
+    quizmaster:quiz-session:{id}              hash  user_id, quiz_id, started_at, expires_at, duration, status
+                                                    (+ pool_version, draw_seed, draw_count when drawn)
+    quizmaster:quiz-session:{id}:answers      hash  question_id -> option
+    quizmaster:quiz-session-active:{user}:{quiz}    ID of the user's open session on a quiz
+    quizmaster:quiz-sessions:expiring         zset  open session IDs by deadline
+"""
+import time
+import uuid
+from datetime import datetime
+from models import db, Quiz, Question
+import attempt_detail
+import attempt_queue
+import leaderboard
+import live_monitor
+import question_pools
+
+SESSION_KEY = 'quizmaster:quiz-session:{session_id}'
+ANSWERS_KEY = 'quizmaster:quiz-session:{session_id}:answers'
+ACTIVE_KEY = 'quizmaster:quiz-session-active:{user_id}:{quiz_id}'
+EXPIRING_KEY = 'quizmaster:quiz-sessions:expiring'
+
+# Autosaves and submissions arriving this late after the deadline still count (network latency)
+GRACE_SECONDS = 30
+
+# Sessions are kept this long after their deadline so late retries still find them
+KEEP_SECONDS = 24 * 60 * 60
+
+# Expired sessions finalized per database transaction by the sweep
+SWEEP_BATCH_SIZE = 200
+
+def session_view(session, answers=None, now=None):
+    """JSON-ready state of a session for the client"""
+    now = now or time.time()
+    view = {
+        'session_id': session['session_id'],
+        'quiz_id': session['quiz_id'],
+        'status': session['status'],
+        'started_at': datetime.utcfromtimestamp(session['started_at']).strftime('%Y-%m-%d %H:%M:%S'),
+        'expires_at': datetime.utcfromtimestamp(session['expires_at']).strftime('%Y-%m-%d %H:%M:%S'),
+        'remaining_seconds': max(0, int(session['expires_at'] - now))
+    }
+    if answers is not None:
+        view['answers'] = answers
+    return view
+
+def parse_session(session_id, fields):
+    if not fields:
+        return None
+    session = {
+        'session_id': session_id,
+        'user_id': int(fields['user_id']),
+        'quiz_id': int(fields['quiz_id']),
+        'started_at': float(fields['started_at']),
+        'expires_at': float(fields['expires_at']),
+        'duration': int(fields['duration']),
+        'status': fields['status'],
+        'draw': None
+    }
+    if 'draw_seed' in fields:
+        session['draw'] = question_pools.restore_draw(
+            int(fields['pool_version']), int(fields['draw_seed']), int(fields['draw_count'])
+        )
+    return session
+
+def get_session(redis_conn, session_id, with_answers=False):
+    """
+    Load a session.
+
+    Returns:
+        dict: The session (with 'answers' if requested), or None if it does not exist
+    """
+    if with_answers:
+        pipe = redis_conn.pipeline()
+        pipe.hgetall(SESSION_KEY.format(session_id=session_id))
+        pipe.hgetall(ANSWERS_KEY.format(session_id=session_id))
+        fields, answers = pipe.execute()
+    else:
+        fields, answers = redis_conn.hgetall(SESSION_KEY.format(session_id=session_id)), None
+    session = parse_session(session_id, fields)
+    if session is not None and with_answers:
+        session['answers'] = {question_id: int(option) for question_id, option in answers.items()}
+    return session
+
+def get_open_session(redis_conn, user_id, quiz_id, now=None):
+    """
+    The user's session on a quiz that is still open, so a reload resumes it.
+
+    Returns:
+        dict: The session with its saved answers, or None
+    """
+    session_id = redis_conn.get(ACTIVE_KEY.format(user_id=user_id, quiz_id=quiz_id))
+    if not session_id:
+        return None
+    session = get_session(redis_conn, session_id, with_answers=True)
+    if session and session['status'] == 'active' and session['expires_at'] + GRACE_SECONDS > (now or time.time()):
+        return session
+    return None
+
+def start_session(redis_conn, user_id, quiz_id, duration_minutes, draw=None):
+    """
+    Start a session on a quiz, or return the user's open one so a reload resumes it.
+
+    Args:
+        draw (dict): Questions drawn for a pooled quiz (question_pools.new_draw); ignored when resuming
+
+    Returns:
+        dict: The session with its saved answers
+    """
+    now = time.time()
+    active_key = ACTIVE_KEY.format(user_id=user_id, quiz_id=quiz_id)
+    session = get_open_session(redis_conn, user_id, quiz_id, now)
+    if session is not None:
+        return session
+
+    session_id = uuid.uuid4().hex
+    duration = int(duration_minutes or 0) * 60
+    session = {
+        'session_id': session_id,
+        'user_id': user_id,
+        'quiz_id': quiz_id,
+        'started_at': now,
+        'expires_at': now + duration,
+        'duration': duration,
+        'status': 'active'
+    }
+    fields = {key: value for key, value in session.items() if key != 'session_id'}
+    if draw is not None:
+        fields.update(pool_version=draw['pool_version'], draw_seed=draw['seed'], draw_count=draw['count'])
+    session['draw'] = draw
+    ttl = duration + GRACE_SECONDS + KEEP_SECONDS
+    pipe = redis_conn.pipeline()
+    pipe.hset(SESSION_KEY.format(session_id=session_id), mapping=fields)
+    pipe.expire(SESSION_KEY.format(session_id=session_id), ttl)
+    pipe.set(active_key, session_id, ex=duration + GRACE_SECONDS)
+    pipe.zadd(EXPIRING_KEY, {session_id: session['expires_at']})
+    pipe.execute()
+    session['answers'] = {}
+    return session
+
+def is_open(session, now=None):
+    """Whether answers may still be saved to the session"""
+    return session['status'] == 'active' and (now or time.time()) <= session['expires_at'] + GRACE_SECONDS
+
+def save_answers(redis_conn, session, answers):
+    """
+    Store changed answers in the session's hash.
+
+    Args:
+        answers (dict): Question ID -> option 1-4, or None to clear the answer
+
+    Returns:
+        int: Number of answers written
+
+    Raises:
+        TypeError, ValueError: answers is not an object, or holds an invalid question ID or option
+    """
+    if not isinstance(answers, dict):
+        raise TypeError("answers must be an object of question ID -> option")
+    to_set = {}
+    to_clear = []
+    for question_id, option in answers.items():
+        question_id = str(int(question_id))
+        if option is None:
+            to_clear.append(question_id)
+            continue
+        option = int(option)
+        if option not in (1, 2, 3, 4):
+            raise ValueError(f"Invalid option {option} for question {question_id}")
+        to_set[question_id] = option
+
+    key = ANSWERS_KEY.format(session_id=session['session_id'])
+    pipe = redis_conn.pipeline()
+    if to_set:
+        pipe.hset(key, mapping=to_set)
+    if to_clear:
+        pipe.hdel(key, *to_clear)
+    # The answers live as long as the session
+    pipe.expire(key, int(session['expires_at'] - time.time()) + GRACE_SECONDS + KEEP_SECONDS)
+    pipe.execute()
+    return len(to_set) + len(to_clear)
+
+def claim_session(redis_conn, session_id):
+    """
+    Take the session off the expiry index so only one submit or sweep finalizes it.
+
+    Returns:
+        bool: True for the caller that won the claim
+    """
+    return redis_conn.zrem(EXPIRING_KEY, session_id) == 1
+
+def close_session(redis_conn, session):
+    """Mark a finalized session as submitted and release the user's open-session slot"""
+    active_key = ACTIVE_KEY.format(user_id=session['user_id'], quiz_id=session['quiz_id'])
+    pipe = redis_conn.pipeline()
+    pipe.hset(SESSION_KEY.format(session_id=session['session_id']), 'status', 'submitted')
+    pipe.delete(active_key)
+    pipe.execute()
+
+def time_taken(session, now=None):
+    """Seconds spent on the session by the server clock, capped at the quiz duration"""
+    elapsed = (now or time.time()) - session['started_at']
+    return int(max(0, min(elapsed, session['duration'])))
+
+def grade_answers(questions, submitted_answers):
+    """
+    Grade answers against a quiz's questions.
+
+    Args:
+        questions (list): Question rows, in the order results are reported
+        submitted_answers (dict): Question ID (string) -> selected option
+
+    Returns:
+        tuple: (number of correct answers, list of per-question result dicts)
+    """
+    correct_answers = 0
+    question_results = []
+    for question in questions:
+        user_answer = submitted_answers.get(str(question.id))
+        is_correct = False
+        if user_answer is not None:
+            try:
+                is_correct = int(user_answer) == int(question.correct_option)
+            except (ValueError, TypeError) as e:
+                print(f"Error comparing answers for question {question.id}: {str(e)}")
+        if is_correct:
+            correct_answers += 1
+
+        question_results.append({
+            'question_id': question.id,
+            'question_text': question.question_text,
+            'user_answer': user_answer,
+            'correct_answer': question.correct_option,
+            'is_correct': is_correct
+        })
+    return correct_answers, question_results
+
+def finalize_expired(redis_conn, now=None):
+    """
+    Grade and save every session whose deadline and grace period have passed.
+
+    Returns:
+        int: Number of attempts saved
+    """
+    now = now or time.time()
+    saved_count = 0
+    live_quizzes = {}
+    questions_by_quiz = {}
+    while True:
+        session_ids = redis_conn.zrangebyscore(EXPIRING_KEY, '-inf', now - GRACE_SECONDS, start=0, num=SWEEP_BATCH_SIZE)
+        if not session_ids:
+            break
+
+        records = []
+        sessions = []
+        try:
+            for session_id in session_ids:
+                if not claim_session(redis_conn, session_id):
+                    continue
+                session = get_session(redis_conn, session_id, with_answers=True)
+                if session is None or session['status'] != 'active':
+                    continue
+                sessions.append(session)
+
+                quiz_id = session['quiz_id']
+                if quiz_id not in live_quizzes:
+                    quiz = Quiz.query.get(quiz_id)
+                    live_quizzes[quiz_id] = bool(quiz and not quiz.is_deleted)
+                if not live_quizzes[quiz_id]:
+                    continue
+                if session['draw'] is not None:
+                    # Only the questions drawn for this session are graded
+                    questions = question_pools.load_drawn_questions(session['draw'])
+                else:
+                    if quiz_id not in questions_by_quiz:
+                        questions_by_quiz[quiz_id] = Question.query.filter_by(quiz_id=quiz_id).all()
+                    questions = questions_by_quiz[quiz_id]
+                if not questions:
+                    continue
+
+                correct_answers, question_results = grade_answers(questions, session['answers'])
+                record = attempt_queue.build_record(
+                    session['user_id'], quiz_id,
+                    correct_answers / len(questions) * 100, len(questions), correct_answers,
+                    session['duration'], session_id,
+                    attempt_detail.build_detail(None, quiz_id, question_results, session['draw'])
+                )
+                # The attempt ended at the deadline, not when the sweep noticed
+                record['timestamp'] = datetime.utcfromtimestamp(session['expires_at']).strftime('%Y-%m-%d %H:%M:%S')
+                records.append(record)
+
+            # A record the database rejects is dead-lettered instead of blocking every later sweep
+            saved, dead = attempt_queue.write_records(records) if records else ([], [])
+        except Exception:
+            db.session.rollback()
+            # Put the sessions back so the next sweep retries them
+            if sessions:
+                redis_conn.zadd(EXPIRING_KEY, {session['session_id']: session['expires_at'] for session in sessions})
+            raise
+        saved_count += len(saved)
+        if dead:
+            pipe = redis_conn.pipeline()
+            attempt_queue.add_dead_letters(pipe, dead)
+            pipe.execute()
+        leaderboard.record_saved_attempts(redis_conn, [
+            (record['user_id'], record['quiz_id'], record['score'], record['time_taken'])
+            for record in saved
+        ])
+        live_monitor.publish_attempts(redis_conn, [(record['quiz_id'], record['score']) for record in saved])
+        for session in sessions:
+            close_session(redis_conn, session)
+    return saved_count
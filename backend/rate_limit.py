@@ -0,0 +1,165 @@
+"""
+Rate limiting and load shedding for expensive endpoints.
+
+Each limited route gets a token bucket per client: `capacity` requests may be
+made in a burst, refilled at capacity / `per_seconds` per second. Clients are
+identified by user ID (`key: 'user'`, for routes behind jwt_required) or by IP
+address (`key: 'ip'`). Buckets live in Redis so every API process shares them,
+updated atomically by a Lua script; while Redis is unreachable each process
+keeps its own buckets in memory.
+
+Independently of the buckets, each route admits at most `max_in_flight`
+concurrent requests per process. Requests beyond that would only queue for the
+password hash or the SQLite write lock, so they are shed right away. The caps
+are fractions of the process's worker threads (GUNICORN_THREADS, as in
+gunicorn.conf.py), so one slow route cannot take every thread.
+
+IP buckets use the address of the connecting client. Behind a reverse proxy
+that is the proxy itself, so set TRUSTED_PROXIES to the number of proxies in
+front of the API; create_app() then reads the client address from
+X-Forwarded-For (werkzeug's ProxyFix). Leave it at 0 when clients connect
+directly, or they could pick their own bucket with a forged header.
+
+Both cases answer 429 with a Retry-After header. Limits are read from
+app.config['RATE_LIMITS'] (see DEFAULT_RATE_LIMITS) and can be switched off
+with RATE_LIMIT_ENABLED.
+"""
+import math
+import os
+import threading
+import time
+from functools import wraps
+import redis
+from flask import current_app, request, jsonify
+from flask_jwt_extended import current_user
+from redis_client import get_redis
+
+BUCKET_KEY = 'quizmaster:rate:{name}:{client}'
+
+# Request threads per API process; a cap at or above it could never shed anything
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', 4))
+
+DEFAULT_RATE_LIMITS = {
+    'login': {'capacity': 10, 'per_seconds': 60, 'key': 'ip', 'max_in_flight': max(1, WORKER_THREADS // 2)},
+    'register': {'capacity': 5, 'per_seconds': 600, 'key': 'ip', 'max_in_flight': max(1, WORKER_THREADS // 4)},
+    'attempt': {'capacity': 6, 'per_seconds': 60, 'key': 'user', 'max_in_flight': max(1, WORKER_THREADS * 3 // 4)}
+}
+
+# Seconds a shed request is told to wait
+SHED_RETRY_AFTER = 1
+
+# In-memory buckets kept before full ones are dropped
+LOCAL_BUCKET_LIMIT = 10000
+
+# Refill the bucket for the time elapsed, then take one token if there is one.
+# Returns {allowed, seconds until a token is available} (as a string, Lua numbers
+# are truncated to integers on the way back).
+TAKE_TOKEN_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+_local_buckets = {}
+_in_flight = {}
+_lock = threading.Lock()
+
+def take_local_token(key, capacity, rate, now):
+    """In-memory version of TAKE_TOKEN_SCRIPT"""
+    with _lock:
+        tokens, ts = _local_buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - ts) * rate)
+        allowed = tokens >= 1
+        wait = 0 if allowed else (1 - tokens) / rate
+        if allowed:
+            tokens -= 1
+        _local_buckets[key] = (tokens, now)
+
+        if len(_local_buckets) > LOCAL_BUCKET_LIMIT:
+            # Buckets that would be full by now carry no state worth keeping
+            for stale in [k for k, (t, s) in _local_buckets.items() if t + (now - s) * rate >= capacity]:
+                del _local_buckets[stale]
+    return allowed, wait
+
+def take_token(name, client, limit):
+    """
+    Take a token from a client's bucket for a route.
+
+    Returns:
+        tuple: (allowed, seconds until the next token is available)
+    """
+    capacity = limit['capacity']
+    rate = capacity / limit['per_seconds']
+    key = BUCKET_KEY.format(name=name, client=client)
+    now = time.time()
+
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        try:
+            allowed, wait = redis_conn.eval(TAKE_TOKEN_SCRIPT, 1, key, capacity, rate, now)
+            return bool(allowed), float(wait)
+        except redis.RedisError as e:
+            print(f"Warning: rate limiting without Redis: {str(e)}")
+
+    return take_local_token(key, capacity, rate, now)
+
+def get_client_id(limit):
+    """Bucket identity of the current request"""
+    if limit['key'] == 'user' and current_user:
+        return f"user:{current_user.id}"
+    return f"ip:{request.remote_addr}"
+
+def too_many_requests(retry_after):
+    response = jsonify({"msg": "Too many requests, please try again later"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def rate_limited(name):
+    """
+    Decorator applying the RATE_LIMITS entry `name` to a view. Place it below
+    jwt_required so per-user limits can identify the user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limit = current_app.config['RATE_LIMITS'].get(name)
+            if not current_app.config['RATE_LIMIT_ENABLED'] or not limit:
+                return view(*args, **kwargs)
+
+            # Shed first so rejected requests do not use up the client's tokens
+            with _lock:
+                if _in_flight.get(name, 0) >= limit['max_in_flight']:
+                    shed = True
+                else:
+                    shed = False
+                    _in_flight[name] = _in_flight.get(name, 0) + 1
+            if shed:
+                print(f"Shedding {name} request: {limit['max_in_flight']} already in progress")
+                return too_many_requests(SHED_RETRY_AFTER)
+
+            try:
+                allowed, wait = take_token(name, get_client_id(limit), limit)
+                if not allowed:
+                    return too_many_requests(wait)
+                return view(*args, **kwargs)
+            finally:
+                with _lock:
+                    _in_flight[name] -= 1
+        return wrapper
+    return decorator
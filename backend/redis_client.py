@@ -0,0 +1,39 @@
+"""
+Shared Redis connection for queues, caches and counters.
+"""
+import os
+import time
+import redis
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Seconds to wait before trying to reconnect after Redis was unreachable
+RETRY_INTERVAL = 30
+
+_client = None
+_retry_at = 0
+
+def get_redis():
+    """
+    Get the shared Redis client.
+    
+    Returns:
+        redis.Redis: Connected client, or None if Redis is unreachable so
+        callers can fall back to their non-Redis code path
+    """
+    global _client, _retry_at
+    
+    if _client is not None:
+        return _client
+    if time.time() < _retry_at:
+        return None
+    
+    try:
+        client = redis.Redis.from_url(REDIS_URL, decode_responses=True, socket_timeout=2)
+        client.ping()
+        _client = client
+    except redis.RedisError as e:
+        print(f"Warning: Redis unavailable at {REDIS_URL}: {str(e)}")
+        _retry_at = time.time() + RETRY_INTERVAL
+    
+    return _client
@@ -0,0 +1,192 @@
+"""
+Read replica of the SQLite database for analytics.
+
+Heavy read-only work (admin statistics, question stats, report tasks) runs
+against a snapshot of quizmaster.db instead of the live file, so it does not
+compete with submissions for the database lock. The snapshot is copied with
+SQLite's online backup API in a single step, and swapped in atomically. In
+WAL mode the copy only holds a read transaction, so writers are not blocked;
+a copy made in small steps would instead restart on every write to the
+primary and never finish under steady traffic. It is refreshed by the
+refresh_replica Celery task every REPLICA_REFRESH_SECONDS, and early once
+REPLICA_REFRESH_WRITES write transactions have been committed since the last
+refresh.
+
+Routing happens in the session: views decorated with @reads_from_replica (and
+code inside `with use_replica():`) send their queries to the replica, and
+everything else uses the primary. A replica older than REPLICA_MAX_STALENESS
+seconds, or one that does not exist yet, is ignored and the primary is used.
+Replica-backed responses carry X-Data-Source and X-Data-Staleness headers.
+
+Refresh by hand with:
+    python replica.py refresh
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import redis
+from flask import current_app, make_response
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+from redis_client import get_redis
+
+WRITE_COUNT_KEY = 'quizmaster:replica:writes'
+
+# Copy every page in one backup step (see the module docstring)
+BACKUP_PAGES_PER_STEP = -1
+
+_local_writes = 0
+_lock = threading.Lock()
+
+class RoutingSession(SignallingSession):
+    """Session that reads from the replica while `use_replica` is set in its info"""
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.info.get('use_replica'):
+            return get_replica_engine(self.app)
+        return super().get_bind(mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy extension whose sessions are RoutingSessions"""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _count_write(session):
+    if session.info.pop('wrote', False):
+        note_write(session.app)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+def database_file(app):
+    return app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+
+def replica_file(app):
+    return app.config.get('REPLICA_PATH') or os.path.splitext(database_file(app))[0] + '-replica.db'
+
+def get_replica_engine(app):
+    """Read-only engine on the replica file, created once per application"""
+    engine = app.extensions.get('replica_engine')
+    if engine is None:
+        engine = create_engine(f"sqlite:///file:{replica_file(app)}?mode=ro&uri=true")
+        app.extensions['replica_engine'] = engine
+    return engine
+
+def get_staleness(app):
+    """Seconds since the replica was last refreshed, or None if there is none"""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(replica_file(app)))
+    except OSError:
+        return None
+
+def refresh_replica(app):
+    """
+    Copy the primary database over the replica with the online backup API.
+
+    Returns:
+        float: Seconds the copy took
+    """
+    started = time.perf_counter()
+    replica_path = replica_file(app)
+    temp_path = f"{replica_path}.{os.getpid()}.tmp"
+
+    source = sqlite3.connect(database_file(app))
+    target = sqlite3.connect(temp_path)
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+        # The copy inherits WAL mode; a rollback journal lets read-only connections open it
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, replica_path)
+
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        try:
+            redis_conn.delete(WRITE_COUNT_KEY)
+        except redis.RedisError:
+            pass
+    return time.perf_counter() - started
+
+def note_write(app):
+    """Count a committed write transaction and queue a refresh every REPLICA_REFRESH_WRITES"""
+    global _local_writes
+    threshold = app.config.get('REPLICA_REFRESH_WRITES')
+    if not app.config.get('REPLICA_ENABLED') or not threshold:
+        return
+
+    count = None
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        try:
+            count = redis_conn.incr(WRITE_COUNT_KEY)
+        except redis.RedisError:
+            pass
+    if count is None:
+        with _lock:
+            _local_writes += 1
+            count = _local_writes
+    if count % threshold:
+        return
+
+    # Imported here: Celery is only needed once the threshold is reached
+    from task import refresh_replica as refresh_task
+    try:
+        refresh_task.delay()
+    except Exception as e:
+        print(f"Could not queue replica refresh: {str(e)}")
+
+@contextmanager
+def use_replica(session=None):
+    """
+    Route the session's queries to the replica inside the block if it is fresh enough.
+
+    Yields:
+        float: Staleness of the replica in seconds, or None if the primary is used
+    """
+    app = current_app._get_current_object()
+    session = session or app.extensions['sqlalchemy'].db.session()
+    staleness = get_staleness(app) if app.config.get('REPLICA_ENABLED') else None
+    if staleness is not None and staleness > app.config['REPLICA_MAX_STALENESS']:
+        staleness = None
+
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = staleness is not None
+    try:
+        yield staleness
+    finally:
+        session.info['use_replica'] = previous
+
+def reads_from_replica(view):
+    """Serve a read-only view from the replica and report its staleness in the response headers"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica() as staleness:
+            response = make_response(view(*args, **kwargs))
+        response.headers['X-Data-Source'] = 'replica' if staleness is not None else 'primary'
+        response.headers['X-Data-Staleness'] = f"{staleness or 0:.1f}"
+        return response
+    return wrapper
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'refresh':
+        print("Usage: python replica.py refresh")
+        sys.exit(1)
+
+    from base_app import create_base_app
+
+    app = create_base_app()
+    seconds = refresh_replica(app)
+    print(f"Replica {replica_file(app)} refreshed in {seconds:.2f}s")
@@ -0,0 +1,254 @@
+"""
+Full-text search over subjects, chapters, quizzes and questions (SQLite FTS5).
+
+One FTS5 table, search_index, holds a row per live subject, chapter, quiz and
+question:
+    title     subject/chapter name, quiz title or question text
+    body      description, or a question's four options
+    kind      'subject', 'chapter', 'quiz' or 'question'
+    subject   's<subject id>' of the row's subject, for filtering
+The rowid is the entity ID * 4 + its kind's position in KINDS, so triggers
+on the content tables update single rows by rowid. Soft-deleted rows are
+removed, and so are the questions of a soft-deleted quiz; results whose
+chapter or subject was soft-deleted but not yet cascaded are filtered when
+they are loaded.
+
+search_index and its triggers are created by bootstrap.py. Rebuild it from
+the content tables with:
+    python search.py rebuild
+"""
+import re
+import sys
+from sqlalchemy import bindparam, text
+
+KINDS = ('subject', 'chapter', 'quiz', 'question')
+
+# Column weights for bm25: title, body, kind, subject
+RANK_WEIGHTS = (10.0, 2.0, 0.0, 0.0)
+
+# Highlighted terms are wrapped in these characters; the client escapes the text and marks them up
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+# Words of a query that are used; the rest is ignored
+MAX_TERMS = 8
+
+# Results per page and suggestions per autocomplete request
+MAX_LIMIT = 50
+SUGGESTION_LIMIT = 8
+
+# Suggestions for a shorter last word are not ranked: a one- or two-letter prefix can match
+# most of the question bank, and scoring every match costs hundreds of milliseconds
+RANKED_PREFIX_MIN = 3
+
+LIVE = "NOT COALESCE({}.is_deleted, 0)"
+
+# Rows of each kind as (rowid, title, body, kind, subject); {where} narrows them down
+INDEX_ROWS = {
+    'subject': f"""
+        SELECT s.id * 4, s.name, COALESCE(s.description, ''), 'subject', 's' || s.id
+        FROM subject s WHERE {LIVE.format('s')} {{where}}""",
+    'chapter': f"""
+        SELECT c.id * 4 + 1, c.name, COALESCE(c.description, ''), 'chapter', 's' || c.subject_id
+        FROM chapter c WHERE {LIVE.format('c')} {{where}}""",
+    'quiz': f"""
+        SELECT q.id * 4 + 2, q.title, COALESCE(q.description, ''), 'quiz', 's' || c.subject_id
+        FROM quiz q JOIN chapter c ON c.id = q.chapter_id WHERE {LIVE.format('q')} {{where}}""",
+    'question': f"""
+        SELECT qn.id * 4 + 3, qn.question_text,
+               qn.option1 || ' ' || qn.option2 || ' ' || qn.option3 || ' ' || qn.option4,
+               'question', 's' || c.subject_id
+        FROM question qn JOIN quiz q ON q.id = qn.quiz_id JOIN chapter c ON c.id = q.chapter_id
+        WHERE {LIVE.format('q')} {{where}}""",
+}
+
+INSERT_ROWS = "INSERT INTO search_index (rowid, title, body, kind, subject) "
+
+def _sync_triggers(table, alias, kind, columns):
+    """Triggers re-indexing one row of a content table after an insert, update or delete"""
+    offset = KINDS.index(kind)
+    one_row = INDEX_ROWS[kind].format(where=f"AND {alias}.id = new.id")
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN
+            {INSERT_ROWS}{one_row};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {columns} ON {table} BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + {offset};
+            {INSERT_ROWS}{one_row};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + {offset};
+        END""",
+    ]
+
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body, kind, subject,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )""",
+    *_sync_triggers('subject', 's', 'subject', 'name, description, is_deleted'),
+    *_sync_triggers('chapter', 'c', 'chapter', 'name, description, is_deleted'),
+    *_sync_triggers('quiz', 'q', 'quiz', 'title, description, is_deleted'),
+    *_sync_triggers('question', 'qn', 'question', 'question_text, option1, option2, option3, option4'),
+    # A quiz's questions leave the index with it and come back if it is restored
+    f"""CREATE TRIGGER IF NOT EXISTS search_quiz_questions AFTER UPDATE OF is_deleted ON quiz
+        WHEN COALESCE(old.is_deleted, 0) != COALESCE(new.is_deleted, 0) BEGIN
+            DELETE FROM search_index WHERE rowid IN (SELECT id * 4 + 3 FROM question WHERE quiz_id = old.id);
+            {INSERT_ROWS}{INDEX_ROWS['question'].format(where="AND q.id = new.id")};
+        END""",
+]
+
+def install(conn):
+    """
+    Create search_index and its triggers if they are missing, and fill a new index.
+
+    Args:
+        conn: SQLAlchemy session or sqlite3 connection (runs plain SQL strings)
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild_index(conn)
+
+def rebuild_index(conn):
+    """Refill search_index from the content tables in one pass per kind"""
+    conn.execute("DELETE FROM search_index")
+    for kind in KINDS:
+        conn.execute(INSERT_ROWS + INDEX_ROWS[kind].format(where=''))
+    # Merge the index segments written by the bulk insert
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+def build_match(query, prefix=False, subject_id=None, kind=None, include_questions=True, columns='title body'):
+    """
+    FTS5 query for the words of a user query, all of which must match.
+
+    Every word is quoted, so FTS5 operators in the input are searched as text.
+
+    Args:
+        prefix (bool): Treat the last word as a prefix (autocomplete)
+        include_questions (bool): False leaves questions out (students only find where to go)
+
+    Returns:
+        str: MATCH expression, or None if the query has no words
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_TERMS]
+    if not terms:
+        return None
+    phrases = [f'"{term}"' for term in terms]
+    if prefix:
+        phrases[-1] += '*'
+    expression = f"{{{columns}}} : ({' '.join(phrases)})"
+    if subject_id is not None:
+        expression += f' AND subject : "s{int(subject_id)}"'
+    if kind is not None:
+        expression += f' AND kind : "{kind}"'
+    if not include_questions:
+        expression = f'({expression}) NOT kind : "question"'
+    return expression
+
+def load_context(session, kind, ids):
+    """
+    Parent names of matched rows, leaving out rows under a soft-deleted parent.
+
+    Returns:
+        dict: ID -> JSON-ready context
+    """
+    queries = {
+        'subject': f"""
+            SELECT s.id, s.id AS subject_id, s.name AS subject_name
+            FROM subject s WHERE s.id IN :ids AND {LIVE.format('s')}""",
+        'chapter': f"""
+            SELECT c.id, s.id AS subject_id, s.name AS subject_name
+            FROM chapter c JOIN subject s ON s.id = c.subject_id
+            WHERE c.id IN :ids AND {LIVE.format('c')} AND {LIVE.format('s')}""",
+        'quiz': f"""
+            SELECT q.id, s.id AS subject_id, s.name AS subject_name, c.id AS chapter_id, c.name AS chapter_name
+            FROM quiz q JOIN chapter c ON c.id = q.chapter_id JOIN subject s ON s.id = c.subject_id
+            WHERE q.id IN :ids AND {LIVE.format('q')} AND {LIVE.format('c')} AND {LIVE.format('s')}""",
+        'question': f"""
+            SELECT qn.id, s.id AS subject_id, s.name AS subject_name, c.id AS chapter_id, c.name AS chapter_name,
+                   q.id AS quiz_id, q.title AS quiz_title
+            FROM question qn JOIN quiz q ON q.id = qn.quiz_id
+            JOIN chapter c ON c.id = q.chapter_id JOIN subject s ON s.id = c.subject_id
+            WHERE qn.id IN :ids AND {LIVE.format('q')} AND {LIVE.format('c')} AND {LIVE.format('s')}""",
+    }
+    rows = session.execute(text(queries[kind]).bindparams(bindparam('ids', expanding=True)), {'ids': list(ids)})
+    return {row.id: {key: value for key, value in row._mapping.items() if key != 'id'} for row in rows}
+
+def with_context(session, matches):
+    """Attach parent context to (rowid, result) pairs, keeping their order"""
+    ids_by_kind = {}
+    for rowid, _ in matches:
+        ids_by_kind.setdefault(KINDS[rowid % 4], set()).add(rowid // 4)
+    contexts = {kind: load_context(session, kind, ids) for kind, ids in ids_by_kind.items()}
+
+    results = []
+    for rowid, result in matches:
+        context = contexts[KINDS[rowid % 4]].get(rowid // 4)
+        if context is not None:
+            results.append(dict(result, type=KINDS[rowid % 4], id=rowid // 4, **context))
+    return results
+
+def search(session, query, subject_id=None, kind=None, include_questions=True, limit=20, offset=0):
+    """
+    Ranked search results with highlighted titles and body snippets.
+
+    Returns:
+        list: Results, best first
+    """
+    match = build_match(query, subject_id=subject_id, kind=kind, include_questions=include_questions)
+    if match is None:
+        return []
+    rows = session.execute(text(f"""
+        SELECT rowid,
+               highlight(search_index, 0, :start, :end) AS title,
+               snippet(search_index, 1, :start, :end, '...', 16) AS snippet
+        FROM search_index
+        WHERE search_index MATCH :match
+        ORDER BY bm25(search_index, {', '.join(map(str, RANK_WEIGHTS))})
+        LIMIT :limit OFFSET :offset
+    """), {'start': MARK_START, 'end': MARK_END, 'match': match, 'limit': limit, 'offset': offset})
+    return with_context(session, [(row.rowid, {'title': row.title, 'snippet': row.snippet}) for row in rows])
+
+def suggest(session, query, subject_id=None, kind=None, include_questions=True, limit=SUGGESTION_LIMIT):
+    """
+    Highlighted titles whose words start with the query, the last word as a prefix.
+
+    Returns:
+        list: Suggestions, best first (in index order for a last word shorter than RANKED_PREFIX_MIN)
+    """
+    match = build_match(
+        query, prefix=True, subject_id=subject_id, kind=kind, include_questions=include_questions, columns='title'
+    )
+    if match is None:
+        return []
+    terms = re.findall(r'\w+', query)[:MAX_TERMS]
+    order = f"ORDER BY bm25(search_index, {', '.join(map(str, RANK_WEIGHTS))})"
+    if len(terms[-1]) < RANKED_PREFIX_MIN:
+        order = ''
+    rows = session.execute(text(f"""
+        SELECT rowid, highlight(search_index, 0, :start, :end) AS title
+        FROM search_index
+        WHERE search_index MATCH :match
+        {order}
+        LIMIT :limit
+    """), {'start': MARK_START, 'end': MARK_END, 'match': match, 'limit': limit})
+    return with_context(session, [(row.rowid, {'title': row.title}) for row in rows])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python search.py rebuild")
+        sys.exit(1)
+
+    from base_app import create_base_app
+    from models import db
+
+    app = create_base_app()
+    with app.app_context():
+        install(db.session)
+        rebuild_index(db.session)
+        db.session.commit()
+        count = db.session.execute("SELECT COUNT(*) FROM search_index").scalar()
+    print(f"Search index rebuilt with {count} entries")
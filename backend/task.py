@@ -1,20 +1,34 @@
 
-from workers import celery
-from models import *
+from workers import celery, get_flask_app
+from models import db, User, Subject, Chapter, Quiz, Question, QuestionSignature, Score, AttemptLayout, AttemptDetail, UserSubjectProgress
 from celery.schedules import crontab
 from mailer import send_email
-from flask import render_template 
+from flask import render_template, current_app
 from datetime import datetime, timedelta
+from redis_client import get_redis
+import attempt_queue
+import quiz_sessions
+import replica
 
 @celery.on_after_finalize.connect
 def setup_periodic_tasks(sender, **kwargs):
     # sender.add_periodic_task(crontab(minute=0, hour=10), send_daily_reminders.s(), name='send_daily_reminders at 10:00')
     sender.add_periodic_task(crontab(minute='*/1'), send_daily_reminders.s(), name='send_daily_reminders every 60 seconds')
+    sender.add_periodic_task(5.0, flush_attempt_queue.s(), name='flush_attempt_queue every 5 seconds')
+    sender.add_periodic_task(30.0, finalize_quiz_sessions.s(), name='finalize_quiz_sessions every 30 seconds')
+    refresh_seconds = get_flask_app().config['REPLICA_REFRESH_SECONDS']
+    sender.add_periodic_task(float(refresh_seconds), refresh_replica.s(), name=f'refresh_replica every {refresh_seconds} seconds')
+    sender.add_periodic_task(crontab(minute=15), scan_duplicate_questions.s(), name='scan_duplicate_questions every hour')
 
 
 @celery.task()
 def send_daily_reminders():
     """ Send daily reminders to user for attempting new quizzes """
+    # Report queries read the analytics replica
+    with replica.use_replica():
+        return build_daily_reminders()
+
+def build_daily_reminders():
     # Get all non-admin users
     users = User.query.filter_by(role='user').all()
     results = []
@@ -62,6 +76,11 @@ def send_daily_reminders():
 
 @celery.task()
 def send_monthly_activity_report():
+    # Report queries read the analytics replica
+    with replica.use_replica():
+        return build_monthly_activity_report()
+
+def build_monthly_activity_report():
     # Get all non-admin users
     users = User.query.filter_by(role='user').all()
     results = []
@@ -110,3 +129,174 @@ def get_performance_metrics(percentage):
     else:
         return "Needs Improvement", "#dc3545"  # danger
        
+
+
+# Rows removed per transaction by cascade_delete. Small batches keep each
+# SQLite write lock short so live requests can interleave with the job.
+DELETE_CHUNK_SIZE = 500
+
+def get_cascade_plan(entity_type, entity_id):
+    """Return (model, criterion) pairs covering the entity's subtree, children first"""
+    if entity_type == 'user':
+        score_ids = db.session.query(Score.id).filter(Score.user_id == entity_id)
+        return [
+            (AttemptDetail, AttemptDetail.score_id.in_(score_ids)),
+            (Score, Score.user_id == entity_id),
+            (UserSubjectProgress, UserSubjectProgress.user_id == entity_id),
+            (User, User.id == entity_id)
+        ]
+    
+    if entity_type == 'quiz':
+        quiz_ids = db.session.query(Quiz.id).filter(Quiz.id == entity_id)
+        parent = [(Quiz, Quiz.id == entity_id)]
+    elif entity_type == 'chapter':
+        quiz_ids = db.session.query(Quiz.id).filter(Quiz.chapter_id == entity_id)
+        parent = [
+            (Quiz, Quiz.chapter_id == entity_id),
+            (Chapter, Chapter.id == entity_id)
+        ]
+    elif entity_type == 'subject':
+        chapter_ids = db.session.query(Chapter.id).filter(Chapter.subject_id == entity_id)
+        quiz_ids = db.session.query(Quiz.id).filter(Quiz.chapter_id.in_(chapter_ids))
+        parent = [
+            (Quiz, Quiz.chapter_id.in_(chapter_ids)),
+            (Chapter, Chapter.subject_id == entity_id),
+            (UserSubjectProgress, UserSubjectProgress.subject_id == entity_id),
+            (Subject, Subject.id == entity_id)
+        ]
+    else:
+        raise ValueError(f"Unknown entity type: {entity_type}")
+    
+    score_ids = db.session.query(Score.id).filter(Score.quiz_id.in_(quiz_ids))
+    question_ids = db.session.query(Question.id).filter(Question.quiz_id.in_(quiz_ids))
+    scores = [
+        (AttemptDetail, AttemptDetail.score_id.in_(score_ids)),
+        (Score, Score.quiz_id.in_(quiz_ids))
+    ]
+    # Scores are swept again right before the quizzes go: queued attempts and
+    # expired sessions may still have been saved while the job ran
+    return scores + [
+        (AttemptLayout, AttemptLayout.quiz_id.in_(quiz_ids)),
+        (QuestionSignature, QuestionSignature.question_id.in_(question_ids)),
+        (Question, Question.quiz_id.in_(quiz_ids))
+    ] + scores + parent
+
+def delete_in_chunks(model, criterion):
+    """Delete matching rows DELETE_CHUNK_SIZE at a time, committing after each batch"""
+    primary_key = list(model.__table__.primary_key.columns)[0]
+    while True:
+        keys = [row[0] for row in db.session.query(primary_key).filter(criterion).limit(DELETE_CHUNK_SIZE)]
+        if not keys:
+            break
+        # Keep the criterion: with composite keys the first key column alone may match other rows
+        count = model.query.filter(criterion, primary_key.in_(keys)).delete(synchronize_session=False)
+        db.session.commit()
+        yield count
+
+@celery.task(bind=True)
+def cascade_delete(self, entity_type, entity_id):
+    """ Permanently remove a soft-deleted entity and everything beneath it """
+    plan = get_cascade_plan(entity_type, entity_id)
+    root_model, root_criterion = plan[-1]
+    root = root_model.query.filter(root_criterion).first()
+    if not root:
+        return {'entity_type': entity_type, 'entity_id': entity_id, 'deleted': 0, 'total': 0}
+    if not root.is_deleted:
+        # The entity was restored or never soft-deleted; leave it alone
+        raise ValueError(f"{entity_type} {entity_id} is not marked as deleted")
+
+    total = sum(model.query.filter(criterion).count() for model, criterion in plan)
+    deleted = 0
+    track_progress = not self.request.called_directly and not self.request.is_eager
+
+    for model, criterion in plan:
+        for count in delete_in_chunks(model, criterion):
+            deleted += count
+            if track_progress:
+                self.update_state(state='PROGRESS', meta={
+                    'entity_type': entity_type,
+                    'entity_id': entity_id,
+                    'table': model.__tablename__,
+                    'deleted': deleted,
+                    'total': total
+                })
+
+    return {'entity_type': entity_type, 'entity_id': entity_id, 'deleted': deleted, 'total': total}
+
+
+@celery.task()
+def flush_attempt_queue():
+    """ Persist quiz attempts queued by the write-behind submission mode """
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return "Redis unavailable - attempt queue not flushed"
+    # Bounded so a backlog is spread across runs instead of one long task
+    count = attempt_queue.drain_attempts(redis_conn, max_batches=20)
+    return f"Persisted {count} queued attempts"
+
+
+@celery.task()
+def finalize_quiz_sessions():
+    """ Grade and save quiz sessions whose deadline passed without a submission """
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return "Redis unavailable - quiz sessions not finalized"
+    count = quiz_sessions.finalize_expired(redis_conn)
+    return f"Finalized {count} expired quiz sessions"
+
+
+@celery.task()
+def refresh_replica():
+    """ Snapshot the database into the analytics replica """
+    if not current_app.config['REPLICA_ENABLED']:
+        return "Replica disabled"
+    seconds = replica.refresh_replica(current_app)
+    return f"Replica refreshed in {seconds:.2f}s"
+
+
+@celery.task()
+def export_scores(file_format='parquet'):
+    """ Export the attempts added since the last export to columnar files """
+    # PyArrow is imported on first use so workers that never run this task skip it
+    import export_scores as exporter
+    result = exporter.export_scores(current_app, file_format=file_format)
+    return f"Exported {result['rows']} attempts from the {result['source']} into {len(result['files'])} file(s)"
+
+
+@celery.task()
+def compute_item_analysis(quiz_id):
+    """ Compute and cache item statistics for a quiz from its stored attempt answers """
+    # NumPy is imported on first use so workers that never run this task skip it
+    import item_analysis
+    analysis = item_analysis.analyze_quiz(quiz_id)
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        item_analysis.store_analysis(redis_conn, analysis)
+    return analysis
+
+
+@celery.task()
+def find_duplicate_questions():
+    """ Scan the question bank for near-duplicates and cache the clusters """
+    # NumPy is imported on first use so workers that never run this task skip it
+    import near_duplicates
+    result = near_duplicates.find_clusters()
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        near_duplicates.store_clusters(redis_conn, result)
+    return result
+
+
+@celery.task()
+def scan_duplicate_questions():
+    """ Refresh the cached near-duplicate clusters once questions have changed """
+    import near_duplicates
+    redis_conn = get_redis()
+    if redis_conn is None:
+        return "Redis unavailable - duplicate scan skipped"
+    cached = near_duplicates.get_cached_clusters(redis_conn)
+    if cached and cached['version'] == near_duplicates.get_bank_version():
+        return "Question bank unchanged - duplicate scan skipped"
+    result = near_duplicates.find_clusters()
+    near_duplicates.store_clusters(redis_conn, result)
+    return f"Found {len(result['clusters'])} duplicate clusters among {result['questions_scanned']} questions"
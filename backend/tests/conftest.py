@@ -0,0 +1,79 @@
+"""
+Shared fixtures: every test gets its own bootstrapped copy of quizmaster.db
+and an in-memory Redis (fakeredis), and Celery tasks run inline.
+
+Run from the backend directory with:
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import fakeredis
+import pytest
+from celery.backends.cache import CacheBackend
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import redis_client
+import workers
+from app import create_app
+from bootstrap import bootstrap_database
+from flask_jwt_extended import create_access_token
+from models import db, Quiz, User
+
+@pytest.fixture
+def redis_conn(monkeypatch):
+    fake = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, '_client', fake)
+    return fake
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = str(tmp_path / 'quizmaster.db')
+    shutil.copy(os.path.join(BACKEND_DIR, 'quizmaster.db'), path)
+    return path
+
+@pytest.fixture
+def app(db_file, redis_conn, monkeypatch):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}',
+        'RATE_LIMIT_ENABLED': False,
+        'REPLICA_ENABLED': False
+    })
+    monkeypatch.setattr(workers, '_flask_app', app)
+    monkeypatch.setattr(workers.celery.conf, 'task_always_eager', True)
+    monkeypatch.setattr(workers.celery.conf, 'task_store_eager_result', False)
+    # Job status lookups go to an in-memory result store instead of the Redis server
+    monkeypatch.setattr(workers.celery._local, 'backend', CacheBackend(app=workers.celery, backend='memory'), raising=False)
+    bootstrap_database(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.get_engine().dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def auth_headers(user):
+    token = create_access_token(
+        identity=user.username,
+        additional_claims={'id': user.id, 'username': user.username, 'is_admin': user.is_admin}
+    )
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def students(app):
+    """Two students as (user ID, request headers); ORM rows would detach after the first request"""
+    users = User.query.filter_by(is_admin=False, is_deleted=False).order_by(User.id).limit(2).all()
+    return [(user.id, auth_headers(user)) for user in users]
+
+@pytest.fixture
+def admin_headers(app):
+    return auth_headers(User.query.filter_by(is_admin=True).first())
+
+@pytest.fixture
+def quiz_id(app):
+    return Quiz.query.filter_by(is_deleted=False).order_by(Quiz.id).first().id
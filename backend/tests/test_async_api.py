@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+from starlette.testclient import TestClient
+import async_api
+
+@pytest.fixture
+def async_client(app, db_file, monkeypatch):
+    monkeypatch.setattr(async_api.pool, 'path', db_file)
+    with TestClient(async_api.app) as client:
+        yield client
+
+def test_quiz_routes_match_flask(client, async_client, admin_headers, quiz_id):
+    # A pooled quiz, so the pool settings are part of the compared responses
+    quiz = client.put(f'/api/quizzes/{quiz_id}', headers=admin_headers, json={'draw_count': 2}).get_json()
+
+    for path in (f'/api/quizzes/{quiz_id}', f"/api/chapters/{quiz['chapter_id']}/quizzes"):
+        flask_response = client.get(path)
+        async_response = async_client.get(path)
+        assert async_response.status_code == flask_response.status_code == 200
+        assert async_response.content == flask_response.data
+    assert client.get(f'/api/quizzes/{quiz_id}').get_json()['draw_count'] == 2
+
+@pytest.mark.parametrize('path', ['/api/quizzes/999999', '/api/chapters/999999/quizzes', '/api/subjects/999999'])
+def test_not_found_matches_flask(client, async_client, path):
+    flask_response = client.get(path)
+    async_response = async_client.get(path)
+    assert async_response.status_code == flask_response.status_code == 404
+    assert async_response.headers['content-type'] == flask_response.headers['Content-Type']
+    assert async_response.content == flask_response.data
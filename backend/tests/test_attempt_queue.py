@@ -0,0 +1,38 @@
+import json
+import attempt_queue
+import task
+from models import Score
+
+def submit(client, quiz_id, headers, key):
+    return client.post(
+        f'/api/quizzes/{quiz_id}/attempt',
+        headers={**headers, 'Idempotency-Key': key},
+        json={'answers': {}}
+    )
+
+def test_same_key_from_two_users_is_saved_for_both(app, client, students, quiz_id):
+    app.config['ATTEMPT_WRITE_BEHIND'] = True
+
+    for _, headers in students:
+        assert submit(client, quiz_id, headers, 'shared-key').status_code == 202
+    task.flush_attempt_queue.delay()
+
+    saved = Score.query.filter_by(quiz_id=quiz_id, idempotency_key='shared-key').all()
+    assert sorted(score.user_id for score in saved) == sorted(user_id for user_id, _ in students)
+
+def test_bad_records_are_dead_lettered(app, client, students, quiz_id, redis_conn):
+    app.config['ATTEMPT_WRITE_BEHIND'] = True
+    user_id, headers = students[0]
+
+    redis_conn.xadd(attempt_queue.STREAM_KEY, {'data': 'not json'})
+    redis_conn.xadd(attempt_queue.STREAM_KEY, {'data': json.dumps({
+        'user_id': user_id, 'quiz_id': quiz_id, 'score': 'x', 'total_questions': 1, 'correct_answers': 0,
+        'time_taken': 1, 'timestamp': 'not a date', 'idempotency_key': 'poison'
+    })})
+    assert submit(client, quiz_id, headers, 'good').status_code == 202
+    task.flush_attempt_queue.delay()
+
+    assert Score.query.filter_by(user_id=user_id, idempotency_key='good').count() == 1
+    assert Score.query.filter_by(idempotency_key='poison').count() == 0
+    assert redis_conn.xlen(attempt_queue.DEAD_LETTER_KEY) == 2
+    assert redis_conn.xlen(attempt_queue.STREAM_KEY) == 0
@@ -0,0 +1,30 @@
+import app as app_module
+from models import Chapter, Quiz, Score, Subject
+
+def test_deleted_subject_hides_its_subtree(client, students, admin_headers, monkeypatch):
+    quiz = Quiz.query.filter_by(is_deleted=False).order_by(Quiz.id).first()
+    quiz_id, chapter_id = quiz.id, quiz.chapter_id
+    subject_id = Chapter.query.get(chapter_id).subject_id
+    # Keep the rows for the checks below; the background job would remove them
+    monkeypatch.setattr(app_module, 'queue_cascade_delete', lambda entity_type, entity_id: None)
+
+    assert client.delete(f'/api/subjects/{subject_id}', headers=admin_headers).status_code == 202
+
+    _, headers = students[0]
+    assert client.get(f'/api/chapters/{chapter_id}').status_code == 404
+    assert client.get(f'/api/quizzes/{quiz_id}').status_code == 404
+    assert client.get(f'/api/quizzes/{quiz_id}/questions', headers=headers).status_code == 404
+    assert client.get(f'/api/quizzes/{quiz_id}/session', headers=headers).status_code == 404
+    assert client.post(f'/api/quizzes/{quiz_id}/attempt', headers=headers, json={'answers': {}}).status_code == 404
+    assert client.post(f'/api/quizzes/{quiz_id}/sessions', headers=headers).status_code == 404
+
+def test_cascade_removes_the_subtree(client, admin_headers):
+    chapter = Chapter.query.filter_by(is_deleted=False).order_by(Chapter.id).first()
+    chapter_id, subject_id = chapter.id, chapter.subject_id
+
+    assert client.delete(f'/api/subjects/{subject_id}', headers=admin_headers).status_code == 202
+
+    assert Subject.query.get(subject_id) is None
+    assert Chapter.query.filter_by(subject_id=subject_id).count() == 0
+    assert Quiz.query.filter_by(chapter_id=chapter_id).count() == 0
+    assert Score.query.filter(~Score.quiz_id.in_(Quiz.query.with_entities(Quiz.id))).count() == 0
@@ -0,0 +1,20 @@
+import db_health
+
+def test_id_range_timeout_is_reported_not_raised(db_file, monkeypatch):
+    conn = db_health.open_database(db_file)
+    query = db_health.query
+
+    def slow_min_max(conn, sql, *args, **kwargs):
+        if 'MIN(id)' in sql:
+            raise db_health.TimedOut("Interrupted after 0s")
+        return query(conn, sql, *args, **kwargs)
+    monkeypatch.setattr(db_health, 'query', slow_min_max)
+    try:
+        ranges = db_health.check_id_ranges(conn, db_health.list_tables(conn), 0, db_health.WARN_AT)
+    finally:
+        conn.close()
+
+    assert ranges
+    for info in ranges.values():
+        assert info['error'] == "Interrupted after 0s"
+        assert info['max_id'] is None and not info['problem']
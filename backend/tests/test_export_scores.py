@@ -0,0 +1,51 @@
+import json
+import os
+import pytest
+from models import db, Score
+
+pq = pytest.importorskip('pyarrow.parquet')
+import export_scores
+
+def exported_rows(directory):
+    rows = []
+    for month in sorted(os.listdir(directory)):
+        if month.startswith('month='):
+            for name in sorted(os.listdir(os.path.join(directory, month))):
+                rows.extend(pq.read_table(os.path.join(directory, month, name)).to_pylist())
+    return rows
+
+def add_score(score_id, timestamp, score=66.666):
+    template = Score.query.first()
+    db.session.execute(
+        "INSERT INTO score (id, user_id, quiz_id, score, total_questions, correct_answers, time_taken, timestamp) "
+        "VALUES (:id, :user_id, :quiz_id, :score, 3, 2, 30, :timestamp)",
+        {'id': score_id, 'user_id': template.user_id, 'quiz_id': template.quiz_id, 'score': score, 'timestamp': timestamp}
+    )
+    db.session.commit()
+
+def test_late_attempt_below_the_highest_id_is_exported(app, tmp_path):
+    directory = os.path.join(str(tmp_path), 'scores')
+    first = export_scores.export_scores(app, str(tmp_path))
+    assert first['rows'] == Score.query.count()
+
+    # An ID from below the highest one (get_next_id wrapped) with an old timestamp
+    lowest = db.session.query(db.func.min(Score.id)).scalar()
+    add_score(lowest - 1, '2024-01-01 00:00:00.000000')
+    second = export_scores.export_scores(app, str(tmp_path))
+
+    assert second['rows'] == 1
+    rows = exported_rows(directory)
+    assert sorted(row['score_id'] for row in rows) == sorted(score_id for (score_id,) in db.session.query(Score.id))
+    assert [row['score'] for row in rows if row['score_id'] == lowest - 1] == [66.666]
+    assert export_scores.export_scores(app, str(tmp_path))['rows'] == 0
+
+def test_watermark_from_score_ids_starts_over(app, tmp_path):
+    export_scores.export_scores(app, str(tmp_path))
+    directory = os.path.join(str(tmp_path), 'scores')
+    with open(os.path.join(directory, export_scores.WATERMARK_FILE), 'w') as f:
+        json.dump({'score_id': 10 ** 9, 'rows': 1}, f)
+
+    result = export_scores.export_scores(app, str(tmp_path))
+
+    assert result['rows'] == Score.query.count()
+    assert len(exported_rows(directory)) == Score.query.count()
@@ -0,0 +1,18 @@
+import item_analysis
+
+def test_request_joins_the_running_job(client, admin_headers, quiz_id, redis_conn):
+    redis_conn.set(item_analysis.JOB_KEY.format(quiz_id=quiz_id), 'running-job')
+
+    response = client.get(f'/api/admin/quizzes/{quiz_id}/item-analysis', headers=admin_headers)
+
+    assert response.status_code == 202
+    assert response.get_json()['job_id'] == 'running-job'
+
+def test_finished_job_clears_its_marker(client, admin_headers, quiz_id, redis_conn):
+    response = client.get(f'/api/admin/quizzes/{quiz_id}/item-analysis', headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['quiz_id'] == quiz_id
+    assert redis_conn.get(item_analysis.JOB_KEY.format(quiz_id=quiz_id)) is None
+    # The stored analysis is served until attempts change
+    assert client.get(f'/api/admin/quizzes/{quiz_id}/item-analysis', headers=admin_headers).status_code == 200
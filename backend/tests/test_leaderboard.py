@@ -0,0 +1,66 @@
+import pytest
+import leaderboard
+from models import Chapter, Question, Quiz
+
+@pytest.fixture
+def chapter_quizzes(app):
+    """Two quizzes with questions in the same chapter, as (quiz_id, chapter_id, subject_id)"""
+    for chapter in Chapter.query.filter_by(is_deleted=False).order_by(Chapter.id):
+        quiz_ids = [quiz.id for quiz in Quiz.query.filter_by(chapter_id=chapter.id, is_deleted=False).order_by(Quiz.id)
+                    if Question.query.filter_by(quiz_id=quiz.id).count()]
+        if len(quiz_ids) >= 2:
+            return [(quiz_id, chapter.id, chapter.subject_id) for quiz_id in quiz_ids[:2]]
+    pytest.skip("no chapter with two quizzes")
+
+def answer(client, headers, quiz_id, correct):
+    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).all()
+    answers = {str(question.id): question.correct_option if i < correct else 0 for i, question in enumerate(questions)}
+    response = client.post(f'/api/quizzes/{quiz_id}/attempt', headers=headers, json={'answers': answers, 'time_taken': 10})
+    assert response.status_code == 201
+
+def board(redis_conn, scope, scope_id):
+    return redis_conn.zrevrange(leaderboard.leaderboard_key(scope, scope_id), 0, -1, withscores=True)
+
+def test_attempts_update_every_level(client, students, chapter_quizzes, redis_conn):
+    (first_quiz, chapter_id, subject_id), (second_quiz, _, _) = chapter_quizzes
+    (leader_id, leader), (runner_up_id, runner_up) = students
+    answer(client, leader, first_quiz, 2)
+    answer(client, runner_up, first_quiz, 1)
+    answer(client, runner_up, second_quiz, 2)
+    # Only a user's best attempt counts
+    answer(client, leader, first_quiz, 0)
+
+    top = client.get(f'/api/leaderboards/quiz/{first_quiz}', headers=leader).get_json()['leaders']
+    assert [(entry['rank'], entry['user_id']) for entry in top] == [(1, leader_id), (2, runner_up_id)]
+    top = client.get(f'/api/leaderboards/chapter/{chapter_id}', headers=leader).get_json()['leaders']
+    assert top[0]['user_id'] == runner_up_id
+    rank = client.get(f'/api/leaderboards/subject/{subject_id}/me', headers=leader).get_json()
+    assert rank['rank'] == 2
+
+def test_deleted_quiz_leaves_the_totals_a_rebuild_would_give(client, students, admin_headers, chapter_quizzes,
+                                                             redis_conn):
+    (first_quiz, chapter_id, subject_id), (second_quiz, _, _) = chapter_quizzes
+    (_, leader), (_, runner_up) = students
+    # Start from the attempts already in the database
+    leaderboard.rebuild_leaderboards(redis_conn)
+    answer(client, leader, first_quiz, 2)
+    answer(client, runner_up, second_quiz, 1)
+
+    assert client.delete(f'/api/quizzes/{first_quiz}', headers=admin_headers).status_code == 202
+
+    assert board(redis_conn, 'quiz', first_quiz) == []
+    after_delete = (board(redis_conn, 'chapter', chapter_id), board(redis_conn, 'subject', subject_id))
+    leaderboard.rebuild_leaderboards(redis_conn)
+    assert after_delete == (board(redis_conn, 'chapter', chapter_id), board(redis_conn, 'subject', subject_id))
+    assert all(value > 0 for _, value in after_delete[0] + after_delete[1])
+
+def test_deleted_user_leaves_no_rank_gap(client, students, admin_headers, chapter_quizzes):
+    first_quiz = chapter_quizzes[0][0]
+    (leader_id, leader), (runner_up_id, runner_up) = students
+    answer(client, leader, first_quiz, 2)
+    answer(client, runner_up, first_quiz, 1)
+
+    assert client.delete(f'/api/users/{leader_id}', headers=admin_headers).status_code == 202
+
+    top = client.get(f'/api/leaderboards/quiz/{first_quiz}', headers=runner_up).get_json()['leaders']
+    assert [(entry['rank'], entry['user_id']) for entry in top] == [(1, runner_up_id)]
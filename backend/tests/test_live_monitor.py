@@ -0,0 +1,32 @@
+import live_monitor
+
+def drain(pubsub, metrics):
+    # The ignored subscribe confirmation also reads as None, so stop only after two empty reads
+    empty = 0
+    while empty < 2:
+        message = pubsub.get_message(timeout=0.1)
+        if message is None:
+            empty += 1
+        else:
+            empty = 0
+            metrics.apply(message['data'])
+
+def test_attempts_published_before_the_totals_load_count_once(redis_conn):
+    live_monitor.publish_attempts(redis_conn, [(1, 80.0)])
+    pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(live_monitor.CHANNEL)
+    # Published after subscribing but before the aggregator reads the totals
+    live_monitor.publish_attempts(redis_conn, [(1, 60.0), (2, 90.0)])
+
+    metrics = live_monitor.LiveMetrics()
+    day = live_monitor.today()
+    metrics.load_totals(day, redis_conn.hgetall(live_monitor.QUIZ_TOTALS_KEY.format(day=day)))
+    live_monitor.publish_attempts(redis_conn, [(2, 70.0)])
+    drain(pubsub, metrics)
+
+    quizzes = metrics.snapshot()['quizzes']
+    assert quizzes == [
+        {'quiz_id': 1, 'attempts': 2, 'average_score': 70.0},
+        {'quiz_id': 2, 'attempts': 2, 'average_score': 80.0},
+    ]
+    assert metrics.snapshot()['submissions_per_minute'] == 3
@@ -0,0 +1,31 @@
+import near_duplicates
+from models import Question
+
+def test_reworded_question_is_clustered_with_the_original(client, admin_headers, quiz_id):
+    original = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).first()
+    copy = {
+        'question_text': original.question_text.rstrip('?') + ' ?',
+        'option1': original.option1,
+        'option2': original.option2,
+        'option3': original.option3,
+        'option4': original.option4,
+        'correct_option': original.correct_option
+    }
+    original_id = original.id
+    response = client.post(f'/api/quizzes/{quiz_id}/questions', headers=admin_headers, json=copy)
+    assert response.status_code == 201
+    copy_id = response.get_json()['id']
+
+    response = client.get('/api/admin/question-duplicates', headers=admin_headers)
+
+    assert response.status_code == 200
+    clusters = [{member['question_id'] for member in cluster['questions']} for cluster in response.get_json()['clusters']]
+    assert any({original_id, copy_id} <= cluster for cluster in clusters)
+
+def test_request_joins_the_running_scan(client, admin_headers, redis_conn):
+    redis_conn.set(near_duplicates.JOB_KEY, 'running-scan')
+
+    response = client.get('/api/admin/question-duplicates', headers=admin_headers)
+
+    assert response.status_code == 202
+    assert response.get_json()['job_id'] == 'running-scan'
@@ -0,0 +1,45 @@
+import sqlite3
+import threading
+import progress
+from models import db, Chapter, Quiz, Score
+
+def attempted(path, user_id, subject_id):
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT quizzes_attempted FROM user_subject_progress WHERE user_id = ? AND subject_id = ?",
+                           (user_id, subject_id)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+def test_concurrent_first_attempts_count_once(app, db_file, students):
+    user_id = students[0][0]
+    quiz = Quiz.query.filter(Quiz.is_deleted == False, ~Quiz.id.in_(
+        db.session.query(Score.quiz_id).filter(Score.user_id == user_id))).first()
+    subject_id = Chapter.query.get(quiz.chapter_id).subject_id
+    quiz_id = quiz.id
+    db.session.remove()
+    db.get_engine().dispose()
+    before = attempted(db_file, user_id, subject_id)
+    params = {'user_id': user_id, 'quiz_id': quiz_id}
+
+    first = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+    first.execute(progress.RECORD_FIRST_ATTEMPT, params)
+
+    def second_attempt():
+        conn = sqlite3.connect(db_file, timeout=10)
+        try:
+            conn.execute(progress.RECORD_FIRST_ATTEMPT, params)
+            conn.commit()
+        finally:
+            conn.close()
+    # The second attempt waits for the write lock until the first one's Score is committed
+    thread = threading.Thread(target=second_attempt)
+    thread.start()
+    first.execute("INSERT INTO score (id, user_id, quiz_id, score, total_questions, correct_answers, time_taken) "
+                  "VALUES ((SELECT MAX(id) + 1 FROM score), :user_id, :quiz_id, 100, 1, 1, 5)", params)
+    first.commit()
+    first.close()
+    thread.join()
+
+    assert attempted(db_file, user_id, subject_id) == before + 1
@@ -0,0 +1,53 @@
+import pytest
+import question_pools
+from models import Question
+
+@pytest.fixture
+def pooled_quiz_id(client, admin_headers, quiz_id):
+    response = client.put(f'/api/quizzes/{quiz_id}', headers=admin_headers, json={'draw_count': 2})
+    assert response.status_code == 200
+    return quiz_id
+
+def correct_answers(question_ids):
+    return {str(question.id): question.correct_option for question in Question.query.filter(Question.id.in_(question_ids))}
+
+def test_attempt_is_graded_on_the_drawn_questions_once(client, students, pooled_quiz_id):
+    _, headers = students[0]
+    draw = client.post(f'/api/quizzes/{pooled_quiz_id}/draw', headers=headers).get_json()
+    assert client.post(f'/api/quizzes/{pooled_quiz_id}/draw', headers=headers).get_json() == draw
+    drawn_ids = [question['id'] for question in draw['questions']]
+    assert len(drawn_ids) == 2
+
+    other_ids = [question.id for question in Question.query.filter(
+        Question.quiz_id == pooled_quiz_id, ~Question.id.in_(drawn_ids))]
+    answers = correct_answers(drawn_ids + other_ids)
+    response = client.post(f'/api/quizzes/{pooled_quiz_id}/attempt', headers=headers,
+                           json={'answers': answers, 'draw': draw['draw']})
+    assert response.status_code == 201
+    result = response.get_json()
+    assert (result['total_questions'], result['correct_answers']) == (2, 2)
+
+    # The token was used up; the next draw is a new one
+    replay = client.post(f'/api/quizzes/{pooled_quiz_id}/attempt', headers=headers,
+                         json={'answers': answers, 'draw': draw['draw']})
+    assert replay.status_code == 400
+    assert client.post(f'/api/quizzes/{pooled_quiz_id}/draw', headers=headers).get_json()['draw'] != draw['draw']
+
+def test_draw_token_is_bound_to_its_user(client, students, pooled_quiz_id):
+    draw = client.post(f'/api/quizzes/{pooled_quiz_id}/draw', headers=students[0][1]).get_json()
+    response = client.post(f'/api/quizzes/{pooled_quiz_id}/attempt', headers=students[1][1],
+                           json={'answers': {}, 'draw': draw['draw']})
+    assert response.status_code == 400
+
+def test_resumed_session_does_not_draw_again(client, students, pooled_quiz_id, monkeypatch):
+    _, headers = students[0]
+    started = client.post(f'/api/quizzes/{pooled_quiz_id}/sessions', headers=headers).get_json()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('a resumed session must keep its draw')
+    monkeypatch.setattr(question_pools, 'new_draw', fail)
+    resumed = client.post(f'/api/quizzes/{pooled_quiz_id}/sessions', headers=headers)
+
+    assert resumed.status_code == 201
+    assert resumed.get_json()['session_id'] == started['session_id']
+    assert resumed.get_json()['questions'] == started['questions']
@@ -0,0 +1,54 @@
+import time
+import pytest
+import app as app_module
+import attempt_queue
+import quiz_sessions
+from models import Score
+
+@pytest.fixture
+def session_id(client, students, quiz_id):
+    response = client.post(f'/api/quizzes/{quiz_id}/sessions', headers=students[0][1])
+    assert response.status_code == 201
+    return response.get_json()['session_id']
+
+@pytest.mark.parametrize('body', [[1, 2], {'answers': [1, 2]}, {'answers': 'x'}])
+def test_non_object_answers_are_rejected(client, students, session_id, body):
+    headers = students[0][1]
+    assert client.put(f'/api/quiz-sessions/{session_id}/answers', headers=headers, json=body).status_code == 400
+    assert client.post(f'/api/quiz-sessions/{session_id}/submit', headers=headers, json=body).status_code == 400
+
+def test_failed_submission_keeps_the_session(client, students, session_id, redis_conn, monkeypatch):
+    headers = students[0][1]
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('database unavailable')
+    with monkeypatch.context() as patch:
+        patch.setattr(app_module, 'save_graded_attempt', fail)
+        assert client.post(f'/api/quiz-sessions/{session_id}/submit', headers=headers).status_code == 500
+    assert redis_conn.zscore(quiz_sessions.EXPIRING_KEY, session_id) is not None
+
+    assert client.post(f'/api/quiz-sessions/{session_id}/submit', headers=headers).status_code == 201
+    assert Score.query.filter_by(idempotency_key=session_id).count() == 1
+
+def test_sweep_dead_letters_a_rejected_attempt(client, students, quiz_id, redis_conn, monkeypatch):
+    session_ids = [
+        client.post(f'/api/quizzes/{quiz_id}/sessions', headers=headers).get_json()['session_id']
+        for _, headers in students
+    ]
+    rejected_user_id = students[0][0]
+    write_batch = attempt_queue.write_batch
+
+    def reject_one(records):
+        if any(record['user_id'] == rejected_user_id for record in records):
+            raise ValueError('rejected record')
+        return write_batch(records)
+    monkeypatch.setattr(attempt_queue, 'write_batch', reject_one)
+
+    later = time.time() + 24 * 60 * 60
+    assert quiz_sessions.finalize_expired(redis_conn, now=later) == 1
+
+    assert Score.query.filter_by(idempotency_key=session_ids[1]).count() == 1
+    assert redis_conn.xlen(attempt_queue.DEAD_LETTER_KEY) == 1
+    # Neither session is left for the next sweep
+    assert redis_conn.zcard(quiz_sessions.EXPIRING_KEY) == 0
+    assert quiz_sessions.finalize_expired(redis_conn, now=later) == 0
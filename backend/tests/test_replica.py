@@ -0,0 +1,35 @@
+import sqlite3
+import threading
+import replica
+
+def test_refresh_under_writes_copies_a_consistent_snapshot(app, db_file):
+    app.config['REPLICA_PATH'] = db_file.replace('.db', '-replica.db')
+    writer = sqlite3.connect(db_file, check_same_thread=False)
+    writer.execute("CREATE TABLE write_log (id INTEGER PRIMARY KEY, payload TEXT)")
+    writer.commit()
+    stop = threading.Event()
+
+    def write():
+        while not stop.is_set():
+            writer.execute("INSERT INTO write_log (payload) VALUES (?)", ('x' * 1000,))
+            writer.commit()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        copied = []
+        for _ in range(5):
+            replica.refresh_replica(app)
+            conn = sqlite3.connect(f"file:{replica.replica_file(app)}?mode=ro", uri=True)
+            try:
+                assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+                copied.append(conn.execute("SELECT COUNT(*) FROM write_log").fetchone()[0])
+            finally:
+                conn.close()
+    finally:
+        stop.set()
+        thread.join()
+        writer.close()
+
+    assert copied == sorted(copied)
+    assert copied[-1] > 0
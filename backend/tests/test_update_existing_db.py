@@ -0,0 +1,42 @@
+import sqlite3
+import pytest
+from update_existing_db import update_database
+
+@pytest.fixture
+def bootstrapped_file(app, db_file):
+    # The migration works on the file directly, so release the application's connections
+    from models import db
+    db.session.remove()
+    db.get_engine().dispose()
+    return db_file
+
+def read_state(path):
+    conn = sqlite3.connect(path)
+    try:
+        triggers = sorted(name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'"))
+        titles = sorted(title for (title,) in conn.execute("SELECT title FROM search_index"))
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ('user', 'subject', 'chapter', 'quiz', 'question', 'score')
+        }
+    finally:
+        conn.close()
+    return triggers, titles, counts
+
+def test_migration_keeps_triggers_and_search_index(bootstrapped_file):
+    triggers, titles, counts = read_state(bootstrapped_file)
+    assert triggers
+
+    update_database(bootstrapped_file)
+
+    assert read_state(bootstrapped_file) == (triggers, titles, counts)
+    conn = sqlite3.connect(bootstrapped_file)
+    try:
+        assert not conn.execute("SELECT name FROM sqlite_master WHERE name = '_id_remap_progress'").fetchone()
+        # The recreated triggers keep the index in sync with the renumbered rows
+        question_id = conn.execute("SELECT MIN(id) FROM question").fetchone()[0]
+        conn.execute("UPDATE question SET question_text = 'zebracorn' WHERE id = ?", (question_id,))
+        conn.commit()
+        assert conn.execute("SELECT COUNT(*) FROM search_index WHERE search_index MATCH 'zebracorn'").fetchone()[0] == 1
+    finally:
+        conn.close()
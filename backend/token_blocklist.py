@@ -0,0 +1,108 @@
+"""
+Refresh token rotation and the token revocation list.
+
+Every login starts a token family; the refresh tokens issued for it carry the
+family ID in their `fam` claim. Refreshing revokes the presented refresh token
+and issues a new pair in the same family. Presenting a refresh token that was
+already used means it was copied, so the whole family is revoked and the user
+has to log in again.
+
+Revoked token IDs (jti) and families are Redis keys that expire with the
+tokens they cover, so the blocklist check registered with Flask-JWT-Extended
+is a single MGET. While Redis is unreachable revocations are kept in this
+process only.
+"""
+import threading
+import time
+import redis
+from flask import current_app
+from redis_client import get_redis
+
+REVOKED_TOKEN_KEY = 'quizmaster:revoked-token:{jti}'
+REVOKED_FAMILY_KEY = 'quizmaster:revoked-family:{family}'
+
+# Fallback revocations: key -> expiry (epoch seconds)
+_local_revoked = {}
+_lock = threading.Lock()
+
+def _seconds_left(payload):
+    return max(int(payload['exp'] - time.time()), 1)
+
+def _revoke_key(key, ttl, only_if_new=False):
+    """
+    Record a revocation that lasts ttl seconds.
+
+    Returns:
+        bool: False if only_if_new was set and the key was already revoked
+    """
+    redis_conn = get_redis()
+    if redis_conn is not None:
+        try:
+            return bool(redis_conn.set(key, 1, ex=ttl, nx=only_if_new))
+        except redis.RedisError as e:
+            print(f"Warning: could not record token revocation in Redis: {str(e)}")
+
+    now = time.time()
+    with _lock:
+        if only_if_new and _local_revoked.get(key, 0) > now:
+            return False
+        _local_revoked[key] = now + ttl
+        # Drop expired entries now and then so the fallback stays small
+        if len(_local_revoked) % 1000 == 0:
+            for stale in [k for k, expires in _local_revoked.items() if expires <= now]:
+                del _local_revoked[stale]
+    return True
+
+def is_token_revoked(jwt_header, jwt_payload):
+    """
+    Blocklist hook: True if the token or its refresh family has been revoked.
+    A refresh token that is presented again after rotation also revokes its family.
+    """
+    token_key = REVOKED_TOKEN_KEY.format(jti=jwt_payload['jti'])
+    family_key = REVOKED_FAMILY_KEY.format(family=jwt_payload.get('fam'))
+    token_revoked = family_revoked = False
+
+    if _local_revoked:
+        now = time.time()
+        with _lock:
+            token_revoked = _local_revoked.get(token_key, 0) > now
+            family_revoked = _local_revoked.get(family_key, 0) > now
+
+    redis_conn = get_redis()
+    if redis_conn is not None and not (token_revoked or family_revoked):
+        try:
+            token_value, family_value = redis_conn.mget(token_key, family_key)
+            token_revoked = token_value is not None
+            family_revoked = family_value is not None
+        except redis.RedisError as e:
+            print(f"Warning: could not check token revocation in Redis: {str(e)}")
+
+    if token_revoked and not family_revoked and jwt_payload.get('type') == 'refresh':
+        print(f"Refresh token reuse detected for user {jwt_payload.get('id')}, revoking its login")
+        revoke_family(jwt_payload)
+    return token_revoked or family_revoked
+
+def revoke_token(jwt_payload):
+    """Revoke a single access or refresh token until it expires"""
+    _revoke_key(REVOKED_TOKEN_KEY.format(jti=jwt_payload['jti']), _seconds_left(jwt_payload))
+
+def revoke_family(jwt_payload):
+    """Revoke every refresh token of a login, and the access tokens issued with them"""
+    if jwt_payload.get('fam'):
+        # Outlive any refresh token the family may still have
+        ttl = int(current_app.config['JWT_REFRESH_TOKEN_EXPIRES'].total_seconds())
+        _revoke_key(REVOKED_FAMILY_KEY.format(family=jwt_payload['fam']), ttl)
+
+def use_refresh_token(jwt_payload):
+    """
+    Consume a refresh token for rotation.
+
+    Returns:
+        bool: True if this is the token's first use. If a concurrent request
+        consumed it first, the token's family is revoked and False is returned.
+    """
+    if _revoke_key(REVOKED_TOKEN_KEY.format(jti=jwt_payload['jti']), _seconds_left(jwt_payload), only_if_new=True):
+        return True
+    print(f"Refresh token reuse detected for user {jwt_payload.get('id')}, revoking its login")
+    revoke_family(jwt_payload)
+    return False
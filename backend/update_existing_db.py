@@ -2,163 +2,318 @@
 """
 Script to update an existing database with professional-looking IDs.
 This script will create a backup of the original database, then update
-all IDs to follow a professional convention.
+all IDs to follow a professional convention (utils.ID_RANGES).
 
-WARNING: This script modifies the database in place. Back up your data first!
+The work is done inside SQLite, so memory use does not grow with the data:
+    1. An online backup is taken with SQLite's backup API, in one step.
+    2. For every remapped table an _id_map_<table> (old_id -> new_id) mapping
+       table is filled by one INSERT ... SELECT.
+    3. Every table is copied into <table>_new with INSERT ... SELECT joins on
+       the mapping tables, BATCH_SIZE rows per transaction.
+    4. The copies replace the originals, with their indexes and triggers, in
+       a single transaction, and the search index (search.py) is rebuilt.
+
+Progress is stored in the database (_id_remap_progress), so an interrupted
+run continues where it stopped when started again with the same file.
+
+WARNING: This script modifies the database in place. Stop the API and the
+Celery workers first: rows written while it runs are not remapped. Redis
+leaderboards and caches hold the old IDs; rebuild them afterwards with
+    python leaderboard.py rebuild
+
+Usage:
+    python update_existing_db.py [DB_FILE] [--batch-size N] [--yes]
 """
 
+import argparse
 import os
-import sys
+import re
 import sqlite3
-import shutil
-import random
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from utils import ID_RANGES
+import search
+
+# Rows copied per transaction
+BATCH_SIZE = 50000
+
+# Copy every page in one backup step: a stepped backup restarts on every write to the source
+BACKUP_PAGES_PER_STEP = -1
+
+# Tables that get new IDs, parents first, with the foreign keys that point into them
+REMAPPED_TABLES = [
+    ('user', {}),
+    ('subject', {}),
+    ('chapter', {'subject_id': 'subject'}),
+    ('quiz', {'chapter_id': 'chapter'}),
+    ('question', {'quiz_id': 'quiz'}),
+    ('score', {'user_id': 'user', 'quiz_id': 'quiz'}),
+]
+
+# Tables that keep their own keys but reference remapped ones
+DEPENDENT_TABLES = [
+    ('attempt_layout', {'quiz_id': 'quiz'}),
+    ('attempt_detail', {'score_id': 'score'}),
+    ('user_subject_progress', {'user_id': 'user', 'subject_id': 'subject'}),
+    ('question_signature', {'question_id': 'question'}),
+]
+
+PROGRESS_TABLE = '_id_remap_progress'
+
+@contextmanager
+def transaction(conn):
+    """Run the block in one transaction (the connection is in autocommit mode otherwise)"""
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def map_table(table):
+    return f'_id_map_{table}'
+
+def table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+def get_progress(conn, step):
+    row = conn.execute(f"SELECT last_rowid, copied, done FROM {PROGRESS_TABLE} WHERE step = ?", (step,)).fetchone()
+    return row or (0, 0, 0)
+
+def set_progress(conn, step, last_rowid, copied, done=0):
+    conn.execute(
+        f"INSERT OR REPLACE INTO {PROGRESS_TABLE} (step, last_rowid, copied, done) VALUES (?, ?, ?, ?)",
+        (step, last_rowid, copied, done)
+    )
+
+def backup_database(db_file, backup_file):
+    """Copy the database with the online backup API, consistent even if it is being written"""
+    source = sqlite3.connect(db_file)
+    target = sqlite3.connect(backup_file)
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+    finally:
+        target.close()
+        source.close()
+
+def build_mapping(conn, table):
+    """
+    Assign new IDs in old ID order, each 5-20 above the previous one.
 
-# Default to quizmaster.db, but allow overriding
-DB_FILE = sys.argv[1] if len(sys.argv) > 1 else 'quizmaster.db'
-BACKUP_FILE = f"{DB_FILE}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-# ID ranges for different entity types (same as in utils.py)
-ID_RANGES = {
-    'user': (1000, 9999),     # 1000-9999
-    'subject': (10000, 19999), # 10000-19999
-    'chapter': (20000, 29999), # 20000-29999
-    'quiz': (30000, 39999),    # 30000-39999
-    'question': (40000, 49999), # 40000-49999
-    'score': (50000, 59999)    # 50000-59999
-}
-
-def generate_id(entity_type, index=0):
-    """Generate a professional-looking ID for an entity"""
-    min_id, max_id = ID_RANGES[entity_type]
-    # Create a gap between IDs for more realistic look
-    return min_id + index * random.randint(5, 20)
-
-def update_database():
+    Returns:
+        int: Highest new ID
+    """
+    min_id, max_id = ID_RANGES[table]
+    with transaction(conn):
+        conn.execute(f"DROP TABLE IF EXISTS {map_table(table)}")
+        conn.execute(f"CREATE TABLE {map_table(table)} (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+        # Gaps are stored first so each is drawn exactly once, then summed in ID order
+        conn.execute("CREATE TEMP TABLE _id_gaps (old_id INTEGER PRIMARY KEY, gap INTEGER NOT NULL)")
+        conn.execute(f"INSERT INTO _id_gaps (old_id, gap) SELECT id, 5 + abs(random()) % 16 FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {map_table(table)} (old_id, new_id)
+            SELECT old_id, ? + COALESCE(SUM(gap) OVER (ORDER BY old_id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0)
+            FROM _id_gaps
+        """, (min_id,))
+        conn.execute("DROP TABLE temp._id_gaps")
+        set_progress(conn, f'map:{table}', 0, 0, done=1)
+    highest = conn.execute(f"SELECT MAX(new_id) FROM {map_table(table)}").fetchone()[0] or min_id
+    if highest > max_id:
+        print(f"  Warning: {table} IDs reach {highest}, beyond the {min_id}-{max_id} range")
+    return highest
+
+def new_table_sql(conn, table):
+    """CREATE TABLE statement of <table>_new, keeping the original columns and constraints"""
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    return re.sub(r'^CREATE TABLE\s+("?)' + re.escape(table) + r'\1', f'CREATE TABLE "{table}_new"', sql, count=1)
+
+def copy_table(conn, table, foreign_keys, remapped, batch_size):
+    """Copy a table into <table>_new with its own and its foreign key IDs mapped, one batch per transaction"""
+    step = f'copy:{table}'
+    last_rowid, copied, done = get_progress(conn, step)
+    if done:
+        print(f"  {table}: already copied ({copied} rows)")
+        return
+    if last_rowid == 0:
+        with transaction(conn):
+            conn.execute(f'DROP TABLE IF EXISTS "{table}_new"')
+            conn.execute(new_table_sql(conn, table))
+            set_progress(conn, step, 0, 0)
+
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    select = []
+    joins = []
+    for column in columns:
+        if column == 'id' and remapped:
+            select.append('own.new_id')
+            joins.append(f'JOIN {map_table(table)} own ON own.old_id = t.id')
+        elif column in foreign_keys:
+            # References to rows that no longer exist are kept as they are
+            alias = f'fk_{column}'
+            select.append(f'COALESCE({alias}.new_id, t."{column}")')
+            joins.append(f'LEFT JOIN {map_table(foreign_keys[column])} {alias} ON {alias}.old_id = t."{column}"')
+        else:
+            select.append(f't."{column}"')
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    copy_sql = f"""
+        INSERT INTO "{table}_new" ({column_list})
+        SELECT {', '.join(select)}
+        FROM (SELECT rowid AS _rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?) t
+        {' '.join(joins)}
+    """
+    total = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    started, resumed_from = time.perf_counter(), copied
+    while True:
+        upper = conn.execute(
+            f'SELECT MAX(_rowid) FROM (SELECT rowid AS _rowid FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?)',
+            (last_rowid, batch_size)
+        ).fetchone()[0]
+        if upper is None:
+            break
+        with transaction(conn):
+            rows = conn.execute(copy_sql, (last_rowid, batch_size)).rowcount
+            copied += rows
+            last_rowid = upper
+            set_progress(conn, step, last_rowid, copied)
+        rate = (copied - resumed_from) / max(time.perf_counter() - started, 1e-6)
+        print(f"  {table}: {copied}/{total} rows ({copied * 100 // max(total, 1)}%, {rate:.0f} rows/s)")
+    with transaction(conn):
+        set_progress(conn, step, last_rowid, copied, done=1)
+
+def remap_layout_questions(conn, batch_size):
+    """Map the question IDs listed in attempt_layout_new.question_ids"""
+    step = 'layout-questions'
+    last_rowid, updated, done = get_progress(conn, step)
+    if done:
+        return
+    while True:
+        layouts = conn.execute(
+            "SELECT rowid, question_ids FROM attempt_layout_new WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size)
+        ).fetchall()
+        if not layouts:
+            break
+        with transaction(conn):
+            for rowid, question_ids in layouts:
+                old_ids = [int(question_id) for question_id in question_ids.split(',') if question_id]
+                mapping = dict(conn.execute(
+                    f"SELECT old_id, new_id FROM {map_table('question')} "
+                    f"WHERE old_id IN (SELECT value FROM json_each(?))",
+                    (f"[{','.join(map(str, old_ids))}]",)
+                ).fetchall())
+                conn.execute(
+                    "UPDATE attempt_layout_new SET question_ids = ? WHERE rowid = ?",
+                    (','.join(str(mapping.get(question_id, question_id)) for question_id in old_ids), rowid)
+                )
+            last_rowid = layouts[-1][0]
+            updated += len(layouts)
+            set_progress(conn, step, last_rowid, updated)
+        print(f"  attempt_layout: question lists of {updated} layouts remapped")
+    with transaction(conn):
+        set_progress(conn, step, last_rowid, updated, done=1)
+
+def swap_tables(conn, tables, highest_ids):
+    """Replace every table with its copy, restore its indexes and triggers and drop the remapping tables, in one transaction"""
+    with transaction(conn):
+        # Triggers reference other tables (the search triggers join quiz to chapter), and
+        # RENAME re-checks every trigger in the schema, so all of them are dropped during
+        # the swap and come back once every table is in place
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f'DROP TRIGGER "{name}"')
+        trigger_sql = [sql for _, sql in triggers]
+        for table in tables:
+            index_sql = [
+                row[0] for row in conn.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+                )
+            ]
+            conn.execute(f'DROP TABLE "{table}"')
+            conn.execute(f'ALTER TABLE "{table}_new" RENAME TO "{table}"')
+            for sql in index_sql:
+                conn.execute(sql)
+        for sql in trigger_sql:
+            conn.execute(sql)
+        # The search index is keyed by the old IDs
+        if table_exists(conn, 'search_index'):
+            search.rebuild_index(conn)
+        if table_exists(conn, 'sqlite_sequence'):
+            for table, highest in highest_ids.items():
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, highest))
+        for table, _ in REMAPPED_TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {map_table(table)}")
+        conn.execute(f"DROP TABLE {PROGRESS_TABLE}")
+
+def update_database(db_file, batch_size=BATCH_SIZE):
     """Update the database with professional-looking IDs"""
-    if not os.path.exists(DB_FILE):
-        print(f"Database file {DB_FILE} not found!")
+    if not os.path.exists(db_file):
+        print(f"Database file {db_file} not found!")
         return
-    
-    # Create a backup
-    print(f"Creating backup to {BACKUP_FILE}...")
-    shutil.copy2(DB_FILE, BACKUP_FILE)
-    print(f"Backup created.")
-    
-    # Connect to the database
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Start a transaction
-    conn.execute("BEGIN TRANSACTION")
-    
+
+    started = time.perf_counter()
+    # Autocommit mode: every step runs in its own explicit transaction
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    conn.execute("PRAGMA foreign_keys = OFF")
     try:
-        # Get all current IDs and create mapping to new IDs
-        tables = ['user', 'subject', 'chapter', 'quiz', 'question', 'score']
-        id_mappings = {}
-        
-        for table in tables:
-            id_mappings[table] = {}
-            
-            # Get existing IDs
-            cursor.execute(f"SELECT id FROM {table} ORDER BY id")
-            old_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Create mapping to new IDs
-            for i, old_id in enumerate(old_ids):
-                new_id = generate_id(table, i)
-                id_mappings[table][old_id] = new_id
-        
-        # Temporarily disable foreign key constraints
-        cursor.execute("PRAGMA foreign_keys = OFF")
-        
-        print("Updating IDs in tables...")
-        
-        # For each table, create a temporary table, copy data with new IDs, then replace the original
-        for table in tables:
-            print(f"  Processing {table} table...")
-            
-            # Get table schema
-            cursor.execute(f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table}'")
-            schema = cursor.fetchone()[0]
-            
-            # Create temp table
-            cursor.execute(f"CREATE TABLE {table}_temp AS SELECT * FROM {table} WHERE 0")
-            
-            # Get column names
-            cursor.execute(f"PRAGMA table_info({table})")
-            columns = [row[1] for row in cursor.fetchall()]
-            column_names = ', '.join(columns)
-            placeholders = ', '.join(['?'] * len(columns))
-            
-            # Get all rows
-            cursor.execute(f"SELECT * FROM {table}")
-            rows = cursor.fetchall()
-            
-            # Insert into temp table with new IDs
-            new_rows = []
-            for row in rows:
-                row_list = list(row)
-                old_id = row_list[0]
-                row_list[0] = id_mappings[table][old_id]
-                
-                # Update foreign keys
-                if table == 'chapter':
-                    subject_fk_index = columns.index('subject_id')
-                    old_subject_id = row_list[subject_fk_index]
-                    row_list[subject_fk_index] = id_mappings['subject'][old_subject_id]
-                    
-                elif table == 'quiz':
-                    chapter_fk_index = columns.index('chapter_id')
-                    old_chapter_id = row_list[chapter_fk_index]
-                    row_list[chapter_fk_index] = id_mappings['chapter'][old_chapter_id]
-                    
-                elif table == 'question':
-                    quiz_fk_index = columns.index('quiz_id')
-                    old_quiz_id = row_list[quiz_fk_index]
-                    row_list[quiz_fk_index] = id_mappings['quiz'][old_quiz_id]
-                    
-                elif table == 'score':
-                    user_fk_index = columns.index('user_id')
-                    quiz_fk_index = columns.index('quiz_id')
-                    old_user_id = row_list[user_fk_index]
-                    old_quiz_id = row_list[quiz_fk_index]
-                    row_list[user_fk_index] = id_mappings['user'][old_user_id]
-                    row_list[quiz_fk_index] = id_mappings['quiz'][old_quiz_id]
-                
-                new_rows.append(tuple(row_list))
-            
-            # Insert new rows
-            cursor.executemany(f"INSERT INTO {table}_temp VALUES ({placeholders})", new_rows)
-            
-            # Drop original table and rename temp table
-            cursor.execute(f"DROP TABLE {table}")
-            cursor.execute(f"ALTER TABLE {table}_temp RENAME TO {table}")
-            
-            # Update sequence
-            max_id = max(id_mappings[table].values())
-            cursor.execute(f"INSERT OR REPLACE INTO sqlite_sequence (name, seq) VALUES ('{table}', {max_id})")
-        
-        # Re-enable foreign key constraints
-        cursor.execute("PRAGMA foreign_keys = ON")
-        
-        # Commit the transaction
-        conn.commit()
-        print("Database updated successfully with professional-looking IDs.")
-        
-    except Exception as e:
-        # Roll back any changes if something went wrong
-        conn.rollback()
-        print(f"Error updating database: {e}")
-        print(f"Database restored to original state. Original backup is still at {BACKUP_FILE}")
-    
-    conn.close()
+        resuming = table_exists(conn, PROGRESS_TABLE)
+        if resuming:
+            print(f"Resuming the interrupted update of {db_file}...")
+        else:
+            backup_file = f"{db_file}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            print(f"Creating backup to {backup_file}...")
+            backup_database(db_file, backup_file)
+            print("Backup created.")
+            with transaction(conn):
+                conn.execute(
+                    f"CREATE TABLE {PROGRESS_TABLE} (step TEXT PRIMARY KEY, last_rowid INTEGER, copied INTEGER, done INTEGER)"
+                )
+
+        print("Mapping IDs...")
+        highest_ids = {}
+        for table, _ in REMAPPED_TABLES:
+            if get_progress(conn, f'map:{table}')[2]:
+                highest_ids[table] = conn.execute(f"SELECT MAX(new_id) FROM {map_table(table)}").fetchone()[0]
+            else:
+                highest_ids[table] = build_mapping(conn, table)
+            print(f"  {table}: IDs up to {highest_ids[table]}")
+
+        print("Copying tables with the new IDs...")
+        tables = []
+        for table, foreign_keys in REMAPPED_TABLES + DEPENDENT_TABLES:
+            if not table_exists(conn, table):
+                continue
+            copy_table(conn, table, foreign_keys, table in dict(REMAPPED_TABLES), batch_size)
+            tables.append(table)
+        if 'attempt_layout' in tables:
+            remap_layout_questions(conn, batch_size)
+
+        print("Replacing the original tables...")
+        swap_tables(conn, tables, highest_ids)
+
+        problems = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if problems:
+            print(f"Warning: {len(problems)} rows reference missing parents (they did before the update too)")
+        print(f"Database updated successfully with professional-looking IDs in {time.perf_counter() - started:.1f}s.")
+    except (KeyboardInterrupt, Exception) as e:
+        # Only the current batch is rolled back; the next run resumes after the last committed one
+        print(f"Error updating database: {e!r}")
+        print("Run the script again to resume. The backup made before the first run is unchanged.")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
-    print(f"This script will update IDs in {DB_FILE} to use professional-looking conventions.")
-    print(f"A backup will be created at {BACKUP_FILE}.")
-    choice = input("Do you want to continue? (y/n): ")
-    if choice.lower() == 'y':
-        update_database()
+    parser = argparse.ArgumentParser(description="Renumber every ID in a QuizMaster database")
+    parser.add_argument('db_file', nargs='?', default='quizmaster.db', help="Database file (default quizmaster.db)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Rows copied per transaction")
+    parser.add_argument('--yes', action='store_true', help="Do not ask for confirmation")
+    args = parser.parse_args()
+
+    print(f"This script will update IDs in {args.db_file} to use professional-looking conventions.")
+    print("A backup will be created next to it before anything is changed.")
+    if args.yes or input("Do you want to continue? (y/n): ").lower() == 'y':
+        update_database(args.db_file, args.batch_size)
     else:
-        print("Operation cancelled.") 
\ No newline at end of file
+        print("Operation cancelled.")
@@ -2,7 +2,6 @@
 Utility functions for the QuizMaster application.
 """
 import random
-import time
 
 # ID ranges for different entity types
 ID_RANGES = {
@@ -113,4 +112,97 @@ def ensure_id_sequence(session, model, entity_type):
             session.commit()
     except Exception as e:
         print(f"Warning: Could not update sqlite_sequence: {str(e)}")
-        print("This is not critical and the application will continue to function.") 
\ No newline at end of file
+        print("This is not critical and the application will continue to function.") 
+
+# Columns added after the original schema. db.create_all() only creates missing
+# tables, so existing databases get these through upgrade_schema().
+SCHEMA_UPGRADES = {
+    'user': [('is_deleted', 'BOOLEAN DEFAULT 0'), ('token_version', 'INTEGER DEFAULT 0')],
+    'subject': [('is_deleted', 'BOOLEAN DEFAULT 0'), ('quiz_count', 'INTEGER DEFAULT 0')],
+    'chapter': [('is_deleted', 'BOOLEAN DEFAULT 0')],
+    'quiz': [('is_deleted', 'BOOLEAN DEFAULT 0'), ('pool_size', 'INTEGER'), ('draw_count', 'INTEGER')],
+    'score': [('idempotency_key', 'VARCHAR(64)'), ('export_seq', 'INTEGER')],
+    'attempt_detail': [('draw_seed', 'BIGINT'), ('draw_count', 'INTEGER')]
+}
+
+# Indexes added after the original schema, created with IF NOT EXISTS
+INDEX_UPGRADES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_score_user_quiz_idempotency_key "
+    "ON score (user_id, quiz_id, idempotency_key)",
+    "CREATE INDEX IF NOT EXISTS ix_score_timestamp_id ON score (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS ix_score_export_seq ON score (export_seq)",
+    # Child lookups by parent, used by the chunked cascade deletes and most listings
+    "CREATE INDEX IF NOT EXISTS ix_chapter_subject_id ON chapter (subject_id)",
+    "CREATE INDEX IF NOT EXISTS ix_quiz_chapter_id ON quiz (chapter_id)",
+    "CREATE INDEX IF NOT EXISTS ix_question_quiz_id ON question (quiz_id)",
+    "CREATE INDEX IF NOT EXISTS ix_score_quiz_id ON score (quiz_id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_subject_progress_subject_id ON user_subject_progress (subject_id)"
+]
+
+# Triggers added after the original schema, created with IF NOT EXISTS
+TRIGGER_UPGRADES = [
+    # Numbers attempts in the order they are saved, which IDs do not: get_next_id
+    # wraps around the score range. Writes are serialized, so a reader never
+    # sees a number below one it has already seen. Used by export_scores.py.
+    "CREATE TRIGGER IF NOT EXISTS score_export_seq AFTER INSERT ON score "
+    "WHEN NEW.export_seq IS NULL BEGIN "
+    "UPDATE score SET export_seq = (SELECT COALESCE(MAX(export_seq), 0) + 1 FROM score) WHERE id = NEW.id; "
+    "END"
+]
+
+def upgrade_schema(session):
+    """
+    Add any columns from SCHEMA_UPGRADES that are missing from existing tables,
+    then create the indexes in INDEX_UPGRADES and the triggers in TRIGGER_UPGRADES.
+    
+    Args:
+        session: SQLAlchemy session
+    """
+    for table_name, columns in SCHEMA_UPGRADES.items():
+        existing = {row[1] for row in session.execute(f"PRAGMA table_info('{table_name}')").fetchall()}
+        for column_name, column_type in columns:
+            if column_name not in existing:
+                session.execute(f"ALTER TABLE '{table_name}' ADD COLUMN {column_name} {column_type}")
+                print(f"Added column {table_name}.{column_name}")
+    for statement in INDEX_UPGRADES:
+        session.execute(statement)
+    # Attempts saved before the export sequence existed come first, in ID order
+    highest = session.execute("SELECT COALESCE(MAX(export_seq), 0) FROM score").scalar()
+    session.execute("UPDATE score SET export_seq = :highest + id WHERE export_seq IS NULL", {'highest': highest})
+    for statement in TRIGGER_UPGRADES:
+        session.execute(statement)
+    session.commit()
+
+def reserve_ids(session, model, entity_type, count):
+    """
+    Reserve a block of unused IDs for a batch insert with a single lookup,
+    instead of probing the table once per row with get_next_id.
+    
+    Args:
+        session: SQLAlchemy session
+        model: SQLAlchemy model class
+        entity_type (str): Entity type for ID range
+        count (int): Number of IDs needed
+    
+    Returns:
+        list: `count` unused IDs in ascending order
+    """
+    min_id, max_id = ID_RANGES[entity_type]
+    
+    highest = session.query(model).order_by(model.id.desc()).first()
+    next_id = highest.id if highest else min_id
+    
+    ids = []
+    for _ in range(count):
+        next_id += random.randint(1, 10)
+        if next_id > max_id:
+            break
+        ids.append(next_id)
+    
+    # Range exhausted above the highest ID - probe for gaps one at a time
+    while len(ids) < count:
+        candidate = get_next_id(session, model, entity_type)
+        if candidate not in ids:
+            ids.append(candidate)
+    
+    return ids
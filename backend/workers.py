@@ -0,0 +1,42 @@
+"""
+Celery application for QuizMaster background jobs.
+
+Start a worker from the backend directory with:
+    celery -A workers worker --loglevel=info
+and the scheduler with:
+    celery -A workers beat --loglevel=info
+"""
+import os
+from celery import Celery, Task
+from redis_client import REDIS_URL
+
+_flask_app = None
+
+def get_flask_app():
+    """Flask application used by tasks, built on first use in each worker process"""
+    global _flask_app
+    if _flask_app is None:
+        # Imported here to avoid a circular import with task.py. Tasks only need the
+        # database and templates, so the web stack in app.py is never loaded.
+        from base_app import create_base_app
+        _flask_app = create_base_app()
+    return _flask_app
+
+class ContextTask(Task):
+    """Run every task inside the Flask application context so models can be queried."""
+    def __call__(self, *args, **kwargs):
+        with get_flask_app().app_context():
+            return self.run(*args, **kwargs)
+
+celery = Celery(
+    'quizmaster',
+    broker=os.environ.get('CELERY_BROKER_URL', REDIS_URL),
+    backend=os.environ.get('CELERY_RESULT_BACKEND', REDIS_URL),
+    include=['task'],
+    task_cls=ContextTask
+)
+celery.conf.update(
+    timezone='UTC',
+    task_track_started=True,
+    result_expires=24 * 60 * 60  # Keep job status around for a day
+)
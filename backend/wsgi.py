@@ -0,0 +1,9 @@
+"""
+WSGI entry point for production servers.
+
+Prepare the database once with `python bootstrap.py`, then serve with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()
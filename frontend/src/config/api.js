@@ -1,16 +1,42 @@
 const API_CONFIG = {
   BASE_URL: 'http://localhost:5000/api',
   TIMEOUT: 10000, // 10 seconds
+  // Quiz answers are saved to the server this often while a quiz is taken
+  AUTOSAVE_INTERVAL: 15000, // 15 seconds
+  // Log every request to the console (or set localStorage api_debug=1 in the browser)
+  DEBUG: false,
+  CACHE: {
+    // GET responses are reused for this long, then revalidated with their ETag
+    TTL: 30000, // 30 seconds
+    // Path segment -> resource family; a mutation drops cached GETs of its family
+    FAMILIES: {
+      subjects: 'content',
+      chapters: 'content',
+      quizzes: 'content',
+      questions: 'content',
+      catalog: 'content',
+      search: 'content',
+      users: 'users',
+      profile: 'users',
+      admin: 'stats',
+      leaderboards: 'stats'
+    },
+    // Derived from everything else, so dropped by every mutation
+    ALWAYS_INVALIDATE: ['users', 'stats']
+  },
   ENDPOINTS: {
     // Auth
     LOGIN: '/login',
     REGISTER: '/register',
+    REFRESH: '/token/refresh',
+    LOGOUT: '/logout',
     
     // User
     SCORES: '/users/scores',
     USER_PROFILE: '/profile',
     
     // Content
+    CATALOG: '/catalog',
     SUBJECTS: '/subjects',
     SUBJECT_BY_ID: (id) => `/subjects/${id}`,
     CHAPTERS: (subjectId) => `/subjects/${subjectId}/chapters`,
@@ -18,12 +44,19 @@ const API_CONFIG = {
     QUIZZES: (chapterId) => `/chapters/${chapterId}/quizzes`,
     QUIZ_BY_ID: (id) => `/quizzes/${id}`,
     QUESTIONS: (quizId) => `/quizzes/${quizId}/questions`,
+    QUIZ_SESSION: (quizId) => `/quizzes/${quizId}/session`,
     QUESTION_BY_ID: (id) => `/questions/${id}`,
     QUIZ_ATTEMPT: (quizId) => `/quizzes/${quizId}/attempt`,
+    QUIZ_DRAW: (quizId) => `/quizzes/${quizId}/draw`,
+    QUIZ_SESSION_START: (quizId) => `/quizzes/${quizId}/sessions`,
+    QUIZ_SESSION_ANSWERS: (sessionId) => `/quiz-sessions/${sessionId}/answers`,
+    QUIZ_SESSION_SUBMIT: (sessionId) => `/quiz-sessions/${sessionId}/submit`,
+    SEARCH: '/search',
     
     // Admin
     USERS: '/users',
-    ADMIN_STATS: '/admin/statistics'
+    ADMIN_STATS: '/admin/statistics',
+    ADMIN_LIVE: '/admin/live'
   }
 };
 
@@ -4,22 +4,158 @@ import API_CONFIG from '../config/api.js';
  * API Service using the native Fetch API
  */
 const ApiService = {
+  // Pending refresh shared by concurrent requests that hit an expired token
+  refreshPromise: null,
+  
+  // Cached GET responses by URL: { data, etag, expires, family }
+  cache: new Map(),
+  // Pending GET requests by URL, shared by identical calls made meanwhile
+  inFlight: new Map(),
+  // Bumped per family on every mutation, so responses already on their way are not cached
+  generations: {},
+  // Bumped when the whole cache is cleared
+  cacheEpoch: 0,
+  // User the cached responses belong to
+  cacheOwner: null,
+  
+  /**
+   * Log a message when request logging is on (API_CONFIG.DEBUG or localStorage api_debug=1)
+   */
+  debug(...args) {
+    if (API_CONFIG.DEBUG || localStorage.getItem('api_debug') === '1') {
+      console.log(...args);
+    }
+  },
+  
+  /**
+   * Resource family of an endpoint, e.g. 'content' for /quizzes/5/questions
+   * @param {string} endpoint - API endpoint path
+   * @returns {string} - Family name from API_CONFIG.CACHE.FAMILIES, or the first path segment
+   */
+  familyOf(endpoint) {
+    const segment = endpoint.replace(/^\/+/, '').split(/[/?]/)[0];
+    return API_CONFIG.CACHE.FAMILIES[segment] || segment;
+  },
+  
+  /**
+   * Drop cached responses of a family (and of the families every mutation affects)
+   * @param {string} family - Family to invalidate, or nothing to clear the whole cache
+   */
+  invalidate(family) {
+    if (!family) {
+      this.cache.clear();
+      this.cacheEpoch += 1;
+      return;
+    }
+    const families = [family, ...API_CONFIG.CACHE.ALWAYS_INVALIDATE];
+    for (const [url, entry] of this.cache) {
+      if (families.includes(entry.family)) {
+        this.cache.delete(url);
+      }
+    }
+    families.forEach(name => {
+      this.generations[name] = (this.generations[name] || 0) + 1;
+    });
+  },
+  
+  /**
+   * GET through the cache: fresh entries are served from memory, stale ones are
+   * revalidated with their ETag, and identical requests in flight are shared
+   * @param {string} url - API endpoint with query string
+   * @returns {Promise<any>} - API response (a copy callers may modify)
+   */
+  cachedGet(url) {
+    // Cached responses are per user
+    const owner = localStorage.getItem('user');
+    if (owner !== this.cacheOwner) {
+      this.invalidate();
+      this.cacheOwner = owner;
+    }
+    
+    const copy = (data) => (data === null || data === undefined ? data : JSON.parse(JSON.stringify(data)));
+    const entry = this.cache.get(url);
+    if (entry && entry.expires > Date.now()) {
+      return Promise.resolve(copy(entry.data));
+    }
+    
+    if (!this.inFlight.has(url)) {
+      const family = this.familyOf(url);
+      const generation = `${this.cacheEpoch}:${this.generations[family] || 0}`;
+      const meta = {};
+      const headers = entry && entry.etag ? { 'If-None-Match': entry.etag } : {};
+      const pending = this.request(url, { method: 'GET', headers }, false, meta)
+        .then((data) => {
+          // 304 Not Modified: the stale entry is still current
+          const fresh = meta.notModified ? entry.data : data;
+          if (`${this.cacheEpoch}:${this.generations[family] || 0}` === generation) {
+            this.cache.set(url, {
+              data: fresh,
+              etag: meta.etag || (meta.notModified ? entry.etag : null),
+              expires: Date.now() + API_CONFIG.CACHE.TTL,
+              family
+            });
+          }
+          return fresh;
+        })
+        .finally(() => {
+          this.inFlight.delete(url);
+        });
+      this.inFlight.set(url, pending);
+    }
+    return this.inFlight.get(url).then(copy);
+  },
+  
+  /**
+   * Exchange the stored refresh token for a new token pair
+   * @returns {Promise<boolean>} - Whether new tokens were stored
+   */
+  refreshTokens() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+      return Promise.resolve(false);
+    }
+    
+    if (!this.refreshPromise) {
+      this.refreshPromise = fetch(API_CONFIG.BASE_URL + API_CONFIG.ENDPOINTS.REFRESH, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${refreshToken}` },
+        credentials: 'include'
+      })
+        .then(async (response) => {
+          if (!response.ok) {
+            return false;
+          }
+          const data = await response.json();
+          localStorage.setItem('token', data.access_token);
+          localStorage.setItem('refresh_token', data.refresh_token);
+          return true;
+        })
+        .catch(() => false)
+        .finally(() => {
+          this.refreshPromise = null;
+        });
+    }
+    return this.refreshPromise;
+  },
+  
   /**
    * Base request method for all API calls
    * @param {string} endpoint - API endpoint path
    * @param {Object} options - Fetch options
+   * @param {boolean} retried - Whether the request is being retried after a token refresh
+   * @param {Object} meta - Filled with the response's etag and notModified (304) flag
    * @returns {Promise<any>} - API response
    */
-  async request(endpoint, options = {}) {
+  async request(endpoint, options = {}, retried = false, meta = {}) {
     // Fix double slash if needed
     let fixedEndpoint = endpoint;
     if (endpoint.startsWith('/') && API_CONFIG.BASE_URL.endsWith('/')) {
       fixedEndpoint = endpoint.substring(1);
-      console.log(`Fixed double slash in endpoint: ${endpoint} -> ${fixedEndpoint}`);
+      this.debug(`Fixed double slash in endpoint: ${endpoint} -> ${fixedEndpoint}`);
     }
     
     const url = API_CONFIG.BASE_URL + fixedEndpoint;
-    console.log(`Constructing URL: ${API_CONFIG.BASE_URL} + ${fixedEndpoint} = ${url}`);
+    this.debug(`Constructing URL: ${API_CONFIG.BASE_URL} + ${fixedEndpoint} = ${url}`);
     
     // Default headers
     const headers = {
@@ -46,9 +182,9 @@ const ApiService = {
     fetchOptions.signal = controller.signal;
     
     try {
-      console.log(`Making ${options.method || 'GET'} request to ${url}`);
+      this.debug(`Making ${options.method || 'GET'} request to ${url}`);
       if (options.method === 'POST' || options.method === 'PUT') {
-        console.log('Request payload:', options.body);
+        this.debug('Request payload:', options.body);
       }
       
       const response = await fetch(url, fetchOptions);
@@ -56,11 +192,18 @@ const ApiService = {
       // Clear timeout
       clearTimeout(timeoutId);
       
+      // An expired access token is renewed once with the refresh token
+      if (response.status === 401 && !retried && token && await this.refreshTokens()) {
+        return this.request(endpoint, options, true, meta);
+      }
+      
       // Handle authentication errors
       if (response.status === 401 || response.status === 403) {
         // Clear invalid token
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('user');
+        this.invalidate();
         
         // Emit auth change event if available
         if (typeof window.emitter !== 'undefined') {
@@ -70,11 +213,22 @@ const ApiService = {
         throw new Error('Authentication failed. Please log in again.');
       }
       
+      // The cached copy the request was revalidating is still current
+      if (response.status === 304) {
+        meta.notModified = true;
+        return null;
+      }
+      meta.etag = response.headers.get('ETag');
+      
       // Handle other API error responses
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
         console.error('API Error:', response.status, errorData);
-        throw new Error(errorData.msg || errorData.message || `Request failed with status ${response.status}`);
+        const apiError = new Error(errorData.msg || errorData.message || `Request failed with status ${response.status}`);
+        apiError.status = response.status;
+        // Rate limited (429): seconds the server asks us to wait before retrying
+        apiError.retryAfter = Number(response.headers.get('Retry-After')) || 0;
+        throw apiError;
       }
       
       // Handle empty responses
@@ -96,9 +250,10 @@ const ApiService = {
    * GET request
    * @param {string} endpoint - API endpoint
    * @param {Object} params - URL parameters
+   * @param {Object} options - { cache: false } always requests a fresh response
    * @returns {Promise<any>} - API response
    */
-  get(endpoint, params = {}) {
+  get(endpoint, params = {}, options = {}) {
     // Add query parameters if any
     const queryParams = new URLSearchParams();
     Object.entries(params).forEach(([key, value]) => {
@@ -110,7 +265,25 @@ const ApiService = {
     const queryString = queryParams.toString();
     const url = queryString ? `${endpoint}?${queryString}` : endpoint;
     
-    return this.request(url, { method: 'GET' });
+    if (options.cache === false) {
+      return this.request(url, { method: 'GET' });
+    }
+    return this.cachedGet(url);
+  },
+  
+  /**
+   * Send a mutating request and drop cached responses of the family it changes
+   * @param {string} endpoint - API endpoint
+   * @param {Object} options - Fetch options
+   * @returns {Promise<any>} - API response
+   */
+  async mutate(endpoint, options) {
+    try {
+      return await this.request(endpoint, options);
+    } finally {
+      // Invalidate even after an error: the change may have been applied
+      this.invalidate(this.familyOf(endpoint));
+    }
   },
   
   /**
@@ -120,7 +293,7 @@ const ApiService = {
    * @returns {Promise<any>} - API response
    */
   post(endpoint, data = {}) {
-    return this.request(endpoint, {
+    return this.mutate(endpoint, {
       method: 'POST',
       body: JSON.stringify(data)
     });
@@ -133,7 +306,7 @@ const ApiService = {
    * @returns {Promise<any>} - API response
    */
   put(endpoint, data = {}) {
-    return this.request(endpoint, {
+    return this.mutate(endpoint, {
       method: 'PUT',
       body: JSON.stringify(data)
     });
@@ -145,7 +318,7 @@ const ApiService = {
    * @returns {Promise<any>} - API response
    */
   delete(endpoint) {
-    return this.request(endpoint, { method: 'DELETE' });
+    return this.mutate(endpoint, { method: 'DELETE' });
   }
 };
 
@@ -0,0 +1,57 @@
+import ApiService from './apiService.js';
+import API_CONFIG from '../config/api.js';
+
+/**
+ * Subject -> chapter -> quiz tree, loaded once per session so browsing
+ * between subjects, chapters and quizzes needs no further requests
+ */
+const CatalogService = {
+  // Pending or finished catalog request shared by every view
+  catalogPromise: null,
+
+  /**
+   * Get the catalog, requesting it on first use
+   * @param {boolean} reload - Request it again even if it was loaded
+   * @returns {Promise<Array>} - Subjects with nested chapters and quizzes
+   */
+  load(reload = false) {
+    if (!this.catalogPromise || reload) {
+      this.catalogPromise = ApiService.get(API_CONFIG.ENDPOINTS.CATALOG)
+        .then(response => response.subjects)
+        .catch(error => {
+          // Let the next caller try again
+          this.catalogPromise = null;
+          throw error;
+        });
+    }
+    return this.catalogPromise;
+  },
+
+  /**
+   * Find a subject by ID
+   * @param {string|number} subjectId - Subject ID
+   * @returns {Promise<Object|null>} - Subject with its chapters
+   */
+  async getSubject(subjectId) {
+    const subjects = await this.load();
+    return subjects.find(subject => subject.id === Number(subjectId)) || null;
+  },
+
+  /**
+   * Find a chapter by ID
+   * @param {string|number} chapterId - Chapter ID
+   * @returns {Promise<Object|null>} - Chapter with its quizzes
+   */
+  async getChapter(chapterId) {
+    const subjects = await this.load();
+    for (const subject of subjects) {
+      const chapter = subject.chapters.find(item => item.id === Number(chapterId));
+      if (chapter) {
+        return chapter;
+      }
+    }
+    return null;
+  }
+};
+
+export default CatalogService;
@@ -0,0 +1,91 @@
+import ApiService from './apiService.js';
+import API_CONFIG from '../config/api.js';
+
+// Wait before reconnecting after the stream dropped
+const RECONNECT_DELAY = 5000; // 5 seconds
+
+/**
+ * Admin live exam monitoring over Server-Sent Events. The stream is read
+ * with fetch rather than EventSource so the token travels in the
+ * Authorization header instead of the URL.
+ */
+const LiveMonitorService = {
+  /**
+   * Open the live metrics stream, reconnecting until it is closed
+   * @param {Function} onMetrics - Called with every metrics snapshot
+   * @param {Function} onStatus - Called with 'live', 'reconnecting' or 'unavailable'
+   * @returns {Function} - Closes the stream
+   */
+  connect(onMetrics, onStatus = () => {}) {
+    let controller = null;
+    let closed = false;
+    let retryTimer = null;
+
+    const open = async (retried = false) => {
+      controller = new AbortController();
+      try {
+        const response = await fetch(API_CONFIG.BASE_URL + API_CONFIG.ENDPOINTS.ADMIN_LIVE, {
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+          credentials: 'include',
+          signal: controller.signal
+        });
+        if (response.status === 401 && !retried && await ApiService.refreshTokens()) {
+          return open(true);
+        }
+        if (response.status === 503) {
+          // Redis is down or the server has no free stream slot: try again later
+          throw new Error(`Live monitor unavailable (${response.status})`);
+        }
+        if (!response.ok) {
+          // The user is no admin; the rest of the page still works
+          onStatus('unavailable');
+          return;
+        }
+
+        onStatus('live');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) {
+            break;
+          }
+          buffer += decoder.decode(value, { stream: true });
+          // Events are separated by a blank line; comments (keep-alives) start with ':'
+          let end;
+          while ((end = buffer.indexOf('\n\n')) !== -1) {
+            const data = buffer.slice(0, end).split('\n')
+              .filter(line => line.startsWith('data: '))
+              .map(line => line.slice('data: '.length))
+              .join('\n');
+            buffer = buffer.slice(end + 2);
+            if (data) {
+              onMetrics(JSON.parse(data));
+            }
+          }
+        }
+      } catch (error) {
+        if (closed) {
+          return;
+        }
+        ApiService.debug('Live monitor stream failed:', error);
+      }
+      if (!closed) {
+        onStatus('reconnecting');
+        retryTimer = setTimeout(() => open(), RECONNECT_DELAY);
+      }
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (controller) {
+        controller.abort();
+      }
+    };
+  }
+};
+
+export default LiveMonitorService;
@@ -0,0 +1,73 @@
+import ApiService from './apiService.js';
+import API_CONFIG from '../config/api.js';
+
+// Highlighted terms arrive wrapped in these characters
+const MARK_START = '\x02';
+const MARK_END = '\x03';
+
+/**
+ * Full-text search over subjects, chapters, quizzes and (for admins) questions
+ */
+const SearchService = {
+  /**
+   * Ranked search results
+   * @param {string} query - Search words
+   * @param {Object} filters - Optional type ('subject', 'chapter', 'quiz', 'question'), subject_id, limit, offset
+   * @returns {Promise<Array>} - Results, best first
+   */
+  async search(query, filters = {}) {
+    const response = await ApiService.get(API_CONFIG.ENDPOINTS.SEARCH, { q: query, ...filters });
+    return response.results;
+  },
+
+  /**
+   * Autocomplete suggestions for a query still being typed
+   * @param {string} query - Search words, the last one possibly incomplete
+   * @param {Object} filters - Optional type and subject_id
+   * @returns {Promise<Array>} - Suggestions
+   */
+  async suggest(query, filters = {}) {
+    const response = await ApiService.get(API_CONFIG.ENDPOINTS.SEARCH, { q: query, autocomplete: 1, ...filters });
+    return response.suggestions;
+  },
+
+  /**
+   * HTML for a highlighted title or snippet: the text is escaped, then the
+   * matched terms are wrapped in <mark>
+   * @param {string} text - Title or snippet from a result
+   * @returns {string} - Safe HTML
+   */
+  highlight(text) {
+    const escaped = (text || '')
+      .replace(/&/g, '&amp;')
+      .replace(/</g, '&lt;')
+      .replace(/>/g, '&gt;')
+      .replace(/"/g, '&quot;')
+      .replace(/'/g, '&#39;');
+    return escaped.split(MARK_START).join('<mark>').split(MARK_END).join('</mark>');
+  },
+
+  /**
+   * Route of the page a result leads to
+   * @param {Object} result - Search result or suggestion
+   * @param {boolean} admin - Link to the admin pages instead of the student ones
+   * @returns {Object} - Router location
+   */
+  routeFor(result, admin) {
+    if (admin) {
+      return {
+        subject: { name: 'AdminChapters', params: { subjectId: result.id } },
+        chapter: { name: 'AdminQuizzes', params: { chapterId: result.id } },
+        quiz: { name: 'AdminQuestions', params: { quizId: result.id } },
+        question: { name: 'AdminQuestions', params: { quizId: result.quiz_id } }
+      }[result.type];
+    }
+    return {
+      subject: { name: 'UserChapters', params: { subjectId: result.id } },
+      chapter: { name: 'UserQuizzes', params: { chapterId: result.id } },
+      quiz: { name: 'UserQuizzes', params: { chapterId: result.chapter_id } }
+    }[result.type];
+  }
+};
+
+export default SearchService;